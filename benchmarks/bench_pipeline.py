@@ -0,0 +1,263 @@
+"""Benchmark the stages of the online modelling pipeline.
+
+Synthetic extracts shaped like ``merged_data.csv`` (see ``mmm.synthetic``)
+are generated at growing numbers of weeks, channels and panels, and every
+stage of ``online_mmm_attemps.py`` is timed on them: worker startup
+(a fresh interpreter importing the core), load, pivot (and the
+chunked ingestion that replaces it), features, correlation filter,
+selection, VIF, the bounded fit and a small grid search. Panel-scaled
+extracts run the load / ingest / batch stages instead.
+
+Each measurement records wall time, peak RSS over the stage and, with
+``--trace``, the peak and count of Python / NumPy allocations from
+``tracemalloc``. Records are appended as JSON lines together with the
+git commit and library versions, so two runs can be compared:
+
+    python -m benchmarks.bench_pipeline run --factors 10 100 --repeat 3
+    python -m benchmarks.bench_pipeline compare old.jsonl new.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from mmm.batch import run_batch
+from mmm.data import build_online_dataset, load_merged
+from mmm.diagnostics import vif
+from mmm.features import build_features
+from mmm.ingest import ingest_long
+from mmm.search import TrialStore, run_search
+from mmm.selection import forward_path
+from mmm.synthetic import PANEL_COL, synthetic_long
+from mmm.trial import correlation_filter, fit_constrained, media_mask
+
+BASE_SHAPE = (104, 17, 1)  # weeks, channels, panels of merged_data.csv
+PARAMS = {"lag_range": 3, "span": 4, "alpha": 0.5, "cor": 0.95, "imp": 0.003, "sel": 20}
+GRID = {"lag_range": [3, 5], "span": [4], "alpha": [0.3, 0.7], "cor": [0.95], "imp": [0.003], "sel": [20]}
+SERIES_STAGES = ["startup", "load", "pivot", "ingest", "features", "correlation", "selection", "vif", "nnls", "search"]
+PANEL_STAGES = ["load", "ingest_panels", "batch"]
+
+
+def _status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb():
+    """Peak RSS since the last reset (Linux) or since the process started."""
+    peak = _status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / 2**20
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter; returns False where that is unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def measure(record, trace=False):
+    """Fill ``record`` with wall time, peak RSS and (optionally) allocation stats of the block."""
+    rss_reset = _reset_peak_rss()
+    record["start_rss_mb"] = _status_mb("VmRSS")
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = time.perf_counter() - start
+        if trace:
+            snapshot = tracemalloc.take_snapshot()
+            record["alloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            record["alloc_blocks"] = sum(stat.count for stat in snapshot.statistics("filename"))
+            tracemalloc.stop()
+        record["peak_rss_mb"] = _peak_rss_mb()
+        record["rss_reset"] = rss_reset
+
+
+def environment():
+    """Versions and commit the results belong to."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def series_stages(path, workdir):
+    """(name, callable) of the single-series stages; each stage feeds the next."""
+    state = {}
+
+    def startup():
+        # A fresh interpreter importing what a search worker needs
+        subprocess.run([sys.executable, "-c", "import mmm.search, mmm.batch, mmm.bootstrap"], check=True)
+
+    def load():
+        state["long"] = load_merged(path)
+
+    def pivot():
+        state["weekly"] = build_online_dataset(state["long"]).set_index("Starting Week")
+
+    def ingest():
+        ingest_long(path)
+
+    def features():
+        state["X"], state["y"] = build_features(state["weekly"], PARAMS["lag_range"], PARAMS["span"],
+                                                PARAMS["alpha"])
+
+    def correlation():
+        state["X"] = correlation_filter(state["X"], PARAMS["cor"])
+
+    def selection():
+        X, y = state["X"], state["y"]
+        path = forward_path(X, y, media_mask(X.columns))
+        state["X"] = X[path.select(PARAMS["sel"], PARAMS["imp"])]
+
+    def vif_stage():
+        vif(state["X"])
+
+    def nnls():
+        fit_constrained(state["X"], state["y"])
+
+    def search():
+        store = TrialStore(os.path.join(workdir, f"trials_{time.time_ns()}.jsonl"))
+        run_search(state["weekly"], GRID, store, n_jobs=1, verbose=False)
+
+    stages = {"startup": startup, "load": load, "pivot": pivot, "ingest": ingest, "features": features,
+              "correlation": correlation, "selection": selection, "vif": vif_stage,
+              "nnls": nnls, "search": search}
+    return [(name, stages[name]) for name in SERIES_STAGES]
+
+
+def panel_stages(path, n_jobs):
+    def load():
+        pd.read_csv(path)
+
+    def ingest_panels():
+        from mmm.ingest import ingest_panels as ingest
+
+        ingest(path, [PANEL_COL])
+
+    def batch():
+        run_batch(path, PARAMS, [PANEL_COL], n_jobs=n_jobs, verbose=False)
+
+    return [("load", load), ("ingest_panels", ingest_panels), ("batch", batch)]
+
+
+def shapes(factors, max_rows=None):
+    """Base shape plus weeks, channels and panels scaled one axis at a time."""
+    out = [BASE_SHAPE]
+    for factor in factors:
+        for axis in range(3):
+            shape = list(BASE_SHAPE)
+            shape[axis] *= factor
+            out.append(tuple(shape))
+    if max_rows is not None:
+        out = [s for s in out if np.prod(s) <= max_rows]
+    return out
+
+
+def run(args):
+    env = environment()
+    with tempfile.TemporaryDirectory() as workdir, open(args.output, "a") as out:
+        for n_weeks, n_channels, n_panels in shapes(args.factors, args.max_rows):
+            path = os.path.join(workdir, "extract.csv")
+            synthetic_long(n_weeks, n_channels, n_panels, seed=args.seed).to_csv(path, index=False)
+            for repeat in range(args.repeat):
+                stages = (series_stages(path, workdir) if n_panels == 1
+                          else panel_stages(path, args.jobs))
+                for name, stage in stages:
+                    if args.stages and name not in args.stages:
+                        stage()  # still needed by the stages after it
+                        continue
+                    record = {"stage": name, "n_weeks": n_weeks, "n_channels": n_channels,
+                              "n_panels": n_panels, "repeat": repeat}
+                    with measure(record, args.trace):
+                        stage()
+                    out.write(json.dumps({**record, **env, "time": time.time()}) + "\n")
+                    out.flush()
+                    print(f"{name:>14} {n_weeks:>7}w {n_channels:>5}c {n_panels:>4}p "
+                          f"{record['wall_s']:9.4f}s {record['peak_rss_mb']:8.1f}MB")
+
+
+def load_results(path):
+    """Median of every (stage, shape) of a results file."""
+    df = pd.read_json(path, lines=True)
+    keys = ["stage", "n_weeks", "n_channels", "n_panels"]
+    return df.groupby(keys)[["wall_s", "peak_rss_mb"]].median()
+
+
+def compare(args):
+    old, new = load_results(args.old), load_results(args.new)
+    table = old.join(new, lsuffix="_old", rsuffix="_new", how="inner")
+    table["speedup"] = table["wall_s_old"] / table["wall_s_new"]
+    table["rss_ratio"] = table["peak_rss_mb_new"] / table["peak_rss_mb_old"]
+    print(table.to_string(float_format=lambda v: f"{v:.4g}"))
+    slower = table[table["speedup"] < 1 / args.threshold]
+    if len(slower):
+        print(f"\n{len(slower)} stage(s) slower by more than {args.threshold:g}x")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="benchmark the stages on synthetic extracts")
+    p.add_argument("--factors", type=int, nargs="*", default=[10],
+                   help="scale weeks, channels and panels by each factor in turn")
+    p.add_argument("--max-rows", type=int, default=None, help="skip extracts with more rows")
+    p.add_argument("--stages", nargs="*", default=None,
+                   help="only record these stages (the others still run to feed them)")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--trace", action="store_true", help="record tracemalloc allocations (slower)")
+    p.add_argument("--jobs", type=int, default=None, help="workers of the batch stage")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output", default="bench_results.jsonl")
+
+    p = sub.add_parser("compare", help="compare the medians of two result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=1.2,
+                   help="exit with 1 when a stage is this many times slower")
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
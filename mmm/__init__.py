@@ -0,0 +1,3 @@
+"""Headless marketing-mix modelling core used by the notebooks and scripts."""
+
+from .adstock import adstock_grid, ewm_decay, geometric_adstock, truncated_adstock, weibull_adstock
@@ -0,0 +1,162 @@
+"""Batched adstock (carry-over) transforms.
+
+Every transform works on a whole NumPy block at once: the first axis is
+time (weeks) and the remaining axes are broadcast against the transform
+parameters. A (weeks x channels) matrix with a vector of decay values
+laid out on a trailing axis therefore yields a (weeks x channels x decays)
+block in one call, instead of one Python loop per channel and per value.
+"""
+
+import numpy as np
+
+
+def _recurrence(u, decay):
+    """Run y[t] = u[t] + decay * y[t - 1] along axis 0 with y[0] = u[0].
+
+    The loop is over weeks only; each step is a vectorized update of the
+    whole (channels x parameters) slice.
+    """
+    u = np.asarray(u, dtype=float)
+    decay = np.asarray(decay, dtype=float)
+    out = np.empty((u.shape[0],) + np.broadcast_shapes(u.shape[1:], decay.shape))
+    if out.shape[0] == 0:
+        return out
+    out[0] = u[0]
+    for t in range(1, out.shape[0]):
+        np.multiply(out[t - 1], decay, out=out[t])
+        out[t] += u[t]
+    return out
+
+
+def geometric_adstock(x, alpha):
+    """
+    Geometric adstock: y[t] = x[t] + alpha * y[t - 1].
+
+    Parameters:
+    -----------
+    x : array-like
+        Media series, shape (weeks,) or (weeks, ...).
+    alpha : float or array-like
+        Decay factor(s), broadcast against ``x[t]``.
+
+    Returns:
+    --------
+    np.ndarray: Adstocked block of shape (weeks,) + broadcast(x[t], alpha).
+    """
+    return _recurrence(x, alpha)
+
+
+def ewm_decay(x, span):
+    """
+    Exponentially weighted mean, equal to ``pd.Series.ewm(span, adjust=False).mean()``.
+
+    Parameters:
+    -----------
+    x : array-like
+        Media series, shape (weeks,) or (weeks, ...).
+    span : float or array-like
+        EWM span(s), broadcast against ``x[t]``.
+    """
+    x = np.asarray(x, dtype=float)
+    a = 2.0 / (np.asarray(span, dtype=float) + 1.0)
+    u = x * a
+    if len(x):
+        # adjust=False seeds the mean with the first observation itself
+        u = np.broadcast_to(u, (len(x),) + np.broadcast_shapes(x.shape[1:], a.shape)).copy()
+        u[0] = x[0]
+    return _recurrence(u, 1.0 - a)
+
+
+def convolve_kernel(x, weights):
+    """
+    Finite carry-over: y[t] = sum_l weights[l] * x[t - l].
+
+    Parameters:
+    -----------
+    x : array-like
+        Media series, shape (weeks,) or (weeks, ...).
+    weights : array-like
+        Kernel of shape (max_lag + 1, ...); trailing axes are broadcast
+        against ``x[t]``.
+    """
+    x = np.asarray(x, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    out = np.zeros((x.shape[0],) + np.broadcast_shapes(x.shape[1:], weights.shape[1:]))
+    for lag in range(min(len(weights), len(x))):
+        if lag == 0:
+            out += weights[0] * x
+        else:
+            out[lag:] += weights[lag] * x[:-lag]
+    return out
+
+
+def lag_kernel(alpha, max_lag):
+    """Truncated-lag weights: 1 at lag 0, then alpha * (1 - alpha) ** l up to ``max_lag``."""
+    alpha = np.asarray(alpha, dtype=float)
+    lags = np.arange(max_lag + 1).reshape((-1,) + (1,) * alpha.ndim)
+    weights = alpha * (1.0 - alpha) ** lags
+    weights[0] = 1.0
+    return weights
+
+
+def weibull_kernel(shape, scale, max_lag, kind="cdf"):
+    """
+    Weibull carry-over weights over lags 0..max_lag.
+
+    ``kind="cdf"`` uses the survival curve exp(-(l / scale) ** shape), so
+    lag 0 keeps full weight and later weeks decay monotonically.
+    ``kind="pdf"`` uses the density evaluated at l + 1 normalized to sum
+    to one, which allows a delayed peak when ``shape > 1``.
+    """
+    shape = np.asarray(shape, dtype=float)
+    scale = np.asarray(scale, dtype=float)
+    ndim = max(shape.ndim, scale.ndim)
+    lags = np.arange(max_lag + 1, dtype=float).reshape((-1,) + (1,) * ndim)
+    if kind == "cdf":
+        return np.exp(-((lags / scale) ** shape))
+    if kind == "pdf":
+        z = (lags + 1.0) / scale
+        density = (shape / scale) * z ** (shape - 1.0) * np.exp(-(z**shape))
+        return density / density.sum(axis=0)
+    raise ValueError(f"Unknown Weibull kernel kind: {kind!r}")
+
+
+def truncated_adstock(x, alpha, max_lag=3):
+    """Adstock with a finite lag window, see ``lag_kernel``."""
+    return convolve_kernel(x, lag_kernel(alpha, max_lag))
+
+
+def weibull_adstock(x, shape, scale, max_lag=8, kind="cdf"):
+    """Adstock with a Weibull kernel, see ``weibull_kernel``."""
+    return convolve_kernel(x, weibull_kernel(shape, scale, max_lag, kind=kind))
+
+
+ADSTOCK_KERNELS = {
+    "geometric": geometric_adstock,
+    "truncated": truncated_adstock,
+    "weibull": weibull_adstock,
+}
+
+
+def adstock_grid(x, kind="geometric", **params):
+    """
+    Evaluate one adstock kernel over a whole grid of parameter values.
+
+    Array-valued parameters are laid out on a new trailing axis, scalar
+    ones (such as ``max_lag``) are passed through unchanged.
+
+    Example:
+    --------
+    >>> block = adstock_grid(X, alpha=[0.1, 0.3, 0.5])      # (weeks, channels, 3)
+    >>> block = adstock_grid(X, "weibull", shape=[0.5, 2.0], scale=[2.0, 3.0])
+    """
+    try:
+        func = ADSTOCK_KERNELS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown adstock kind: {kind!r}") from None
+    x = np.asarray(x, dtype=float)[..., None]
+    params = {
+        name: np.asarray(value, dtype=float) if np.ndim(value) else value
+        for name, value in params.items()
+    }
+    return func(x, **params)
@@ -0,0 +1,431 @@
+"""Budget allocation over fitted Hill response curves.
+
+Each channel's predicted units are ``coef * hill(ratio * spend)``, where
+``ratio`` converts pounds into the channel's execution units and
+``hill(x) = x**beta / (alpha**beta + x**beta)`` is the S-curve of
+``offline_model_ameya.ipynb``. The total response is separable across
+channels, so its Hessian is diagonal and the allocation
+
+    maximize   sum_i f_i(s_i)
+    subject to sum_i s_i = budget,  lower_i <= s_i <= upper_i
+
+is solved through its dual: for a marginal return ``lam`` every channel
+independently picks the spend maximizing ``f_i(s) - lam * s`` (a
+safeguarded Newton solve on the concave branch of its curve, using the
+closed-form Hessian), and ``lam`` is adjusted until the spends add up to
+the budget. Because S-curves are not concave, which channels are worth
+switching on, and which single channel may be filled part-way along the
+convex branch of its curve, is then refined by a small local search. All
+scenarios and channels are processed as one array, so a batch of what-if
+budgets, bounds or curves is solved in a single call.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def hill(x, alpha, beta):
+    """Hill S-curve ``x**beta / (alpha**beta + x**beta)``."""
+    return hill_derivatives(x, alpha, beta)[0]
+
+
+def hill_derivatives(x, alpha, beta):
+    """
+    Hill curve with its first and second derivatives in ``x``.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray, np.ndarray: h, dh/dx, d2h/dx2.
+    """
+    x = np.maximum(np.asarray(x, dtype=float), 1e-300)
+    ab = np.power(alpha, beta)
+    xb = np.power(x, beta)
+    denom = ab + xb
+    h = xb / denom
+    with np.errstate(over="ignore", invalid="ignore"):
+        dh = beta * ab * xb / (x * denom**2)
+        d2h = dh / x * ((beta - 1) - 2 * beta * xb / denom)
+    return h, dh, d2h
+
+
+class ResponseCurves:
+    """
+    Per-channel response of predicted units to weekly spend.
+
+    Parameters broadcast against each other, so a leading scenario axis
+    (e.g. one row per bootstrap draw) is allowed.
+
+    Parameters:
+    -----------
+    channels : list of str
+    coef : array-like
+        Model coefficient of each channel's Hill feature (units at saturation).
+    alpha : array-like
+        Half-saturation point, in execution units.
+    beta : array-like
+        Hill shape; curves with ``beta > 1`` are S-shaped.
+    ratio : array-like
+        Execution units bought per pound (see ``spend_ratios``).
+    """
+
+    def __init__(self, channels, coef, alpha, beta, ratio=1.0):
+        self.channels = list(channels)
+        self.coef = np.asarray(coef, dtype=float)
+        self.alpha = np.asarray(alpha, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+        self.ratio = np.asarray(ratio, dtype=float)
+
+    def _derivatives(self, spend):
+        h, dh, d2h = hill_derivatives(self.ratio * spend, self.alpha, self.beta)
+        return self.coef * h, self.coef * self.ratio * dh, self.coef * self.ratio**2 * d2h
+
+    def value(self, spend):
+        """Predicted units per channel, shape (..., channels)."""
+        return self._derivatives(spend)[0]
+
+    def gradient(self, spend):
+        """Marginal units per pound per channel."""
+        return self._derivatives(spend)[1]
+
+    def hessian(self, spend):
+        """Diagonal of the Hessian of the total response, per channel."""
+        return self._derivatives(spend)[2]
+
+    def total(self, spend):
+        """Predicted units summed over channels."""
+        return self.value(spend).sum(axis=-1)
+
+    def inflection(self):
+        """Spend at which each curve turns concave (0 for ``beta <= 1``)."""
+        beta = np.maximum(self.beta, 1.0)
+        return self.alpha * ((beta - 1) / (beta + 1)) ** (1 / beta) / self.ratio
+
+    def save(self, path):
+        """Write the curves to ``path`` (``.npz``), atomically."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, coef=self.coef, alpha=self.alpha, beta=self.beta, ratio=self.ratio,
+                     meta=np.array(json.dumps({"channels": self.channels})))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Restore curves written by ``save``."""
+        with np.load(path) as state:
+            meta = json.loads(str(state["meta"]))
+            return cls(meta["channels"], state["coef"], state["alpha"], state["beta"], state["ratio"])
+
+
+def spend_ratios(panel, execution="execution", investment="investment (in pound)"):
+    """
+    Execution units bought per pound for every growth-driver leaf.
+
+    Parameters:
+    -----------
+    panel : WeeklyPanel
+        Output of ``ingest.ingest_long``.
+
+    Returns:
+    --------
+    pd.Series: Indexed by ``"L2 | L3 | L4 | L5"`` label; NaN where no
+    investment was recorded.
+    """
+    totals = np.asarray(panel.values).sum(axis=0)
+    exe = totals[:, panel.value_names.index(execution)]
+    inv = totals[:, panel.value_names.index(investment)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(inv > 0, exe / inv, np.nan)
+    return pd.Series(ratio, index=panel.leaf_labels)
+
+
+def _best_response(curves, lam, lower, upper, start, guess=None, tol=1e-12, newton_iter=20):
+    """
+    Spend maximizing ``f(s) - lam * s`` on ``[lower, upper]``, elementwise.
+
+    Returns the spend and the Hessian there (0 where the spend sits on a bound).
+    """
+    lo, hi = start.copy(), upper.copy()
+    _, g_lo, _ = curves._derivatives(lo)
+    _, g_hi, _ = curves._derivatives(hi)
+    interior = (lam < g_lo) & (lam > g_hi)
+    s = 0.5 * (lo + hi) if guess is None else np.clip(guess, lo, hi)
+    s = np.where(interior, s, np.where(lam >= g_lo, lo, hi))
+    H = np.zeros_like(s)
+    for _ in range(newton_iter):
+        _, g, H = curves._derivatives(s)
+        # f' is decreasing on [start, upper]: keep the root bracketed
+        lo = np.where(interior & (g > lam), s, lo)
+        hi = np.where(interior & (g <= lam), s, hi)
+        # Newton step on log f' versus log s, which is close to linear on the tail
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            step = s * np.exp(-np.log(g / lam) * g / (s * H))
+        inside = (step >= lo) & (step <= hi)
+        new = np.where(interior, np.where(inside, step, 0.5 * (lo + hi)), s)
+        done = np.all(np.abs(new - s) <= tol * np.maximum(np.abs(s), 1.0))
+        s = new
+        if done:
+            break
+    H = np.where(interior, H, 0.0)
+    # On [lower, start] the curve is convex, so the best spend there is an endpoint
+    f_s, _, _ = curves._derivatives(s)
+    f_lower, _, _ = curves._derivatives(lower)
+    at_lower = f_lower - lam * lower > f_s - lam * s
+    return np.where(at_lower, lower, s), np.where(at_lower, 0.0, H)
+
+
+def _dual_solve(curves, B, lower, upper, start, tol, max_iter):
+    """
+    Find the marginal return at which the best responses spend ``B``.
+
+    Newton steps on log spend versus log return (the slope of spend in the
+    return is the sum of the inverse channel Hessians), safeguarded by a
+    geometric bisection bracket.
+    """
+    lam_lo = np.maximum(curves.gradient(upper).min(axis=-1, keepdims=True), 1e-300)
+    lam_hi = np.maximum(curves.gradient(np.maximum(start, 1e-12 * B)).max(axis=-1, keepdims=True), lam_lo) * 2
+    s_lo, _ = _best_response(curves, lam_lo, lower, upper, start)
+    s_hi, _ = _best_response(curves, lam_hi, lower, upper, start)
+    lam, s = np.sqrt(lam_lo * lam_hi), None
+    error = np.full_like(lam, np.inf)
+    infeasible = (lower.sum(axis=-1, keepdims=True) > B) | (upper.sum(axis=-1, keepdims=True) < B)
+    for _ in range(max_iter):
+        s, H = _best_response(curves, lam, lower, upper, start, guess=s)
+        total = s.sum(axis=-1, keepdims=True)
+        over = total >= B
+        lam_lo, s_lo = np.where(over, lam, lam_lo), np.where(over, s, s_lo)
+        lam_hi, s_hi = np.where(over, lam_hi, lam), np.where(over, s_hi, s)
+        done = (np.abs(total - B) <= tol * B) | (lam_hi - lam_lo <= tol * lam_hi) | infeasible
+        if done.all():
+            break
+        # Spend is close to a power of lam on the concave branches: step in logs
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            elasticity = lam * np.where(H < 0, 1.0 / H, 0.0).sum(axis=-1, keepdims=True) / total
+            step = lam * np.exp(-np.log(total / B) / elasticity)
+        # Bisect when Newton stalls, e.g. bouncing across a channel reaching a bound
+        stalled = np.abs(total - B) > 0.5 * error
+        error = np.abs(total - B)
+        inside = (elasticity < 0) & (step > lam_lo) & (step < lam_hi) & ~stalled
+        lam = np.where(done, lam, np.where(inside, step, np.sqrt(lam_lo * lam_hi)))
+
+    # A channel jumping onto its S-curve makes total spend discontinuous in
+    # lam; the budget-exact spend lies between the two bracketing solutions.
+    total_lo, total_hi = s_lo.sum(axis=-1, keepdims=True), s_hi.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        theta = np.where(total_lo > total_hi, (B - total_hi) / (total_lo - total_hi), 1.0)
+    spend = s_hi + np.clip(theta, 0.0, 1.0) * (s_lo - s_hi)
+    return spend, lam[..., 0]
+
+
+def _grid_start(curves, B, lower, upper, start, points=128):
+    """
+    Starting pattern from the best allocation of ``points`` equal budget steps.
+
+    The discrete problem is solved exactly by dynamic programming over the
+    channels, so unlike the dual it is not misled by the S-curves. Returns
+    the channels on the concave branch, the one (if any) part-way up its
+    convex branch, the grid spend of any other channel left part-way up
+    (NaN elsewhere), and whether the grid could spend the budget at all.
+    """
+    j = np.arange(points + 1)
+    step = (B - lower.sum(axis=-1, keepdims=True)) / points
+    grid = lower + j.reshape((-1,) + (1,) * lower.ndim) * step
+    f = np.where(grid <= upper * (1 + 1e-12), curves.value(grid), -np.inf)
+    # value[m] is the best total of the channels so far when they use m steps
+    value, choices = f[..., 0], []
+    before = j[:, None] - j[None, :]
+    fits = (before >= 0).reshape(before.shape + (1,) * (lower.ndim - 1))
+    for k in range(1, lower.shape[-1]):
+        total = np.where(fits, value[np.maximum(before, 0)] + f[None, ..., k], -np.inf)
+        best = np.argmax(total, axis=1)
+        choices.append(best)
+        value = np.take_along_axis(total, best[:, None], axis=1)[:, 0]
+    steps, m = [], np.full(value.shape[1:], points)
+    for best in reversed(choices):
+        steps.append(np.take_along_axis(best, m[None], axis=0)[0])
+        m = m - steps[-1]
+    spend = lower + np.stack([m] + steps[::-1], axis=-1) * step
+    return _pattern(spend, lower, start) + (np.isfinite(value[points]),)
+
+
+def _pattern(spend, lower, start):
+    """
+    Pattern of a feasible spend: the channels on the concave branch, the
+    one furthest up its convex branch, and the spend of the others part-way
+    up theirs (NaN elsewhere), which ``_solve_on`` then holds.
+    """
+    on = spend >= start
+    convex = (spend > lower) & ~on
+    largest = np.argmax(np.where(convex, spend - lower, -1.0), axis=-1)[..., None]
+    partial = convex & (np.arange(lower.shape[-1]) == largest)
+    return on, partial, np.where(convex & ~partial, spend, np.nan)
+
+
+def _solve_on(curves, B, lower, upper, start, on, partial, fixed, tol, max_iter, grid=17, rounds=6):
+    """
+    Subproblem for a fixed pattern: channels in ``on`` spend on the concave
+    branch of their curve, the ``partial`` channel (at most one per row) is
+    filled part-way along the convex branch below ``start``, channels with
+    a non-NaN ``fixed`` spend keep it, and the others stay at their lower
+    bound.
+
+    Without a partial channel the subproblem is concave and solved exactly
+    through the dual. With one, every marginal return ``lam`` fixes the
+    best spend of the concave channels and the partial channel takes what
+    is left of the budget; the best ``lam`` is found by zooming a log grid,
+    all grid points being evaluated at once.
+
+    Returns spend, marginal return and total units (-inf where infeasible).
+    """
+    held = ~np.isnan(fixed)
+    lo = np.where(partial, 0.0, np.where(held, fixed, np.where(on, start, lower)))
+    hi = np.where(partial, 0.0, np.where(held, fixed, np.where(on, upper, lower)))
+    # Fill of the partial channel (0 without one) that the others can absorb
+    r_lo = np.maximum(np.where(partial, lower, 0.0).sum(axis=-1, keepdims=True), B - hi.sum(axis=-1, keepdims=True))
+    r_hi = np.minimum(np.where(partial, start, 0.0).sum(axis=-1, keepdims=True), B - lo.sum(axis=-1, keepdims=True))
+    feasible = (r_lo <= r_hi + 1e-12 * B)[..., 0]
+    r_hi = np.maximum(r_lo, r_hi)
+
+    # Both ends of the fill range; without a partial channel the first is the answer
+    ends, lam_ends = _dual_solve(curves, B - np.stack([r_hi, r_lo]), lo, hi, lo, tol, max_iter)
+    ends = np.where(partial, np.stack([r_hi, r_lo]), ends)
+    values = np.where(feasible, curves.total(ends), -np.inf)
+    k = np.argmax(values, axis=0)[None]
+    best_spend = np.take_along_axis(ends, k[..., None], axis=0)[0]
+    best_lam = np.take_along_axis(lam_ends, k, axis=0)[0]
+    best_value = np.take_along_axis(values, k, axis=0)[0]
+    if not partial.any():
+        return best_spend, best_lam, best_value
+
+    # The dual leaves lam loose where a bracket end puts every concave
+    # channel on a bound; the end is then the extreme return of the branches
+    free = hi > lo
+    g_min = np.where(free, curves.gradient(hi), np.inf).min(axis=-1, keepdims=True)
+    g_max = np.where(free, curves.gradient(lo), 0.0).max(axis=-1, keepdims=True)
+    at_hi = B - r_lo >= hi.sum(axis=-1, keepdims=True) * (1 - 1e-12)
+    at_lo = B - r_hi <= lo.sum(axis=-1, keepdims=True) * (1 + 1e-12)
+    none_free = ~free.any(axis=-1, keepdims=True)
+    lam_a = np.where(none_free, 1.0, np.clip(np.where(at_hi, g_min, lam_ends[1][..., None]), g_min, g_max))
+    lam_b = np.where(none_free, 1.0, np.clip(np.where(at_lo, g_max, lam_ends[0][..., None]), g_min, g_max))
+    frac = np.linspace(0.0, 1.0, grid).reshape((grid,) + (1,) * lo.ndim)
+    has_partial = partial.any(axis=-1) & feasible
+    for _ in range(rounds):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lam = lam_a * (lam_b / lam_a) ** frac
+        s, _ = _best_response(curves, lam, lo, hi, lo)
+        r = B - s.sum(axis=-1, keepdims=True)
+        inside = ((r >= r_lo - 1e-9 * B) & (r <= r_hi + 1e-9 * B))[..., 0]
+        spend = np.where(partial, np.clip(r, r_lo, r_hi), s)
+        value = np.where(has_partial & inside, curves.total(spend), -np.inf)
+        k = np.argmax(value, axis=0)[None]
+        better = np.take_along_axis(value, k, axis=0)[0] > best_value
+        best_spend = np.where(better[..., None], np.take_along_axis(spend, k[..., None], axis=0)[0], best_spend)
+        best_lam = np.where(better, np.take_along_axis(lam[..., 0], k, axis=0)[0], best_lam)
+        best_value = np.where(better, np.take_along_axis(value, k, axis=0)[0], best_value)
+        # Keep the grid cells either side of the best point
+        k = k[..., None]
+        lam_a, lam_b = (np.take_along_axis(lam, np.maximum(k - 1, 0), axis=0)[0],
+                        np.take_along_axis(lam, np.minimum(k + 1, grid - 1), axis=0)[0])
+    return best_spend, best_lam, best_value
+
+
+def allocate(curves, budget, lower=None, upper=None, tol=1e-9, max_iter=100):
+    """
+    Split ``budget`` across channels to maximize predicted units.
+
+    S-shaped curves make the problem non-concave. At an optimum every
+    channel sits at a bound or on the concave branch of its curve, except
+    at most one that is filled part-way along its convex branch. The best
+    of the patterns of the dual solution, of an exact knapsack over a
+    budget grid and of a proportional fill of the bounds is the first
+    choice of channels, which is then improved by switching single S-shaped
+    channels on or off or moving the partial channel; all candidates and
+    scenarios are solved at once.
+
+    Parameters:
+    -----------
+    curves : ResponseCurves
+    budget : float or array-like
+        Weekly budget; an array of shape (scenarios,) solves one allocation per entry.
+    lower, upper : array-like, optional
+        Per-channel spend bounds, shape (channels,) or (scenarios, channels).
+        Default to 0 and the budget.
+    tol : float
+        Relative tolerance on the spent budget and the marginal return.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: Spend, shape (..., channels), and the marginal
+    return per pound at the optimum, shape (...).
+
+    Raises:
+    -------
+    ValueError: If the bounds cannot spend the budget, or no allocation
+    spending it was found.
+    """
+    budget = np.asarray(budget, dtype=float)
+    n = len(curves.channels)
+    shape = np.broadcast_shapes(budget.shape + (n,), curves.coef.shape, curves.alpha.shape,
+                                curves.beta.shape, curves.ratio.shape)
+    B = np.broadcast_to(budget[..., None], shape[:-1] + (1,))
+    lower = np.broadcast_to(np.zeros(n) if lower is None else np.asarray(lower, dtype=float), shape)
+    upper = np.minimum(np.broadcast_to(np.inf if upper is None else np.asarray(upper, dtype=float), shape), B)
+    if (lower.sum(axis=-1) > B[..., 0] * (1 + 1e-12)).any() or (upper.sum(axis=-1) < B[..., 0] * (1 - 1e-12)).any():
+        raise ValueError("budget is outside the range allowed by the channel bounds")
+
+    start = np.clip(np.broadcast_to(curves.inflection(), shape), lower, upper)
+    # Start from the best of the dual's pattern, the grid optimum's and that
+    # of the spend filling every channel's range in proportion, which always
+    # spends the budget (the grid may not when the caps nearly bind); only
+    # the on/off pattern of the dual solution is used, so a loose tolerance will do
+    spend, _ = _dual_solve(curves, B, lower, upper, start, 1e-6, max_iter)
+    grid_on, grid_partial, grid_fixed, grid_ok = _grid_start(curves, B, lower, upper, start)
+    room = upper - lower
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill = lower + room * np.nan_to_num((B - lower.sum(axis=-1, keepdims=True)) / room.sum(axis=-1, keepdims=True))
+    fill_on, fill_partial, fill_fixed = _pattern(fill, lower, start)
+    cand_on = np.stack([spend >= start, grid_on, fill_on])
+    cand_partial = np.stack([np.zeros(shape, dtype=bool), grid_partial & grid_ok[..., None], fill_partial])
+    cand_fixed = np.stack([np.full(shape, np.nan), np.where(grid_ok[..., None], grid_fixed, np.nan), fill_fixed])
+    cand_spend, cand_lam, cand_value = _solve_on(curves, B, lower, upper, start, cand_on, cand_partial,
+                                                 cand_fixed, tol, max_iter)
+    best = np.argmax(cand_value, axis=0)[None]
+    spend = np.take_along_axis(cand_spend, best[..., None], axis=0)[0]
+    on = np.take_along_axis(cand_on, best[..., None], axis=0)[0]
+    partial = np.take_along_axis(cand_partial, best[..., None], axis=0)[0]
+    fixed = np.take_along_axis(cand_fixed, best[..., None], axis=0)[0]
+    lam = np.take_along_axis(cand_lam, best, axis=0)[0]
+    value = np.take_along_axis(cand_value, best, axis=0)[0]
+
+    # Local search over the pattern of the S-shaped channels: switch one on
+    # or off, drop it to its lower bound, or make it the partially filled
+    # channel (the previous one going to its lower bound or its concave
+    # branch); a channel held at its grid spend is released when picked
+    toggles = np.flatnonzero(np.any(np.broadcast_to(curves.beta, shape) > 1, axis=tuple(range(len(shape) - 1))))
+    pick = np.zeros((len(toggles),) + shape, dtype=bool)
+    pick[np.arange(len(toggles)), ..., toggles] = True
+    for _ in range(4 * len(toggles)):
+        cand_on = np.concatenate([on ^ pick, on & ~pick, on & ~pick, (on | partial) & ~pick])
+        cand_partial = np.concatenate([partial & ~pick, partial & ~pick, pick, pick])
+        cand_fixed = np.where(np.concatenate([pick] * 4), np.nan, fixed)
+        cand_spend, cand_lam, cand_value = _solve_on(curves, B, lower, upper, start, cand_on, cand_partial,
+                                                     cand_fixed, tol, max_iter)
+        best = np.argmax(cand_value, axis=0)[None]
+        best_value = np.take_along_axis(cand_value, best, axis=0)[0]
+        better = (best_value > value) & (best_value - value > 1e-12 * np.abs(best_value))
+        if not better.any():
+            break
+        spend = np.where(better[..., None], np.take_along_axis(cand_spend, best[..., None], axis=0)[0], spend)
+        on = np.where(better[..., None], np.take_along_axis(cand_on, best[..., None], axis=0)[0], on)
+        partial = np.where(better[..., None], np.take_along_axis(cand_partial, best[..., None], axis=0)[0], partial)
+        fixed = np.where(better[..., None], np.take_along_axis(cand_fixed, best[..., None], axis=0)[0], fixed)
+        lam = np.where(better, np.take_along_axis(cand_lam, best, axis=0)[0], lam)
+        value = np.where(better, best_value, value)
+
+    # Well above the solver tolerance: anything larger is a search failure
+    spent = spend.sum(axis=-1)
+    if not np.isfinite(value).all() or (np.abs(spent - B[..., 0]) > 1e-6 * np.maximum(B[..., 0], 1.0)).any():
+        raise ValueError("no allocation spending the budget within the channel bounds was found")
+    return spend, lam
@@ -0,0 +1,347 @@
+"""Parallel search over SARIMA and VAR baselines of the target.
+
+``lorealmmm.ipynb`` fits every SARIMAX order of a {0, 1} grid one after
+another. Here the candidates run on a process pool instead, and:
+
+* the differenced and seasonally differenced series are computed once
+  per (d, D, s) in the parent and shipped to the workers, which fit the
+  ARMA part on them (statsmodels' ``simple_differencing``) and integrate
+  the forecasts back;
+* candidates form a tree in which every order is nested in its parent
+  (one fewer AR / MA term), and a candidate is only submitted once its
+  parent has finished, starting its optimizer from the parent's estimates
+  (and statsmodels' initial guesses for the new terms) whenever that start
+  has the higher likelihood;
+* every fit runs under a wall-clock limit in the worker, so one slow
+  order does not stall the search.
+
+Candidates are scored by AIC / BIC of the full-sample fit and by the
+walk-forward error of ``validation.rolling_origin`` folds (parameters
+fitted on the weeks before the first origin, then filtered forward
+without refitting). All candidates share the same folds, so their
+errors are comparable across differencing orders; AIC only is within
+the same (d, D, s).
+
+statsmodels is imported by the workers on first use.
+"""
+
+import itertools
+import os
+import signal
+import time
+import warnings
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import context, count, emit, stage
+from .validation import cv_metrics, rolling_origin
+
+MIN_TRAIN = 13  # differenced training weeks of the first fold
+
+
+class CandidateTimeout(Exception):
+    """A candidate fit ran past its time limit."""
+
+
+def sarima_grid(p=(0, 1, 2), d=(0, 1), q=(0, 1, 2), P=(0, 1), D=(0, 1), Q=(0, 1), s=52):
+    """SARIMA candidates of every combination of orders."""
+    return [{"model": "sarima", "order": (ar, i, ma), "seasonal_order": (sar, si, sma, s)}
+            for ar, i, ma, sar, si, sma in itertools.product(p, d, q, P, D, Q)]
+
+
+def var_grid(lags=(1, 2, 3, 4, 5), d=(0, 1)):
+    """VAR candidates of every lag order and differencing order."""
+    return [{"model": "var", "lags": k, "d": i} for k, i in itertools.product(lags, d)]
+
+
+def candidate_key(spec):
+    """Readable identifier such as ``SARIMA(1,1,0)x(0,1,1,52)`` or ``VAR(3,d=1)``."""
+    if spec["model"] == "sarima":
+        return "SARIMA({},{},{})x({},{},{},{})".format(*spec["order"], *spec["seasonal_order"])
+    if spec["model"] == "var":
+        return f"VAR({spec['lags']},d={spec['d']})"
+    raise ValueError(f"Unknown baseline model: {spec['model']!r}")
+
+
+def _differencing(spec):
+    if spec["model"] == "sarima":
+        return spec["order"][1], spec["seasonal_order"][1], spec["seasonal_order"][3]
+    return spec["d"], 0, 0
+
+
+def _parent(spec):
+    """The candidate with one fewer AR / MA term (the last non-zero of p, q, P, Q), or None."""
+    if spec["model"] == "var":
+        return None if spec["lags"] <= 1 else {**spec, "lags": spec["lags"] - 1}
+    (p, d, q), (P, D, Q, s) = spec["order"], spec["seasonal_order"]
+    orders = [p, q, P, Q]
+    nonzero = [i for i, o in enumerate(orders) if o > 0]
+    if not nonzero:
+        return None
+    orders[nonzero[-1]] -= 1
+    p, q, P, Q = orders
+    return {**spec, "order": (p, d, q), "seasonal_order": (P, D, Q, s)}
+
+
+def difference_polynomial(d=0, D=0, s=0):
+    """Coefficients of (1 - B)^d (1 - B^s)^D in ascending powers of the backshift B."""
+    c = np.array([1.0])
+    for _ in range(d):
+        c = np.convolve(c, [1.0, -1.0])
+    for _ in range(D):
+        c = np.convolve(c, np.r_[1.0, np.zeros(s - 1), -1.0])
+    return c
+
+
+def difference(values, d=0, D=0, s=0):
+    """Differenced series along axis 0; the first ``d + D * s`` weeks are lost."""
+    values = np.asarray(values, dtype=float)
+    c = difference_polynomial(d, D, s)
+    K = len(c) - 1
+    out = np.zeros((len(values) - K,) + values.shape[1:])
+    for k in np.flatnonzero(c):
+        out += c[k] * values[K - k : len(values) - k]
+    return out
+
+
+def integrate(history, forecast, d=0, D=0, s=0):
+    """Levels of a forecast of the differenced series, continuing ``history``."""
+    c = difference_polynomial(d, D, s)
+    lags = np.flatnonzero(c)[1:]
+    out = np.r_[np.asarray(history, dtype=float), np.zeros(len(forecast))]
+    for i, w in enumerate(forecast):
+        t = len(history) + i
+        out[t] = w - c[lags] @ out[t - lags]
+    return out[len(history):]
+
+
+@contextmanager
+def time_limit(seconds):
+    """Raise ``CandidateTimeout`` in the block after ``seconds`` (no limit where SIGALRM is missing)."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise CandidateTimeout(f"no result after {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _sarima_model(w, exog, spec):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    (p, d, q), (P, D, Q, s) = spec["order"], spec["seasonal_order"]
+    return SARIMAX(w, exog=exog, order=(p, 0, q),
+                   seasonal_order=(P, 0, Q, s) if P or Q else (0, 0, 0, 0),
+                   trend="c" if d == 0 and D == 0 else "n",
+                   enforce_stationarity=False, enforce_invertibility=False)
+
+
+def _fit_sarima(w, exog, spec, start, maxiter):
+    model = _sarima_model(w, exog, spec)
+    start_params = None
+    if start:
+        # Nested estimates for the shared terms, statsmodels' own guesses for the new ones;
+        # kept only when they start from a higher likelihood than the guesses alone
+        defaults = model.start_params
+        warm = np.array([start.get(name, default) for name, default in zip(model.param_names, defaults)])
+        if model.loglike(warm) > model.loglike(defaults):
+            start_params = warm
+    count("baseline.fit")
+    return model.fit(start_params=start_params, maxiter=maxiter, disp=False)
+
+
+def _sarima(spec, start, maxiter, folds):
+    y = _worker_series["y"]
+    d, D, s = _differencing(spec)
+    w, exog_w = _worker_series[d, D, s]
+    K = len(y) - len(w)
+    result = _fit_sarima(w, exog_w, spec, start, maxiter)
+    params = dict(zip(result.model.param_names, map(float, result.params)))
+    out = {"aic": float(result.aic), "bic": float(result.bic), "params": params}
+
+    # Out of sample: fit on the weeks before the first origin, then only filter
+    first = folds[0][1] - K
+    train = _fit_sarima(w[:first], None if exog_w is None else exog_w[:first], spec, params, maxiter)
+    origins, weeks, predicted = [], [], []
+    for _, origin, end in folds:
+        o = origin - K
+        sub = _sarima_model(w[:o], None if exog_w is None else exog_w[:o], spec)
+        filtered = sub.filter(train.params)
+        forecast = filtered.forecast(end - origin, exog=None if exog_w is None else exog_w[o : end - K])
+        origins.append(np.full(end - origin, origin))
+        weeks.append(np.arange(origin, end))
+        predicted.append(integrate(y[:origin], np.asarray(forecast), d, D, s))
+    return out, origins, weeks, predicted
+
+
+def _var(spec, start, maxiter, folds):
+    from statsmodels.tsa.api import VAR
+
+    data, k, d = _worker_series["var"], spec["lags"], spec["d"]
+    w = _worker_series["var", d]
+    K = len(data) - len(w)
+    count("baseline.fit")
+    result = VAR(w).fit(k)
+    out = {"aic": float(result.aic), "bic": float(result.bic), "params": {}}
+
+    # OLS is closed form: every fold refits, and there is nothing to warm-start
+    origins, weeks, predicted = [], [], []
+    for _, origin, end in folds:
+        o = origin - K
+        count("baseline.fit")
+        fold = VAR(w[:o]).fit(k)
+        forecast = fold.forecast(w[o - k : o], end - origin)[:, 0]
+        origins.append(np.full(end - origin, origin))
+        weeks.append(np.arange(origin, end))
+        predicted.append(integrate(data[:origin, 0], forecast, d))
+    return out, origins, weeks, predicted
+
+
+_worker_series = None
+_worker_options = None
+
+
+def _init_worker(series, options):
+    global _worker_series, _worker_options
+    _worker_series = series
+    _worker_options = options
+
+
+def _fit_candidate(spec, start):
+    key = candidate_key(spec)
+    timeout, maxiter, folds = (_worker_options[k] for k in ("timeout", "maxiter", "folds"))
+    record = {"candidate": key, "model": spec["model"], "warm_start": bool(start)}
+    begin = time.perf_counter()
+    try:
+        with context(candidate=key), stage("baseline"), time_limit(timeout), warnings.catch_warnings():
+            # Convergence and start-parameter warnings of every order would flood the log
+            warnings.simplefilter("ignore")
+            fit = _sarima if spec["model"] == "sarima" else _var
+            out, origins, weeks, predicted = fit(spec, start, maxiter, folds)
+        y = _worker_series["y"]
+        weeks = np.concatenate(weeks)
+        predictions = pd.DataFrame({"origin": np.concatenate(origins), "week": weeks,
+                                    "actual": y[weeks], "predicted": np.concatenate(predicted)})
+        record.update(status="ok", **out, **cv_metrics(predictions))
+    except CandidateTimeout as exc:
+        record.update(status="timeout", reason=str(exc))
+    except Exception as exc:  # one bad order must not kill the search
+        record.update(status="error", reason=f"{type(exc).__name__}: {exc}")
+    record["elapsed"] = time.perf_counter() - begin
+    return record
+
+
+def baseline_search(y, candidates, exog=None, var_data=None, n_jobs=None, timeout=60.0,
+                    maxiter=200, initial=52, horizon=4, step=None, rank_by=("cv_rmse", "aic"),
+                    verbose=True):
+    """
+    Fit and rank SARIMA / VAR baselines.
+
+    Parameters:
+    -----------
+    y : pd.Series or array-like
+        Weekly target, in time order.
+    candidates : list of dict
+        From ``sarima_grid`` and / or ``var_grid``.
+    exog : pd.DataFrame or array-like, optional
+        Regressors of the SARIMA candidates (SARIMAX), known over the
+        forecast horizons; differenced like ``y``.
+    var_data : pd.DataFrame or array-like, optional
+        Series of the VAR candidates, the target first; required with VAR candidates.
+    n_jobs : int, optional
+        Worker processes; defaults to the CPU count, 1 runs in-process.
+    timeout : float, optional
+        Seconds per candidate (full-sample and fold fits together); None for no limit.
+    maxiter : int
+        Optimizer iterations per SARIMA fit.
+    initial, horizon, step :
+        Walk-forward layout, see ``validation.rolling_origin``. The first
+        origin is moved later when the most differenced candidate would
+        have fewer than ``MIN_TRAIN`` training weeks.
+    rank_by : tuple of str
+        Columns the table is sorted on, ascending.
+
+    Returns:
+    --------
+    pd.DataFrame: One row per candidate with ``status``, ``aic``, ``bic``,
+    ``cv_r2``, ``cv_rmse``, ``cv_nrmse``, ``cv_folds``, ``warm_start``,
+    ``elapsed`` and the fitted ``params``, best first.
+    """
+    y = np.asarray(y, dtype=float)
+    exog = None if exog is None else np.asarray(exog, dtype=float)
+    specs = {candidate_key(spec): spec for spec in candidates}
+    if any(spec["model"] == "var" for spec in specs.values()) and var_data is None:
+        raise ValueError("VAR candidates need var_data")
+
+    # Differenced series, once per differencing order
+    series = {"y": y, "exog": exog}
+    for spec in specs.values():
+        d, D, s = _differencing(spec)
+        if spec["model"] == "sarima" and (d, D, s) not in series:
+            series[d, D, s] = (difference(y, d, D, s), None if exog is None else difference(exog, d, D, s))
+        elif spec["model"] == "var" and ("var", d) not in series:
+            series["var"] = np.asarray(var_data, dtype=float)
+            series["var", d] = difference(series["var"], d)
+    lost = max(len(difference_polynomial(*_differencing(spec))) - 1 for spec in specs.values())
+    folds = rolling_origin(len(y), max(initial, lost + MIN_TRAIN), horizon, step)
+    if not folds:
+        raise ValueError(f"{len(y)} weeks leave no walk-forward fold after {lost} differenced weeks")
+    options = {"timeout": timeout, "maxiter": maxiter, "folds": folds}
+
+    # Nesting tree: a candidate waits for the nearest ancestor in the grid
+    children, roots = defaultdict(list), []
+    for key, spec in specs.items():
+        parent = _parent(spec)
+        while parent is not None and candidate_key(parent) not in specs:
+            parent = _parent(parent)
+        (children[candidate_key(parent)] if parent is not None else roots).append(key)
+
+    records = []
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if verbose:
+        print(f"{len(specs)} baseline candidates, {len(folds)} walk-forward folds")
+
+    def finish(key, record, start):
+        records.append(record)
+        emit("baseline", candidate=key, status=record["status"], elapsed=record["elapsed"],
+             aic=record.get("aic"), cv_rmse=record.get("cv_rmse"))
+        if verbose:
+            print(f"{key:>28} {record['status']:>7} {record['elapsed']:7.2f}s "
+                  f"AIC {record.get('aic', np.nan):10.2f} cv RMSE {record.get('cv_rmse', np.nan):12.2f}")
+        # Children start from these estimates, or from what this candidate started from
+        warm = record["params"] if record["status"] == "ok" and record["params"] else start
+        return [(child, warm) for child in children[key]]
+
+    if n_jobs == 1:
+        _init_worker(series, options)
+        queue = deque((key, None) for key in roots)
+        while queue:
+            key, start = queue.popleft()
+            queue.extend(finish(key, _fit_candidate(specs[key], start), start))
+    else:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(series, options)) as pool:
+            pending = {pool.submit(_fit_candidate, specs[key], None): (key, None) for key in roots}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, start = pending.pop(future)
+                    for child, warm in finish(key, future.result(), start):
+                        pending[pool.submit(_fit_candidate, specs[child], warm)] = (child, warm)
+
+    table = pd.DataFrame(records).set_index("candidate")
+    for col in rank_by:
+        if col not in table.columns:
+            table[col] = np.nan
+    return table.sort_values(list(rank_by), na_position="last")
@@ -0,0 +1,218 @@
+"""Run the same model over many brand / market / channel panels.
+
+A long extract holding several panels is streamed once by
+``ingest.ingest_panels``, which builds every panel's weekly matrix in
+the same vectorized pass. The lag / decay / saturation / adstock columns
+of every panel are then built together: panels sharing their weeks are
+stacked side by side and each transform runs once over all their
+channels (``panel_blocks``). Each panel is then one independent task: its
+frame is built per model (the model's target and controls, the panel's
+execution and investment columns), and ``trial.evaluate_trial`` runs
+with a ``FeatureStore`` preloaded with the panel's columns, whose disk
+tier is shared by all workers. Only the selection and the fits are left
+to the tasks, so throughput grows with the number of workers until the
+largest panel dominates.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .data import DATE_COL, ONLINE_CONTROLS, TARGET
+from .feature_store import FeatureStore
+from .features import CHANNEL_TRANSFORMS, feature_layout, media_columns
+from .ingest import ingest_panels
+from .instrumentation import context, stage
+from .trial import evaluate_trial
+
+DEFAULT_MODELS = [{"name": "online", "target": TARGET, "controls": ONLINE_CONTROLS}]
+
+
+def model_columns(models):
+    """KPI columns (controls and targets) needed by ``models``, in first-seen order."""
+    columns = []
+    for model in models:
+        for col in list(model.get("controls", [])) + [model["target"]]:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def panel_frame(panel, target, controls=()):
+    """
+    Weekly dataset of one panel for one model, indexed by date.
+
+    Holds the panel's execution and investment columns, ``controls`` and
+    ``target``; the KPI columns of other models are left out so they do
+    not enter the design matrix.
+    """
+    df = panel.to_frame().set_index(DATE_COL)
+    keep = set(controls) | {target}
+    return df.drop(columns=[col for col in panel.kpi_names if col not in keep])
+
+
+def panel_blocks(frames, lag_range=5, span=4, alpha=0.7):
+    """
+    Transformed channel columns of many weekly frames at once.
+
+    Frames with the same weeks are stacked side by side, so every
+    (transform, parameter) of the feature layout is one vectorized call
+    over all their channels rather than one per panel.
+
+    Returns:
+    --------
+    list of dict: ``{(channel, transform, param): column}`` per frame, as
+    taken by ``FeatureStore.preload``.
+    """
+    transforms = list(dict.fromkeys((t, p) for _, t, p, _ in feature_layout(["_"], lag_range, span, alpha)))
+    out = [{} for _ in frames]
+    groups = {}
+    for i, df in enumerate(frames):
+        groups.setdefault(df.index.to_numpy().tobytes(), []).append(i)
+    for members in groups.values():
+        owners = [(i, col) for i in members for col in media_columns(frames[i])]
+        if not owners:
+            continue
+        stacked = np.column_stack([frames[i][col].to_numpy(dtype=float) for i, col in owners])
+        for transform, param in transforms:
+            values = CHANNEL_TRANSFORMS[transform](stacked, param)
+            for j, (i, col) in enumerate(owners):
+                out[i][col, transform, param] = np.ascontiguousarray(values[:, j])
+    return out
+
+
+def contributions(store, params, result, target=TARGET):
+    """
+    Total contribution of every fitted term over the modelled weeks.
+
+    Returns:
+    --------
+    pd.DataFrame: ``feature``, ``coefficient``, ``contribution`` and
+    ``share`` (of the total fitted value), intercept first.
+    """
+    X, _ = store.design_matrix(params["lag_range"], params["span"], params["alpha"], target)
+    names = list(result["coefficients"])
+    coef = np.array([result["coefficients"][name] for name in names])
+    totals = np.r_[len(X), X[names[1:]].sum(axis=0).to_numpy()]
+    contribution = coef * totals
+    total = contribution.sum()
+    return pd.DataFrame({
+        "feature": names,
+        "coefficient": coef,
+        "contribution": contribution,
+        "share": contribution / total if total else np.nan,
+    })
+
+
+_worker_cache_dir = None
+
+
+def _init_worker(cache_dir=None):
+    global _worker_cache_dir
+    _worker_cache_dir = cache_dir
+
+
+def _run_panel(key, frames, params, blocks=None):
+    """Fit every model of one panel; returns (coefficient rows, metric rows)."""
+    tables, metrics = [], []
+    for name, (target, df) in frames.items():
+        start = time.perf_counter()
+        record = {"model": name, "n_weeks": len(df)}
+        try:
+            store = FeatureStore(df, cache_dir=_worker_cache_dir).preload(blocks or {})
+            with context(panel=list(key), model=name), stage("panel"):
+                result = evaluate_trial(df, params, store=store, target=target)
+            record["status"] = result["status"]
+            if result["status"] == "ok":
+                record.update(result["metrics"])
+                tables.append(contributions(store, params, result, target).assign(model=name))
+            else:
+                record["reason"] = result["reason"]
+        except Exception as exc:  # one bad panel must not kill the batch
+            record.update(status="error", reason=f"{type(exc).__name__}: {exc}")
+        record["elapsed"] = time.perf_counter() - start
+        metrics.append(record)
+    return key, tables, metrics
+
+
+def run_batch(panels, params, panel_cols=None, models=None, n_jobs=None, cache_dir=None,
+              chunksize=200_000, verbose=True):
+    """
+    Fit the same models to every panel.
+
+    Parameters:
+    -----------
+    panels : dict or str
+        ``{key tuple: WeeklyPanel}`` (see ``ingest.ingest_panels``), or the
+        path of a long CSV in the ``merged_data.csv`` layout, which is then
+        ingested grouped by ``panel_cols``.
+    params : dict
+        Trial parameters (see ``trial.PARAM_NAMES``) used for every fit.
+    panel_cols : list of str, optional
+        Panel key columns; required for a CSV, used to name the key
+        columns of the output otherwise.
+    models : list of dict, optional
+        ``{"name", "target", "controls"}`` per model fitted to every panel;
+        defaults to the online sellout model. A panel without a model's
+        target is reported as an error for that model.
+    n_jobs : int, optional
+        Worker processes; defaults to the CPU count, 1 runs in-process.
+    cache_dir : str, optional
+        Disk tier of every ``FeatureStore``, shared by workers.
+
+    Returns:
+    --------
+    pd.DataFrame, pd.DataFrame: Coefficient / contribution table (one row
+    per panel, model and term) and fit metrics (one row per panel and
+    model), both led by the panel key columns.
+    """
+    models = DEFAULT_MODELS if models is None else models
+    if isinstance(panels, str):
+        if panel_cols is None:
+            raise ValueError("panel_cols are needed to group a CSV into panels")
+        panels = ingest_panels(panels, panel_cols, chunksize, kpi_cols=model_columns(models))
+    n_keys = len(next(iter(panels), ()))
+    panel_cols = [f"key_{i}" for i in range(n_keys)] if panel_cols is None else list(panel_cols)
+
+    def frames(panel):
+        return {m["name"]: (m["target"], panel_frame(panel, m["target"], m.get("controls", ())))
+                for m in models}
+
+    # Every model of a panel has the same execution columns, so the blocks
+    # are built once per panel, for all panels together
+    tasks = [(key, frames(panel)) for key, panel in panels.items()]
+    blocks = panel_blocks([next(iter(f.values()))[1] for _, f in tasks],
+                          params["lag_range"], params["span"], params["alpha"])
+
+    tables, metrics = [], []
+
+    def finish(key, panel_tables, panel_metrics):
+        labels = dict(zip(panel_cols, key))
+        tables.extend(t.assign(**labels) for t in panel_tables)
+        metrics.extend({**labels, **m} for m in panel_metrics)
+        if verbose and len(metrics) // len(models) % 10 == 0:
+            print(f"{len(metrics) // len(models)}/{len(panels)} panels done")
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(cache_dir)
+        for (key, panel_frames), cached in zip(tasks, blocks):
+            finish(*_run_panel(key, panel_frames, params, cached))
+    else:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+            futures = [pool.submit(_run_panel, key, panel_frames, params, cached)
+                       for (key, panel_frames), cached in zip(tasks, blocks)]
+            for future in as_completed(futures):
+                finish(*future.result())
+
+    leading = panel_cols + ["model"]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(
+        columns=leading + ["feature", "coefficient", "contribution", "share"])
+    table = table[leading + [c for c in table.columns if c not in leading]]
+    metrics = pd.DataFrame(metrics) if metrics else pd.DataFrame(columns=leading + ["n_weeks", "status", "elapsed"])
+    metrics = metrics[leading + [c for c in metrics.columns if c not in leading]]
+    return (table.sort_values(leading, kind="stable", ignore_index=True),
+            metrics.sort_values(leading, kind="stable", ignore_index=True))
@@ -0,0 +1,279 @@
+"""Moving-block bootstrap of the bounded least-squares fit.
+
+Weekly residuals are autocorrelated, so weeks are resampled in blocks of
+consecutive rows. The Gram matrix of a resample is a sum of block Gram
+matrices, and each of those is a difference of two prefix sums of the
+row outer products. A refit therefore costs O(blocks x p^2) to form its
+normal equations plus one warm-started ``nnls_gram`` solve, with no
+DataFrame copy. Resamples are fanned out in chunks to worker processes
+that each open the same read-only design file, and the coefficient draws
+come back chunk by chunk into a running summary.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .data import TARGET
+from .design_matrix import DesignMatrix
+from .instrumentation import count
+from .solver import gram_system, nnls_gram
+from .trial import media_mask
+
+
+def _load_design(design, features, target):
+    if isinstance(design, str):
+        design = DesignMatrix(design).to_frame()
+    frame = design[list(features) + [target]].dropna()
+    return frame[list(features)].to_numpy(dtype=float), frame[target].to_numpy(dtype=float)
+
+
+class BlockGram:
+    """
+    Prefix sums of the row outer products of ``[1, X]`` and ``y``.
+
+    ``resample`` turns block start positions into the Gram matrices and
+    moment vectors of the corresponding bootstrap samples.
+    """
+
+    def __init__(self, X, y, intercept=True):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if intercept:
+            X = np.column_stack([np.ones(len(X)), X])
+        n, p = X.shape
+        self.n_weeks = n
+        self.G = np.zeros((n + 1, p, p))
+        np.cumsum(np.einsum("ti,tj->tij", X, X), axis=0, out=self.G[1:])
+        self.b = np.zeros((n + 1, p))
+        np.cumsum(X * y[:, None], axis=0, out=self.b[1:])
+
+    def resample(self, starts, lengths):
+        """
+        Normal equations of resamples built from blocks.
+
+        Parameters:
+        -----------
+        starts : np.ndarray
+            First week of every block, shape (resamples, blocks).
+        lengths : np.ndarray
+            Length of every block, shape (blocks,).
+
+        Returns:
+        --------
+        np.ndarray, np.ndarray: Gram matrices (resamples, p, p) and moments (resamples, p).
+        """
+        ends = starts + lengths
+        G = np.zeros((len(starts),) + self.G.shape[1:])
+        b = np.zeros((len(starts),) + self.b.shape[1:])
+        for k in range(starts.shape[1]):
+            G += self.G[ends[:, k]] - self.G[starts[:, k]]
+            b += self.b[ends[:, k]] - self.b[starts[:, k]]
+        return G, b
+
+
+def block_starts(rng, n_weeks, block, size):
+    """
+    Moving-block resampling plan.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: Start weeks, shape (size, blocks), drawn
+    uniformly from the ``n_weeks - block + 1`` possible blocks, and block
+    lengths, the last one trimmed so every resample has ``n_weeks`` rows.
+    """
+    n_blocks = -(-n_weeks // block)
+    lengths = np.full(n_blocks, block)
+    lengths[-1] = n_weeks - block * (n_blocks - 1)
+    return rng.integers(0, n_weeks - block + 1, size=(size, n_blocks)), lengths
+
+
+class BootstrapResult:
+    """
+    Coefficient draws with contribution and ROI summaries.
+
+    Attributes:
+    -----------
+    names : list of str
+        ``"Intercept"`` (when fitted) followed by the features.
+    point : np.ndarray
+        Full-sample coefficients.
+    draws : np.ndarray
+        Bootstrap coefficients collected so far, shape (n, len(names)).
+    totals : np.ndarray
+        Column sums of the full-sample design, so ``beta * totals`` is the
+        total contribution of each term.
+    spend : pd.Series
+        Total investment per feature, for ROI.
+    """
+
+    def __init__(self, names, point, totals, n_boot, spend=None):
+        self.names = list(names)
+        self.point = np.asarray(point, dtype=float)
+        self.totals = np.asarray(totals, dtype=float)
+        self._draws = np.empty((n_boot, len(self.names)))
+        self._n = 0
+        self.spend = None if spend is None else pd.Series(spend, dtype=float)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def draws(self):
+        return self._draws[: self._n]
+
+    def add(self, betas):
+        self._draws[self._n : self._n + len(betas)] = betas
+        self._n += len(betas)
+
+    def contributions(self):
+        """Total contribution of each term per draw, shape (n, len(names))."""
+        return self.draws * self.totals
+
+    def roi(self):
+        """Contribution per pound of the features listed in ``spend``, per draw."""
+        if self.spend is None:
+            raise ValueError("ROI needs the spend per feature")
+        cols = [self.names.index(f) for f in self.spend.index]
+        return pd.DataFrame(self.contributions()[:, cols] / self.spend.to_numpy(),
+                            columns=list(self.spend.index))
+
+    def summary(self, what="coefficients", quantiles=(0.05, 0.5, 0.95)):
+        """
+        Point estimate, bootstrap mean, std and quantiles of every term.
+
+        Parameters:
+        -----------
+        what : str
+            "coefficients", "contributions" or "roi".
+        """
+        if what == "coefficients":
+            values, point, index = self.draws, self.point, self.names
+        elif what == "contributions":
+            values, point, index = self.contributions(), self.point * self.totals, self.names
+        elif what == "roi":
+            roi = self.roi()
+            cols = [self.names.index(f) for f in roi.columns]
+            values, index = roi.to_numpy(), list(roi.columns)
+            point = self.point[cols] * self.totals[cols] / self.spend.to_numpy()
+        else:
+            raise ValueError(f"Unknown summary: {what!r}")
+        return interval_table(values, point, index, quantiles)
+
+
+def interval_table(values, point, index, quantiles=(0.05, 0.5, 0.95)):
+    """
+    Point estimate, mean, std and quantiles of bootstrap ``values``.
+
+    Parameters:
+    -----------
+    values : np.ndarray
+        One row per draw, shape (n, len(index)), e.g. the channel ROIs of
+        ``Decomposition.roi`` evaluated on ``BootstrapResult.draws``.
+    point : array-like
+        Full-sample value of every column.
+    """
+    values = np.asarray(values, dtype=float)
+    table = pd.DataFrame({"estimate": point, "mean": values.mean(axis=0),
+                          "std": values.std(axis=0, ddof=1)}, index=index)
+    for q, row in zip(quantiles, np.quantile(values, quantiles, axis=0)):
+        table[f"q{q:g}"] = row
+    return table
+
+
+_worker_grams = None
+_worker_args = None
+
+
+def _init_worker(design, features, target, intercept, block, nonneg, passive):
+    global _worker_grams, _worker_args
+    X, y = _load_design(design, features, target)
+    _worker_grams = BlockGram(X, y, intercept)
+    _worker_args = (block, nonneg, passive)
+
+
+def _run_chunk(seed, size):
+    block, nonneg, passive = _worker_args
+    rng = np.random.default_rng(seed)
+    starts, lengths = block_starts(rng, _worker_grams.n_weeks, block, size)
+    Gs, bs = _worker_grams.resample(starts, lengths)
+    count("bootstrap.refit", size)
+    return np.stack([nnls_gram(G, b, nonneg, passive)[0] for G, b in zip(Gs, bs)])
+
+
+def iter_bootstrap(design, features, target=TARGET, n_boot=2000, block=8, nonneg=None,
+                   intercept=True, spend=None, chunk=100, n_jobs=None, seed=None):
+    """
+    Run a moving-block bootstrap, yielding the running result after every chunk.
+
+    Parameters:
+    -----------
+    design : pd.DataFrame or str
+        Weekly data holding ``features`` and ``target``, or the path of a
+        design file that every worker memory-maps read-only.
+    features : list of str
+        Model columns, in coefficient order.
+    n_boot : int
+        Number of resamples.
+    block : int
+        Block length in weeks.
+    nonneg : array-like of bool, optional
+        Features constrained >= 0; defaults to the media columns. The
+        intercept is always free.
+    spend : dict or pd.Series, optional
+        Total investment per feature, for ROI summaries.
+    chunk : int
+        Resamples per task.
+    n_jobs : int, optional
+        Worker processes; defaults to the CPU count, 1 runs in-process.
+    seed : int, optional
+        The draws depend on ``seed`` only, not on ``n_jobs``.
+    """
+    features = list(features)
+    nonneg = media_mask(features) if nonneg is None else np.asarray(nonneg, dtype=bool)
+    X, y = _load_design(design, features, target)
+    if block > len(X):
+        raise ValueError(f"block of {block} weeks is longer than the {len(X)} weeks of data")
+
+    G, b, _ = gram_system(X, y, intercept)
+    constrained = np.r_[False, nonneg] if intercept else nonneg
+    point, passive = nnls_gram(G, b, constrained)
+    names = (["Intercept"] if intercept else []) + features
+    totals = np.r_[len(X), X.sum(axis=0)] if intercept else X.sum(axis=0)
+    result = BootstrapResult(names, point, totals, n_boot, spend)
+
+    sizes = [min(chunk, n_boot - start) for start in range(0, n_boot, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    initargs = (design, features, target, intercept, block, constrained, passive)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        for s, size in zip(seeds, sizes):
+            result.add(_run_chunk(s, size))
+            yield result
+        return
+
+    with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=initargs) as pool:
+        futures = [pool.submit(_run_chunk, s, size) for s, size in zip(seeds, sizes)]
+        for future in as_completed(futures):
+            result.add(future.result())
+            yield result
+
+
+def moving_block_bootstrap(design, features, target=TARGET, n_boot=2000, block=8, nonneg=None,
+                           intercept=True, spend=None, chunk=100, n_jobs=None, seed=None,
+                           verbose=True):
+    """
+    Bootstrap distribution of the bounded fit, see ``iter_bootstrap``.
+
+    Returns:
+    --------
+    BootstrapResult
+    """
+    for result in iter_bootstrap(design, features, target, n_boot, block, nonneg, intercept,
+                                 spend, chunk, n_jobs, seed):
+        if verbose and (len(result) // chunk) % 10 == 0:
+            print(f"{len(result)}/{n_boot} resamples done")
+    return result
@@ -0,0 +1,126 @@
+"""Vectorized calendar and holiday features for weekly data.
+
+Holidays are looked up once per country and year range into a sorted
+``datetime64[D]`` array. The number of holidays falling in each week is
+then two ``np.searchsorted`` calls over all weeks and countries, instead
+of a per-row ``date in holidays`` test.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _as_days(dates):
+    return pd.DatetimeIndex(dates).values.astype("datetime64[D]")
+
+
+class HolidayCalendar:
+    """
+    Sorted holiday dates for one or more countries.
+
+    Parameters:
+    -----------
+    countries : list of str
+        ISO codes understood by ``holidays.country_holidays`` (e.g. "GB", "FR").
+    years : iterable of int
+        Years to precompute.
+    dates : dict, optional
+        ``{country: iterable of dates}`` to use instead of the ``holidays``
+        package, e.g. a company trading calendar.
+    """
+
+    def __init__(self, countries=("GB",), years=range(2020, 2031), dates=None):
+        self.countries = list(countries)
+        self.dates = {}
+        if dates is None:
+            import holidays
+
+            dates = {c: list(holidays.country_holidays(c, years=list(years))) for c in self.countries}
+        for country in self.countries:
+            self.dates[country] = np.unique(np.asarray(dates[country], dtype="datetime64[D]"))
+
+    def counts(self, starts, days=7):
+        """
+        Holidays in ``[start, start + days)`` for every start and country.
+
+        Returns:
+        --------
+        np.ndarray: Shape (len(starts), len(countries)), int.
+        """
+        starts = _as_days(starts)
+        ends = starts + np.timedelta64(days, "D")
+        out = np.empty((len(starts), len(self.countries)), dtype=int)
+        for k, country in enumerate(self.countries):
+            table = self.dates[country]
+            out[:, k] = np.searchsorted(table, ends) - np.searchsorted(table, starts)
+        return out
+
+    def frame(self, starts, days=7):
+        """``counts`` as a DataFrame with one ``holidays_<country>`` column per country."""
+        return pd.DataFrame(self.counts(starts, days), index=pd.DatetimeIndex(starts),
+                            columns=[f"holidays_{c}" for c in self.countries])
+
+
+def fourier_terms(dates, period=365.25, order=2):
+    """
+    Yearly seasonality as sin/cos pairs of the day count.
+
+    Returns:
+    --------
+    pd.DataFrame: Columns ``sin_1, cos_1, ..., sin_order, cos_order``.
+    """
+    t = _as_days(dates).astype(np.int64) / period
+    k = np.arange(1, order + 1)
+    angles = 2 * np.pi * np.outer(t, k)
+    terms = np.empty((len(t), 2 * order))
+    terms[:, 0::2] = np.sin(angles)
+    terms[:, 1::2] = np.cos(angles)
+    names = [f"{f}_{i}" for i in k for f in ("sin", "cos")]
+    return pd.DataFrame(terms, index=pd.DatetimeIndex(dates), columns=names)
+
+
+def _dummies(codes, labels, prefix, index):
+    eye = np.eye(len(labels), dtype=np.int8)
+    return pd.DataFrame(eye[codes], index=index, columns=[f"{prefix}_{label}" for label in labels])
+
+
+def month_dummies(dates):
+    """One 0/1 column per calendar month (``month_1`` .. ``month_12``)."""
+    index = pd.DatetimeIndex(dates)
+    return _dummies(index.month.to_numpy() - 1, range(1, 13), "month", index)
+
+
+def iso_week_dummies(dates):
+    """One 0/1 column per ISO week (``week_1`` .. ``week_53``)."""
+    index = pd.DatetimeIndex(dates)
+    week = index.isocalendar().week.to_numpy(dtype=int)
+    return _dummies(week - 1, range(1, 54), "week", index)
+
+
+def calendar_features(dates, calendar=None, fourier_order=2, months=False, iso_weeks=False):
+    """
+    Week-level calendar block.
+
+    Parameters:
+    -----------
+    dates : array-like
+        Week start dates.
+    calendar : HolidayCalendar, optional
+        Adds one holiday-count column per country.
+    fourier_order : int
+        Number of yearly sin/cos pairs (0 for none).
+    months, iso_weeks : bool
+        Add month / ISO-week dummies.
+    """
+    index = pd.DatetimeIndex(dates)
+    blocks = [pd.DataFrame({"Year": index.year, "Month": index.month,
+                            "Week": index.isocalendar().week.to_numpy(dtype=int)}, index=index)]
+    if calendar is not None:
+        blocks.append(calendar.frame(index))
+    if fourier_order:
+        blocks.append(fourier_terms(index, order=fourier_order))
+    if months:
+        blocks.append(month_dummies(index))
+    if iso_weeks:
+        blocks.append(iso_week_dummies(index))
+    return pd.concat(blocks, axis=1)
@@ -0,0 +1,136 @@
+"""Correlation pruning with a reusable, incrementally updated matrix.
+
+The pruning rule is the one of the original script: walk the feature
+pairs in column order and, for every pair above the threshold whose two
+features are both still kept, drop the second one. That is the same as
+a greedy pass over the upper triangle, so the correlation matrix is
+computed once per feature set and every ``cor`` threshold afterwards
+only costs a boolean pass over it.
+"""
+
+import numpy as np
+
+
+def _standardize(values):
+    """Center columns and scale them to unit norm; constant columns become zero."""
+    values = np.asarray(values, dtype=float)
+    centered = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum("ij,ij->j", centered, centered))
+    norms[norms == 0] = np.inf
+    return centered / norms
+
+
+def greedy_upper_triangle(abs_corr, cor):
+    """
+    Boolean keep-mask of the greedy pairwise filter.
+
+    Parameters:
+    -----------
+    abs_corr : np.ndarray
+        Absolute correlation matrix, shape (p, p).
+    cor : float
+        Threshold; pairs strictly above it are pruned.
+    """
+    high = np.triu(abs_corr > cor, k=1)
+    keep = np.ones(len(abs_corr), dtype=bool)
+    for i in np.flatnonzero(high.any(axis=1)):
+        if keep[i]:
+            keep &= ~high[i]
+    return keep
+
+
+class CorrelationPruner:
+    """
+    Absolute correlation matrix of a feature set, updated column-wise.
+
+    Adding k columns to p existing ones costs one (n x p) @ (n x k)
+    product instead of recomputing the full (p x p) matrix; removing
+    columns only slices it.
+
+    Columns are identified by ``keys`` (default: their names). Pass
+    explicit keys when a name does not pin down the values, e.g.
+    ``_adstock`` columns built with different decays.
+    """
+
+    def __init__(self, X=None, keys=None):
+        self.columns = []
+        self.keys = []
+        self.index = None
+        self._z = None
+        self._corr = np.zeros((0, 0))
+        if X is not None:
+            self.add(X, keys)
+
+    def __len__(self):
+        return len(self.columns)
+
+    @property
+    def matrix(self):
+        """Absolute correlation matrix, ordered as ``columns``."""
+        return self._corr
+
+    def add(self, X, keys=None):
+        """Append the columns of ``X`` (same rows as the ones already held)."""
+        if self.index is None:
+            self.index = X.index
+        elif not X.index.equals(self.index):
+            raise ValueError("Added columns must share the pruner's row index")
+        z = _standardize(X.to_numpy(dtype=float))
+        if self._z is None:
+            self._z, self._corr = z, np.abs(z.T @ z)
+        else:
+            cross = np.abs(self._z.T @ z)
+            self._corr = np.block([[self._corr, cross], [cross.T, np.abs(z.T @ z)]])
+            self._z = np.hstack([self._z, z])
+        self.columns += list(X.columns)
+        self.keys += list(X.columns) if keys is None else list(keys)
+        return self
+
+    def remove(self, keys):
+        """Drop columns, given by key, from the held feature set."""
+        if self._z is None:
+            return self
+        drop = set(keys)
+        self._take(np.array([i for i, key in enumerate(self.keys) if key not in drop], dtype=int))
+        return self
+
+    def _take(self, positions):
+        self._z = self._z[:, positions]
+        self._corr = self._corr[np.ix_(positions, positions)]
+        self.columns = [self.columns[i] for i in positions]
+        self.keys = [self.keys[i] for i in positions]
+
+    def sync(self, X, keys=None):
+        """
+        Make the held feature set match ``X`` exactly, in ``X``'s column order.
+
+        Only columns new to the pruner are correlated; a different row
+        index (e.g. another lag window) triggers a full rebuild.
+        """
+        keys = list(X.columns) if keys is None else list(keys)
+        if self.index is None or not X.index.equals(self.index):
+            self.__init__(X, keys)
+            return self
+        held = set(self.keys)
+        wanted = set(keys)
+        if held - wanted:
+            self.remove(held - wanted)
+        new = [i for i, key in enumerate(keys) if key not in held]
+        if new:
+            self.add(X.iloc[:, new], [keys[i] for i in new])
+        position = {key: i for i, key in enumerate(self.keys)}
+        order = [position[key] for key in keys]
+        if order != list(range(len(order))):
+            self._take(np.array(order, dtype=int))
+        self.columns = list(X.columns)
+        return self
+
+    def to_drop(self, cor):
+        """Columns removed by the greedy filter at threshold ``cor``."""
+        keep = greedy_upper_triangle(self._corr, cor)
+        return [col for col, k in zip(self.columns, keep) if not k]
+
+    def prune(self, X, cor, keys=None):
+        """Return ``X`` without the columns pruned at threshold ``cor``."""
+        self.sync(X, keys)
+        return X.drop(columns=self.to_drop(cor))
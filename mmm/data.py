@@ -0,0 +1,59 @@
+"""Loading and reshaping of the long growth-driver extract."""
+
+import pandas as pd
+
+from .instrumentation import staged
+
+DATE_COL = "Starting Week"
+TARGET = "UK L'Oreal Paris Haircare Total Online Sellout Units"
+ONLINE_CONTROLS = [
+    "UK L'Oreal Paris Haircare Online Average Price (in pound)",
+    "UK L'Oreal Paris Haircare Total Weigheted Promotion Distribution (%)",
+]
+LEVEL_COLS = ["growth_driver_l2", "growth_driver_l3", "growth_driver_l4", "growth_driver_l5"]
+VALUE_COLS = ["execution", "investment (in pound)"]
+
+
+def load_merged(path="data/merged_data.csv"):
+    """Read ``merged_data.csv`` with parsed dates and a single ``Year`` column."""
+    df = pd.read_csv(path, parse_dates=[DATE_COL])
+    if "Year_x" in df.columns:
+        df = df.drop(columns=["Year_y"], errors="ignore").rename(columns={"Year_x": "Year"})
+    return df.sort_values(DATE_COL)
+
+
+@staged("pivot")
+def build_online_dataset(df, target=TARGET, controls=ONLINE_CONTROLS):
+    """
+    Pivot the long extract to one row per week.
+
+    Execution and investment are summed per growth-driver combination
+    (L2 | L3 | L4 | L5) into ``"execution - <combination>"`` and
+    ``"investment (in pound) - <combination>"`` columns; the weekly KPI
+    columns are merged back unchanged.
+    """
+    df = df.copy()
+    df["growth_driver_combination"] = df[LEVEL_COLS].astype(str).agg(" | ".join, axis=1)
+
+    pivot_df = df.pivot_table(
+        index=[DATE_COL, "Year"],
+        columns="growth_driver_combination",
+        values=VALUE_COLS,
+        aggfunc="sum",
+        fill_value=0,
+    )
+    pivot_df.columns = [f"{col[0]} - {col[1]}" for col in pivot_df.columns]
+    pivot_df = pivot_df.reset_index()
+
+    constant_data = df[[DATE_COL, "Year"] + list(controls) + [target]].drop_duplicates()
+    return pd.merge(pivot_df, constant_data, on=[DATE_COL, "Year"], how="left")
+
+
+def load_online_dataset(path="online_dataset.mmap"):
+    """Read the pivoted weekly dataset (design file or CSV), indexed by ``Starting Week``."""
+    if not path.endswith(".csv"):
+        from .design_matrix import read_design
+
+        return read_design(path)
+    df = pd.read_csv(path, parse_dates=[DATE_COL])
+    return df.set_index(DATE_COL)
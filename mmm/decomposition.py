@@ -0,0 +1,282 @@
+"""Contribution decomposition and ROI of a fitted linear model.
+
+A trial record (or any coefficient vector over the ``build_features``
+design) is decomposed into a weeks x channels contribution tensor, where
+all the lag / decay / saturation / adstock terms of a channel add up to
+that channel and every other column is its own group.
+
+Two time attributions are available:
+
+* ``"effect"``: the week the units were sold, i.e. ``beta * X``;
+* ``"spend"``: the week the media ran. The carry-over terms are linear
+  in the channel, ``f = K x``, so the units they produce over the modelled
+  weeks ``w`` are ``beta * w' K x = beta * (K' w) * x``. ``K' w`` is the
+  same recurrence as the transform run backwards in time, so attributing
+  every week of every term costs one pass over the weeks. Saturation is
+  not linear and stays in the week it was sold.
+
+Both are built once per model as (weeks x terms) matrices; a batch of
+coefficient draws (bootstrap resamples, search trials) is then a single
+``einsum`` with the term -> channel map, with no Python loop over draws,
+weeks or channels. ROI, marginal ROI and cost per incremental unit per
+channel and period follow from the spend-week contributions and the
+investment columns set aside by ``features.base_columns``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .data import TARGET
+from .features import CHANNEL_TRANSFORMS, base_columns, feature_layout, media_columns
+
+INTERCEPT = "Intercept"
+SPEND_PREFIX = "investment (in pound)"
+
+
+def spend_column(channel):
+    """Investment column of an ``"execution - <combination>"`` channel."""
+    return channel.replace("execution", SPEND_PREFIX, 1)
+
+
+def _reverse_geometric(w, decay, tail):
+    """``z[s] = sum_{t >= s} decay ** (t - s) * w[t]``, with ``w = tail`` past the last week."""
+    z = geometric_adstock(w[::-1, None], decay)[::-1, 0]
+    if tail:
+        z = z + decay ** np.arange(len(w), 0, -1) * tail / (1.0 - decay)
+    return z
+
+
+def carryover_weights(transform, param, window, full=False):
+    """
+    Units produced over ``window`` per unit of a transform's input, by input week.
+
+    Parameters:
+    -----------
+    transform : str
+        Key of ``features.CHANNEL_TRANSFORMS``, or None for an untransformed column.
+    param : float
+        Parameter of the transform.
+    window : np.ndarray
+        1.0 on the weeks the contributions are counted over, 0.0 elsewhere.
+    full : bool
+        Also count the carry-over past the last week, as if the window
+        went on forever.
+
+    Returns:
+    --------
+    np.ndarray: ``K' window``, one weight per week.
+    """
+    w = np.asarray(window, dtype=float)
+    tail = 1.0 if full else 0.0
+    if transform in (None, "saturation"):
+        return w
+    if transform == "lag":
+        return np.r_[w[param:], np.full(min(param, len(w)), tail)]
+    if transform == "adstock":
+        return _reverse_geometric(w, param, tail)
+    if transform == "decay":
+        # adjust=False EWM: weight a * (1 - a) ** (t - s), except the seed week which keeps (1 - a) ** t
+        a = 2.0 / (param + 1.0)
+        z = _reverse_geometric(w, 1.0 - a, tail)
+        z[1:] *= a
+        return z
+    raise ValueError(f"Unknown transform: {transform!r}")
+
+
+class Decomposition:
+    """
+    Contributions, ROI and marginal ROI of a model over a weekly dataset.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date, with the execution and investment columns.
+    features : list of str
+        Fitted features, in coefficient order after the intercept.
+    params : dict
+        ``lag_range``, ``span`` and ``alpha`` the features were built with.
+    target : str
+    full_carryover : bool
+        Credit the spend of the last weeks with the carry-over that falls
+        after the sample; by default only units sold in the modelled weeks count.
+    weeks : array-like, optional
+        Modelled weeks, when the fit used fewer rows than ``build_features``
+        keeps (e.g. after adding lagged sales); all but the first
+        ``lag_range - 1`` weeks by default.
+
+    Attributes:
+    -----------
+    names : list of str
+        ``"Intercept"`` followed by ``features``, the order of every coefficient vector.
+    groups : list of str
+        Intercept, then every column the terms derive from, in order of first use.
+    channels : list of str
+        Media groups with an investment column, the columns of the ROI tables.
+    index : pd.Index
+        All weeks of ``df``; the modelled weeks are ``index[window]``.
+    """
+
+    def __init__(self, df, features, params, target=TARGET, full_carryover=False, weeks=None):
+        media = media_columns(df)
+        layout = {name: (col, transform, param)
+                  for col, transform, param, name in
+                  feature_layout(media, params["lag_range"], params["span"], params["alpha"])}
+        base = set(base_columns(df, target))
+        self.names = [INTERCEPT] + list(features)
+        self.index = df.index
+
+        sources = {}
+        for name in features:
+            if name in layout:
+                sources[name] = layout[name]
+            elif name in base:
+                sources[name] = (name, None, None)
+            else:
+                raise ValueError(f"{name!r} is neither a column of df nor a feature of {params}")
+        # Weeks the design keeps: build_features drops the first lag_range - 1
+        self.window = np.zeros(len(df), dtype=bool)
+        self.window[max(params["lag_range"] - 1, 0):] = True
+        if weeks is not None:
+            self.window &= df.index.isin(weeks)
+        w = self.window.astype(float)
+
+        columns = list(dict.fromkeys(col for col, _, _ in sources.values()))
+        self.groups = [INTERCEPT] + columns
+        self.channels = [g for g in columns if g in media and spend_column(g) in df.columns]
+        self.membership = np.zeros((len(self.names), len(self.groups)))
+        self.membership[0, 0] = 1.0
+
+        values = df[columns].to_numpy(dtype=float)
+        T, p = values.shape[0], len(self.names)
+        self.effect = np.zeros((T, p))      # term values in the weeks sold
+        self.attributed = np.zeros((T, p))  # units per unit of coefficient, by spend week
+        self.marginal = np.zeros((T, p))    # derivative of attributed in the log of the channel's scale
+        self.effect[:, 0] = self.attributed[:, 0] = w
+        weights = {}
+        for j, name in enumerate(features, start=1):
+            col, transform, param = sources[name]
+            g = self.groups.index(col)
+            self.membership[j, g] = 1.0
+            x = values[:, g - 1]
+            f = x if transform is None else CHANNEL_TRANSFORMS[transform](x[:, None], param)[:, 0]
+            self.effect[:, j] = np.nan_to_num(f) * w
+            if transform == "saturation":
+                self.attributed[:, j] = np.log1p(x) * w
+                self.marginal[:, j] = x / (1.0 + x) * w
+                continue
+            if (transform, param) not in weights:
+                weights[transform, param] = carryover_weights(transform, param, w, full_carryover)
+            self.attributed[:, j] = x * weights[transform, param]
+            if col in media:
+                self.marginal[:, j] = self.attributed[:, j]
+        self.spend = df[[spend_column(c) for c in self.channels]].to_numpy(dtype=float)
+        self._channel_idx = [self.groups.index(c) for c in self.channels]
+
+    @classmethod
+    def from_record(cls, df, record, target=TARGET, full_carryover=False):
+        """Decomposition of a ``TrialStore`` / ``evaluate_trial`` record, and its coefficients."""
+        names = list(record["coefficients"])
+        if names[0] != INTERCEPT:
+            raise ValueError("coefficients must start with the intercept")
+        decomposition = cls(df, names[1:], record["params"], target, full_carryover)
+        return decomposition, np.array([record["coefficients"][n] for n in names])
+
+    def _beta(self, beta):
+        beta = np.asarray(beta, dtype=float)
+        if beta.shape[-1] != len(self.names):
+            raise ValueError(f"expected {len(self.names)} coefficients, got {beta.shape[-1]}")
+        return beta
+
+    def period_matrix(self, periods=None):
+        """
+        Labels and (periods x weeks) indicator of a period grouping.
+
+        ``periods`` is None (the whole sample), a pandas frequency such as
+        ``"Y"`` or ``"Q"`` or one label per week.
+        """
+        if periods is None:
+            labels = np.zeros(len(self.index), dtype=int)
+            uniques = pd.Index(["total"])
+        else:
+            if isinstance(periods, str):
+                periods = pd.DatetimeIndex(self.index).to_period(periods)
+            labels, uniques = pd.factorize(np.asarray(periods), sort=True)
+            uniques = pd.Index(uniques)
+        P = np.zeros((len(uniques), len(self.index)))
+        P[labels, np.arange(len(self.index))] = 1.0
+        return uniques, P
+
+    def contributions(self, beta, by="effect"):
+        """
+        Contribution of every group in every week.
+
+        Parameters:
+        -----------
+        beta : array-like
+            Coefficients ordered as ``names``, shape (p,) or (draws, p).
+        by : str
+            "effect" (week sold) or "spend" (week the media ran).
+
+        Returns:
+        --------
+        np.ndarray: Shape (weeks, groups) or (draws, weeks, groups).
+        """
+        if by not in ("effect", "spend"):
+            raise ValueError(f"Unknown attribution: {by!r}")
+        terms = self.effect if by == "effect" else self.attributed
+        return np.einsum("tj,...j,jg->...tg", terms, self._beta(beta), self.membership, optimize=True)
+
+    def contribution_frame(self, beta, by="effect"):
+        """``contributions`` of one coefficient vector as a weeks x groups DataFrame."""
+        return pd.DataFrame(self.contributions(beta, by), index=self.index, columns=self.groups)
+
+    def _per_period(self, terms, beta, P):
+        per_period = P @ terms  # periods x terms, once for all draws
+        out = np.einsum("pj,...j,jg->...pg", per_period, self._beta(beta), self.membership, optimize=True)
+        return out[..., self._channel_idx]
+
+    def roi(self, beta, periods=None):
+        """
+        Per channel and period: spend, attributed units, ROI, marginal ROI
+        and cost per incremental unit.
+
+        Marginal ROI is the extra units per extra pound when a channel's
+        spend in the period is scaled up, at a constant cost per execution
+        unit; it equals ROI for channels without a saturation term.
+
+        Returns:
+        --------
+        dict of np.ndarray: ``spend`` (periods, channels), and
+        ``contribution``, ``roi``, ``mroi`` and ``cost_per_unit`` of
+        shape (periods, channels) or (draws, periods, channels).
+        """
+        _, P = self.period_matrix(periods)
+        spend = P @ self.spend
+        contribution = self._per_period(self.attributed, beta, P)
+        marginal = self._per_period(self.marginal, beta, P)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "spend": spend,
+                "contribution": contribution,
+                "roi": np.where(spend > 0, contribution / spend, np.nan),
+                "mroi": np.where(spend > 0, marginal / spend, np.nan),
+                "cost_per_unit": np.where(contribution > 0, spend / contribution, np.nan),
+            }
+
+    def summary(self, beta, periods=None):
+        """
+        ``roi`` of one coefficient vector as a long table.
+
+        Returns:
+        --------
+        pd.DataFrame: ``period``, ``channel``, ``spend``, ``contribution``,
+        ``roi``, ``mroi`` and ``cost_per_unit``.
+        """
+        beta = self._beta(beta)
+        if beta.ndim != 1:
+            raise ValueError("summary takes one coefficient vector; use roi for draws")
+        labels, _ = self.period_matrix(periods)
+        tables = self.roi(beta, periods)
+        index = pd.MultiIndex.from_product([labels, self.channels], names=["period", "channel"])
+        return pd.DataFrame({k: v.ravel() for k, v in tables.items()}, index=index).reset_index()
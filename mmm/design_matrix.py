@@ -0,0 +1,138 @@
+"""Memory-mapped binary format for weekly design matrices.
+
+One file holds everything a pipeline stage needs to hand over:
+
+    magic (8 bytes) | header length (uint64) | JSON header, padded
+    date index block: int64 days since epoch, one per row
+    value block: float32 / float64, column-major (one column contiguous)
+
+Offsets are 64-byte aligned, so the value block opens with ``np.memmap``
+without copying or parsing. Worker processes that open the same file
+share its pages read-only through the OS page cache, instead of each
+re-parsing a CSV into its own DataFrame.
+"""
+
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .data import DATE_COL, TARGET
+
+MAGIC = b"MMMDSGN1"
+ALIGN = 64
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def column_kind(name, target=TARGET):
+    """Role of a column in the weekly dataset, stored in the header."""
+    if name == target:
+        return "target"
+    if "execution" in name:
+        return "execution"
+    if "investment" in name:
+        return "investment"
+    return "control"
+
+
+def write_design(path, df, dtype="float64", column_meta=None):
+    """
+    Write a date-indexed DataFrame to ``path``.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Numeric columns, indexed by week start date.
+    dtype : str
+        "float64" or "float32" for the value block.
+    column_meta : list of dict, optional
+        Per-column metadata; defaults to ``{"kind": column_kind(name)}``.
+    """
+    dtype = np.dtype(dtype)
+    index = pd.DatetimeIndex(df.index)
+    days = index.values.astype("datetime64[D]").astype(np.int64)
+    values = np.asfortranarray(df.to_numpy(dtype=dtype))
+    n_rows, n_cols = values.shape
+
+    header = {
+        "n_rows": n_rows,
+        "n_cols": n_cols,
+        "dtype": dtype.str,
+        "index_name": index.name or DATE_COL,
+        "columns": [str(col) for col in df.columns],
+        "column_meta": column_meta or [{"kind": column_kind(col)} for col in df.columns],
+    }
+    # Fixed-width offsets first, so the header size does not depend on them
+    header["index_offset"] = header["values_offset"] = 0
+    head_len = _align(16 + len(json.dumps(header).encode()) + 64)
+    header["index_offset"] = head_len
+    header["values_offset"] = _align(head_len + 8 * n_rows)
+    blob = json.dumps(header).encode().ljust(head_len - 16)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(blob)) + blob)
+        f.write(days.astype("<i8").tobytes())
+        f.write(b"\0" * (header["values_offset"] - head_len - 8 * n_rows))
+        f.write(values.tobytes(order="F"))
+
+
+def read_header(path):
+    """Parse the JSON header of a design file."""
+    with open(path, "rb") as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(f"{path} is not a design-matrix file")
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length))
+
+
+class DesignMatrix:
+    """
+    Read-only, zero-copy view of a design file.
+
+    Attributes:
+    -----------
+    values : np.memmap
+        (n_rows, n_cols) column-major block.
+    index : pd.DatetimeIndex
+        Week start dates.
+    columns : list of str
+    column_meta : list of dict
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_header(path)
+        self.header = header
+        self.columns = header["columns"]
+        self.column_meta = header["column_meta"]
+        n_rows, n_cols = header["n_rows"], header["n_cols"]
+        days = np.memmap(path, dtype="<i8", mode="r", offset=header["index_offset"], shape=(n_rows,))
+        self.index = pd.DatetimeIndex(days.astype("datetime64[D]"), name=header["index_name"])
+        self.values = np.memmap(path, dtype=np.dtype(header["dtype"]), mode="r",
+                                offset=header["values_offset"], shape=(n_rows, n_cols), order="F")
+        self._position = {col: j for j, col in enumerate(self.columns)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def column(self, name):
+        """One column as a contiguous memory-mapped vector."""
+        return self.values[:, self._position[name]]
+
+    def select(self, kind):
+        """Names of the columns whose metadata ``kind`` matches."""
+        return [col for col, meta in zip(self.columns, self.column_meta) if meta.get("kind") == kind]
+
+    def to_frame(self):
+        """DataFrame over the mapped block (no copy of the values)."""
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
+
+
+def read_design(path):
+    """Open a design file as a date-indexed DataFrame."""
+    return DesignMatrix(path).to_frame()
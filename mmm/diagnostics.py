@@ -0,0 +1,110 @@
+"""Goodness-of-fit and collinearity diagnostics."""
+
+import numpy as np
+
+
+def r2_score(y, y_pred):
+    """Coefficient of determination."""
+    y = np.asarray(y, dtype=float)
+    residuals = y - np.asarray(y_pred, dtype=float)
+    return 1 - np.sum(residuals**2) / np.sum((y - y.mean()) ** 2)
+
+
+def adjusted_r2(r2, n, p):
+    """Adjusted R² for ``n`` observations and ``p`` features (intercept excluded)."""
+    return 1 - (1 - r2) * (n - 1) / (n - p - 1)
+
+
+def durbin_watson(residuals):
+    """Durbin-Watson statistic, same as ``statsmodels.stats.stattools.durbin_watson``."""
+    residuals = np.asarray(residuals, dtype=float)
+    return np.sum(np.diff(residuals) ** 2) / np.sum(residuals**2)
+
+
+def _scaled_gram(X, centered):
+    """Gram matrix of the (optionally centered) columns scaled to unit diagonal."""
+    X = np.asarray(X, dtype=float)
+    if centered:
+        X = X - X.mean(axis=0)
+    gram = X.T @ X
+    scale = np.sqrt(np.diag(gram))
+    valid = scale > 0
+    scale[~valid] = 1.0
+    return gram / np.outer(scale, scale), valid
+
+
+def _inverse(S):
+    """
+    Inverse of a scaled Gram matrix via its eigendecomposition.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: The inverse restricted to the non-null
+    eigenspace, and each column's loading on the (numerical) null space;
+    a non-zero loading means the column is exactly collinear.
+    """
+    w, V = np.linalg.eigh(S)
+    null = w <= len(S) * np.finfo(float).eps * max(w.max(initial=0.0), 1.0)
+    inverse = (V[:, ~null] / w[~null]) @ V[:, ~null].T
+    return inverse, np.sqrt((V[:, null] ** 2).sum(axis=1))
+
+
+def vif(X, centered=False):
+    """
+    Variance inflation factor of every column of ``X``, in one inversion.
+
+    VIF_i is the i-th diagonal element of the inverse of the columns'
+    scaled Gram matrix. The default reproduces statsmodels'
+    ``variance_inflation_factor(X, i)`` on an ``X`` without a constant
+    column, whose auxiliary regressions are uncentered. With
+    ``centered=True`` it is the diagonal of the inverse correlation
+    matrix, i.e. auxiliary regressions with an intercept.
+    Constant (or, when not centered, all-zero) columns get NaN.
+    """
+    S, valid = _scaled_gram(X, centered)
+    out = np.full(len(S), np.nan)
+    if valid.any():
+        inverse, null_loading = _inverse(S[np.ix_(valid, valid)])
+        out[valid] = np.where(null_loading > 1e-8, np.inf, np.diag(inverse))
+    return out
+
+
+def drop_high_vif(X, threshold=10.0, centered=False):
+    """
+    Drop the max-VIF column until every VIF is at or below ``threshold``.
+
+    The Gram matrix is inverted once; removing column k then only needs the
+    rank-one downdate A' = A[-k, -k] - A[-k, k] A[k, -k] / A[k, k].
+
+    Returns:
+    --------
+    list, list of (column, vif): Columns kept, and columns dropped in
+    order with their VIF at removal. Columns are names for a DataFrame
+    and positions otherwise.
+    """
+    names = list(X.columns) if hasattr(X, "columns") else list(range(np.shape(X)[1]))
+    S, valid = _scaled_gram(X, centered)
+    # Constant columns have no defined VIF and are dropped up front
+    dropped = [(name, np.nan) for name, ok in zip(names, valid) if not ok]
+    names = [name for name, ok in zip(names, valid) if ok]
+    S = S[np.ix_(valid, valid)]
+    A, null_loading = _inverse(S)
+
+    # Exactly collinear columns have infinite VIF; drop them one at a time
+    # (most loaded on the null space first) and re-invert the small rest
+    while len(names) > 1 and null_loading.max() > 1e-8:
+        k = int(np.argmax(null_loading))
+        dropped.append((names.pop(k), np.inf))
+        rest = np.arange(len(S)) != k
+        S = S[np.ix_(rest, rest)]
+        A, null_loading = _inverse(S)
+
+    while len(names) > 1:
+        vifs = np.diag(A)
+        k = int(np.argmax(vifs))
+        if vifs[k] <= threshold:
+            break
+        dropped.append((names.pop(k), float(vifs[k])))
+        rest = np.arange(len(A)) != k
+        A = A[np.ix_(rest, rest)] - np.outer(A[rest, k], A[k, rest]) / A[k, k]
+    return names, dropped
@@ -0,0 +1,406 @@
+"""Multi-objective evolutionary search of adstock / saturation hyperparameters.
+
+A native replacement for the Robyn search of ``offline_model_ameya.ipynb``.
+Every channel enters as ``hill(A, alpha, beta)`` of its geometric adstock
+``A`` (decay per channel), with the half-saturation point placed at a
+fraction ``gamma`` of the adstock's range, and the coefficients are a
+ridge fit (penalty ``lambda`` on standardized columns, media coefficients
+kept non-negative). Robyn's theta / alpha / gamma are decay / beta / gamma
+here, so ``alpha`` keeps its meaning of ``allocation.hill``.
+
+Two objectives are minimized together, as in Robyn:
+
+* NRMSE, the in-sample RMSE over the range of the target;
+* DECOMP.RSSD, the distance between each channel's share of the media
+  effect and its share of spend, which penalizes implausible
+  decompositions.
+
+The search is NSGA-II (non-dominated sorting, crowding distance, binary
+tournaments, simulated binary crossover and polynomial mutation) on the
+unit cube of the hyperparameters. A whole generation is evaluated as one
+batched computation: the adstock recurrence runs once over a (weeks x
+candidates x channels) block, the Hill curves are elementwise, and the
+ridge systems of all candidates are formed with one ``einsum`` and solved
+by one batched ``np.linalg.solve`` per active-set step.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .allocation import ResponseCurves, hill
+from .data import ONLINE_CONTROLS, TARGET
+from .decomposition import spend_column
+from .instrumentation import count, stage
+
+DEFAULT_BOUNDS = {
+    "decay": (0.0, 0.8),
+    "gamma": (0.3, 1.0),
+    "beta": (0.5, 3.0),
+    "log10_lambda": (-4.0, 0.0),
+}
+CHANNEL_PARAMS = ("decay", "gamma", "beta")
+OBJECTIVES = ("nrmse", "decomp_rssd")
+
+
+class PopulationModel:
+    """
+    Batched evaluation of hyperparameter candidates.
+
+    Parameters:
+    -----------
+    X : array-like
+        Media (execution) values, shape (weeks, channels).
+    C : array-like
+        Controls, shape (weeks, controls); their coefficients are free.
+    y : array-like
+        Target.
+    spend : array-like
+        Total spend of every channel, for the decomposition distance.
+    """
+
+    def __init__(self, X, C, y, spend):
+        self.X = np.asarray(X, dtype=float)
+        self.C = np.asarray(C, dtype=float).reshape(len(self.X), -1)
+        self.y = np.asarray(y, dtype=float)
+        spend = np.asarray(spend, dtype=float)
+        self.spend_share = spend / spend.sum() if spend.sum() > 0 else np.zeros_like(spend)
+        self.n_channels = self.X.shape[1]
+        self.span = self.y.max() - self.y.min()
+
+    def transform(self, decay, gamma, beta):
+        """
+        Hill-saturated adstock of every candidate.
+
+        Returns:
+        --------
+        np.ndarray, np.ndarray: H of shape (weeks, candidates, channels)
+        and the half-saturation points, shape (candidates, channels).
+        """
+        A = geometric_adstock(self.X[:, None, :], decay)
+        lo, hi = A.min(axis=0), A.max(axis=0)
+        alpha = lo + gamma * (hi - lo)
+        return hill(A, alpha, beta), alpha
+
+    def fit(self, H, lam, max_steps=None):
+        """
+        Ridge fit of every candidate, media coefficients kept non-negative.
+
+        Negative media coefficients are removed one per step (the most
+        negative, in standardized units) and all systems re-solved, until
+        none is left.
+
+        Returns:
+        --------
+        np.ndarray, np.ndarray, np.ndarray: Intercepts (candidates,),
+        coefficients in the original units (candidates, channels +
+        controls) and fitted values (weeks, candidates).
+        """
+        T, N, _ = H.shape
+        Z = np.concatenate([H, np.broadcast_to(self.C[:, None, :], (T, N, self.C.shape[1]))], axis=2)
+        mean = Z.mean(axis=0)
+        sd = Z.std(axis=0)
+        sd = np.where(sd > 0, sd, 1.0)
+        Zs = (Z - mean) / sd
+        y_mean = self.y.mean()
+        p = Zs.shape[2]
+        eye = np.eye(p)
+        G = np.einsum("tnj,tnk->njk", Zs, Zs, optimize=True) + (T * np.asarray(lam))[:, None, None] * eye
+        b = np.einsum("tnj,t->nj", Zs, self.y - y_mean, optimize=True)
+
+        media = np.zeros(p, dtype=bool)
+        media[: self.n_channels] = True
+        free = np.ones((N, p), dtype=bool)
+        for _ in range(max_steps or self.n_channels + 1):
+            # Dropped columns keep a unit diagonal and a zero right-hand side
+            keep = free[:, :, None] & free[:, None, :]
+            coef = np.linalg.solve(np.where(keep, G, eye), np.where(free, b, 0.0)[..., None])[..., 0]
+            negative = np.where(media & free, coef, 0.0)
+            worst = negative.argmin(axis=1)
+            drop = negative[np.arange(N), worst] < 0
+            count("evolution.solve")
+            if not drop.any():
+                break
+            free[drop, worst[drop]] = False
+        coef = np.where(free, coef, 0.0)
+        fitted = y_mean + np.einsum("tnj,nj->tn", Zs, coef, optimize=True)
+        coef = coef / sd
+        intercept = y_mean - (coef * mean).sum(axis=1)
+        return intercept, coef, fitted
+
+    def evaluate(self, decay, gamma, beta, lam):
+        """
+        Objectives and fit of every candidate.
+
+        Parameters:
+        -----------
+        decay, gamma, beta : np.ndarray
+            Shape (candidates, channels).
+        lam : np.ndarray
+            Ridge penalty of every candidate.
+
+        Returns:
+        --------
+        dict: ``nrmse`` and ``decomp_rssd`` (candidates,), ``intercept``,
+        ``coef``, ``alpha`` and the media ``effect_share``.
+        """
+        H, alpha = self.transform(decay, gamma, beta)
+        intercept, coef, fitted = self.fit(H, lam)
+        rmse = np.sqrt(np.mean((self.y[:, None] - fitted) ** 2, axis=0))
+        effect = coef[:, : self.n_channels] * H.sum(axis=0)
+        total = effect.sum(axis=1, keepdims=True)
+        share = np.divide(effect, total, out=np.zeros_like(effect), where=total > 0)
+        return {
+            "nrmse": rmse / self.span if self.span > 0 else rmse,
+            "decomp_rssd": np.sqrt(((share - self.spend_share) ** 2).sum(axis=1)),
+            "intercept": intercept,
+            "coef": coef,
+            "alpha": alpha,
+            "effect_share": share,
+        }
+
+
+def pareto_ranks(F):
+    """
+    Non-dominated sorting rank of every row of objectives ``F`` (0 is the Pareto front).
+    """
+    F = np.asarray(F, dtype=float)
+    dominates = (np.all(F[:, None] <= F[None], axis=2) & np.any(F[:, None] < F[None], axis=2))
+    n_dominating = dominates.sum(axis=0)
+    ranks = np.full(len(F), -1)
+    current = np.flatnonzero(n_dominating == 0)
+    rank = 0
+    while current.size:
+        ranks[current] = rank
+        n_dominating = n_dominating - dominates[current].sum(axis=0)
+        n_dominating[ranks >= 0] = -1
+        current = np.flatnonzero(n_dominating == 0)
+        rank += 1
+    return ranks
+
+
+def crowding_distance(F, ranks):
+    """Crowding distance of every row within its front; the extremes of a front get inf."""
+    F = np.asarray(F, dtype=float)
+    distance = np.zeros(len(F))
+    for rank in np.unique(ranks):
+        members = np.flatnonzero(ranks == rank)
+        if members.size <= 2:
+            distance[members] = np.inf
+            continue
+        for k in range(F.shape[1]):
+            order = members[np.argsort(F[members, k], kind="stable")]
+            values = F[order, k]
+            spread = values[-1] - values[0]
+            distance[order[[0, -1]]] = np.inf
+            if spread > 0:
+                distance[order[1:-1]] += (values[2:] - values[:-2]) / spread
+    return distance
+
+
+def _tournament(rng, ranks, distance, n):
+    a, b = rng.integers(0, len(ranks), size=(2, n))
+    better = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (distance[a] > distance[b]))
+    return np.where(better, a, b)
+
+
+def _sbx(rng, parents_a, parents_b, eta, rate):
+    """Simulated binary crossover on the unit cube; every pair gives two children."""
+    u = rng.random(parents_a.shape)
+    beta = np.where(u <= 0.5, (2 * u) ** (1 / (eta + 1)), (1 / (2 * (1 - u))) ** (1 / (eta + 1)))
+    cross = (rng.random((len(parents_a), 1)) < rate) & (rng.random(parents_a.shape) < 0.5)
+    beta = np.where(cross, beta, 1.0)
+    mid, half = (parents_a + parents_b) / 2, (parents_b - parents_a) / 2
+    return np.clip(np.concatenate([mid - beta * half, mid + beta * half]), 0.0, 1.0)
+
+
+def _polynomial_mutation(rng, genes, eta, rate):
+    u = rng.random(genes.shape)
+    delta = np.where(u < 0.5, (2 * u) ** (1 / (eta + 1)) - 1, 1 - (2 * (1 - u)) ** (1 / (eta + 1)))
+    mutate = rng.random(genes.shape) < rate
+    return np.clip(genes + np.where(mutate, delta, 0.0), 0.0, 1.0)
+
+
+class ParetoResult:
+    """
+    Result of ``evolve``.
+
+    Attributes:
+    -----------
+    channels, controls : list of str
+    front : pd.DataFrame
+        Pareto-optimal candidates of the final population, by NRMSE:
+        ``nrmse``, ``decomp_rssd`` and ``lambda``.
+    population : pd.DataFrame
+        Every candidate of the final population, with its ``rank``.
+    history : pd.DataFrame
+        Per generation: evaluations so far, best NRMSE, best DECOMP.RSSD
+        and front size.
+    evaluations_per_second : float
+    """
+
+    def __init__(self, model, genes, bounds, evaluation, channels, controls, index, history, rate):
+        self.model = model
+        self.channels = list(channels)
+        self.controls = list(controls)
+        self.index = index
+        self._genes = genes
+        self._params = _decode(genes, bounds, len(self.channels))
+        self._evaluation = evaluation
+        F = np.column_stack([evaluation[k] for k in OBJECTIVES])
+        ranks = pareto_ranks(F)
+        self.population = pd.DataFrame({
+            "nrmse": evaluation["nrmse"],
+            "decomp_rssd": evaluation["decomp_rssd"],
+            "lambda": self._params["lambda"],
+            "rank": ranks,
+        })
+        self.front = self.population[ranks == 0].drop(columns="rank").sort_values("nrmse")
+        self.history = pd.DataFrame(history)
+        self.evaluations_per_second = rate
+
+    def params(self, i):
+        """Per channel of candidate ``i`` (a ``population`` label): ``coef``, ``decay``, ``gamma``, ``alpha``, ``beta``, ``effect_share`` and ``spend_share``."""
+        return pd.DataFrame({
+            "coef": self._evaluation["coef"][i, : len(self.channels)],
+            "decay": self._params["decay"][i],
+            "gamma": self._params["gamma"][i],
+            "alpha": self._evaluation["alpha"][i],
+            "beta": self._params["beta"][i],
+            "effect_share": self._evaluation["effect_share"][i],
+            "spend_share": self.model.spend_share,
+        }, index=self.channels)
+
+    def control_coef(self, i):
+        """Intercept and control coefficients of candidate ``i``."""
+        coef = self._evaluation["coef"][i, len(self.channels) :]
+        return pd.Series(np.r_[self._evaluation["intercept"][i], coef], index=["Intercept"] + self.controls)
+
+    def contributions(self, i):
+        """Weekly contribution of the intercept, every channel and every control for candidate ``i``."""
+        p = self._params
+        H, _ = self.model.transform(p["decay"][i : i + 1], p["gamma"][i : i + 1], p["beta"][i : i + 1])
+        coef = self._evaluation["coef"][i]
+        parts = np.column_stack([np.full(len(H), self._evaluation["intercept"][i]),
+                                 H[:, 0] * coef[: len(self.channels)],
+                                 self.model.C * coef[len(self.channels) :]])
+        return pd.DataFrame(parts, index=self.index, columns=["Intercept"] + self.channels + self.controls)
+
+    def response_curves(self, i, ratio=1.0):
+        """Steady-state response of candidate ``i`` to weekly spend, see ``NonlinearFit.response_curves``."""
+        p = self.params(i)
+        return ResponseCurves(self.channels, p["coef"].to_numpy(),
+                              (p["alpha"] * (1.0 - p["decay"])).to_numpy(), p["beta"].to_numpy(), ratio)
+
+
+def _bounds(bounds, channels):
+    """(low, high) arrays of the genes: decay, gamma, beta per channel, then log10 lambda."""
+    bounds = {**DEFAULT_BOUNDS, **(bounds or {})}
+    low, high = [], []
+    for name in CHANNEL_PARAMS:
+        value = bounds[name]
+        per_channel = [value.get(c, DEFAULT_BOUNDS[name]) for c in channels] if isinstance(value, dict) \
+            else [value] * len(channels)
+        low += [lo for lo, _ in per_channel]
+        high += [hi for _, hi in per_channel]
+    low.append(bounds["log10_lambda"][0])
+    high.append(bounds["log10_lambda"][1])
+    return np.array(low, dtype=float), np.array(high, dtype=float)
+
+
+def _decode(genes, bounds, n_channels):
+    low, high = bounds
+    values = low + genes * (high - low)
+    out = {name: values[:, k * n_channels : (k + 1) * n_channels] for k, name in enumerate(CHANNEL_PARAMS)}
+    out["lambda"] = 10.0 ** values[:, -1]
+    return out
+
+
+def evolve(df, channels=None, controls=ONLINE_CONTROLS, target=TARGET, bounds=None, population=100,
+           generations=100, crossover=0.9, eta_crossover=15.0, eta_mutation=20.0, seed=None,
+           verbose=False):
+    """
+    NSGA-II search of per-channel decay / gamma / beta and the ridge penalty.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date, with the execution and investment columns.
+    channels : list of str, optional
+        Media columns; defaults to every execution column that is not all zero.
+    controls : list of str
+        Linear, unconstrained columns.
+    bounds : dict, optional
+        Overrides of ``DEFAULT_BOUNDS``; ``decay``, ``gamma`` and ``beta``
+        take one ``(low, high)`` or a ``{channel: (low, high)}`` dict.
+    population : int
+        Candidates per generation (rounded up to an even number).
+    generations : int
+    crossover : float
+        Probability that a pair of parents is crossed.
+    eta_crossover, eta_mutation : float
+        Distribution indices of the crossover and mutation; larger keeps
+        children closer to their parents.
+    seed : int, optional
+
+    Returns:
+    --------
+    ParetoResult
+    """
+    if channels is None:
+        channels = [col for col in df.columns if "execution" in col and df[col].any()]
+    channels, controls = list(channels), list(controls)
+    frame = df[channels + controls + [target]].dropna()
+    spend = [df[spend_column(c)].loc[frame.index].sum() if spend_column(c) in df.columns else 0.0
+             for c in channels]
+    model = PopulationModel(frame[channels], frame[controls], frame[target], spend)
+    gene_bounds = _bounds(bounds, channels)
+    n_genes = len(gene_bounds[0])
+    N = population + population % 2
+    rng = np.random.default_rng(seed)
+
+    def evaluate(genes):
+        p = _decode(genes, gene_bounds, len(channels))
+        return model.evaluate(p["decay"], p["gamma"], p["beta"], p["lambda"])
+
+    def objectives(evaluation):
+        return np.column_stack([evaluation[k] for k in OBJECTIVES])
+
+    start = time.perf_counter()
+    genes = rng.random((N, n_genes))
+    with stage("evolution"):
+        evaluation = evaluate(genes)
+    F = objectives(evaluation)
+    ranks = pareto_ranks(F)
+    distance = crowding_distance(F, ranks)
+    n_evaluations, history = N, []
+    for generation in range(generations):
+        with stage("evolution", generation=generation):
+            a = _tournament(rng, ranks, distance, N // 2)
+            b = _tournament(rng, ranks, distance, N // 2)
+            children = _polynomial_mutation(rng, _sbx(rng, genes[a], genes[b], eta_crossover, crossover),
+                                            eta_mutation, 1.0 / n_genes)
+            child_evaluation = evaluate(children)
+            n_evaluations += N
+
+            # Elitist replacement: best N of parents and children by rank, then crowding
+            genes = np.concatenate([genes, children])
+            evaluation = {k: np.concatenate([evaluation[k], child_evaluation[k]]) for k in evaluation}
+            F = objectives(evaluation)
+            ranks = pareto_ranks(F)
+            distance = crowding_distance(F, ranks)
+            keep = np.lexsort((-distance, ranks))[:N]
+            genes, F = genes[keep], F[keep]
+            evaluation = {k: v[keep] for k, v in evaluation.items()}
+            ranks = pareto_ranks(F)
+            distance = crowding_distance(F, ranks)
+        history.append({"generation": generation, "evaluations": n_evaluations,
+                        "best_nrmse": F[:, 0].min(), "best_decomp_rssd": F[:, 1].min(),
+                        "front_size": int((ranks == 0).sum())})
+        if verbose and (generation + 1) % 10 == 0:
+            print(f"generation {generation + 1}/{generations}: NRMSE {F[:, 0].min():.4f}, "
+                  f"DECOMP.RSSD {F[:, 1].min():.4f}, front {int((ranks == 0).sum())}")
+    rate = n_evaluations / (time.perf_counter() - start)
+    return ParetoResult(model, genes, gene_bounds, evaluation, channels, controls, frame.index, history, rate)
@@ -0,0 +1,178 @@
+"""Memoized transformed channel blocks shared across search trials.
+
+Trials that only differ in ``cor``, ``imp`` or ``sel`` need exactly the
+same lag / decay / saturation / adstock columns. The store keeps every
+transformed channel column keyed by (channel, transform, parameter) in an
+in-memory LRU, optionally backed by ``.npy`` files on disk so that later
+runs and other worker processes can reuse them too.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from .correlation import CorrelationPruner
+from .data import TARGET
+from .features import CHANNEL_TRANSFORMS, build_features, feature_layout, media_columns
+from .instrumentation import count
+from .selection import forward_path
+from .solver import gram_system
+
+
+class FeatureStore:
+    """
+    LRU cache of transformed channel columns for one weekly dataset.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date.
+    max_blocks : int
+        Number of channel columns kept in memory.
+    cache_dir : str, optional
+        Directory of the disk tier. Files are keyed by a fingerprint of
+        the media values, so a changed dataset never reads stale blocks.
+    max_designs : int
+        Number of per-design entries (Gram matrices, selection paths) kept.
+    """
+
+    def __init__(self, df, max_blocks=4096, cache_dir=None, max_designs=32):
+        self.df = df
+        self.media = media_columns(df)
+        self.values = df[self.media].to_numpy(dtype=float)
+        self.max_blocks = max_blocks
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._index = {col: j for j, col in enumerate(self.media)}
+        self._pruners = {}
+        self._grams = OrderedDict()
+        self._paths = OrderedDict()
+        self.max_designs = max_designs
+
+        digest = hashlib.sha1(self.values.tobytes())
+        digest.update("\0".join(self.media).encode())
+        self.fingerprint = digest.hexdigest()[:16]
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        return os.path.join(self.cache_dir, f"{self.fingerprint}-{name}.npy")
+
+    def _put(self, key, column):
+        self._blocks[key] = column
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def block(self, channel, transform, param=None):
+        """Transformed column of one channel, computed at most once."""
+        key = (channel, transform, param)
+        column = self._blocks.get(key)
+        if column is not None:
+            self.hits += 1
+            count("feature_store.hit")
+            self._blocks.move_to_end(key)
+            return column
+
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            self.disk_hits += 1
+            count("feature_store.disk_hit")
+            column = np.load(self._path(key))
+            self._put(key, column)
+            return column
+
+        # A miss transforms every channel in one vectorized call, since
+        # the sibling columns are about to be requested by the same trial
+        self.misses += 1
+        count("feature_store.miss")
+        transformed = CHANNEL_TRANSFORMS[transform](self.values, param)
+        for col, j in self._index.items():
+            sibling = (col, transform, param)
+            self._put(sibling, np.ascontiguousarray(transformed[:, j]))
+            if self.cache_dir is not None:
+                self._save(sibling, self._blocks[sibling])
+        return np.ascontiguousarray(transformed[:, self._index[channel]])
+
+    def preload(self, blocks):
+        """Add columns computed elsewhere, ``{(channel, transform, param): column}``."""
+        for key, column in blocks.items():
+            self._put(key, column)
+        return self
+
+    def _save(self, key, column):
+        # Write then rename, so concurrent workers never read a partial file
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, column)
+        os.replace(tmp, path)
+
+    def design_matrix(self, lag_range=5, span=4, alpha=0.7, target=TARGET):
+        """Same as ``features.build_features`` but assembled from cached blocks."""
+        return build_features(self.df, lag_range, span, alpha, target=target, store=self)
+
+    def pruner(self, X, lag_range, span, alpha):
+        """
+        Correlation pruner synced to the design matrix ``X``.
+
+        One pruner is kept per row window (the lag range decides how many
+        leading weeks are dropped). Within a window it is updated with only
+        the columns whose (channel, transform, parameter) changed since the
+        previous trial.
+        """
+        layout = feature_layout(self.media, lag_range, span, alpha)
+        n_base = X.shape[1] - len(layout)
+        keys = list(X.columns[:n_base]) + [key[:3] for key in layout]
+        pruner = self._pruners.setdefault(len(X), CorrelationPruner())
+        return pruner.sync(X, keys)
+
+    def gram(self, X, y, lag_range, span, alpha):
+        """
+        Normal equations of the full design ``X`` (intercept first).
+
+        Cached per transform parameters, so the fits of every trial that
+        shares them only slice the selected columns out of one X'X.
+
+        Returns:
+        --------
+        tuple: ``(G, b, position)`` with ``position[column]`` the row of
+        ``column`` in ``G``.
+        """
+        key = (lag_range, span, alpha)
+        entry = self._grams.get(key)
+        if entry is None:
+            count("gram.miss")
+            G, b, _ = gram_system(X, y)
+            entry = (G, b, {col: i + 1 for i, col in enumerate(X.columns)})
+            self._grams[key] = entry
+            while len(self._grams) > self.max_designs:
+                self._grams.popitem(last=False)
+        self._grams.move_to_end(key)
+        return entry
+
+    def selection_path(self, X, y, key, nonneg=None):
+        """
+        Forward-stepwise path of the filtered design ``X``, cached by ``key``.
+
+        ``key`` must pin down ``X`` (transform parameters plus ``cor``), so
+        that trials differing only in ``imp`` or ``sel`` reuse one path.
+        """
+        path = self._paths.get(key)
+        if path is None:
+            count("selection_path.miss")
+            path = self._paths[key] = forward_path(X, y, nonneg=nonneg)
+            while len(self._paths) > self.max_designs:
+                self._paths.popitem(last=False)
+        self._paths.move_to_end(key)
+        return path
+
+    def stats(self):
+        """Hit / miss counters."""
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "blocks": len(self._blocks)}
@@ -0,0 +1,94 @@
+"""Feature engineering for the weekly design matrix."""
+
+import numpy as np
+import pandas as pd
+
+from .adstock import ewm_decay, geometric_adstock
+from .data import TARGET
+from .instrumentation import staged
+
+
+def _lag(values, lag):
+    shifted = np.full(values.shape, np.nan)
+    shifted[lag:] = values[: len(values) - lag]
+    return shifted
+
+
+# Per-channel transforms, applied to a whole (weeks x channels) block at once
+CHANNEL_TRANSFORMS = {
+    "lag": _lag,
+    "decay": ewm_decay,
+    "saturation": lambda values, _: np.log1p(values),
+    "adstock": geometric_adstock,
+}
+
+
+def media_columns(df):
+    """Execution columns, i.e. the media channels that get transformed."""
+    return [col for col in df.columns if "execution" in col]
+
+
+def base_columns(df, target=TARGET):
+    """Columns that enter the design matrix untransformed (investment is set aside for ROI)."""
+    return [col for col in df.columns if col != target and "investment" not in col]
+
+
+def feature_layout(media, lag_range, span, alpha):
+    """
+    Transformed columns in design-matrix order.
+
+    Returns:
+    --------
+    list of (channel, transform, param, name) tuples.
+    """
+    layout = []
+    for col in media:
+        layout += [(col, "lag", lag, f"{col}_lag{lag}") for lag in range(1, lag_range)]
+        layout.append((col, "decay", span, f"{col}_decay"))
+        layout.append((col, "saturation", None, f"{col}_saturation"))
+    layout += [(col, "adstock", alpha, f"{col}_adstock") for col in media]
+    return layout
+
+
+@staged("features")
+def build_features(df, lag_range=5, span=4, alpha=0.7, target=TARGET, store=None):
+    """
+    Build the lag / decay / saturation / adstock design matrix.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date (see ``data.load_online_dataset``).
+    lag_range : int
+        Lags 1 .. lag_range - 1 are added for every media channel.
+    span : float
+        EWM span of the ``_decay`` columns.
+    alpha : float
+        Geometric adstock decay of the ``_adstock`` columns.
+    store : FeatureStore, optional
+        Cache of transformed channel blocks built on the same ``df``.
+
+    Returns:
+    --------
+    pd.DataFrame, pd.Series: Features and target, with the leading weeks
+    lost to the lags dropped.
+    """
+    media = media_columns(df)
+    layout = feature_layout(media, lag_range, span, alpha)
+
+    if store is not None:
+        columns = [store.block(col, transform, param) for col, transform, param, _ in layout]
+    else:
+        values = df[media].to_numpy(dtype=float)
+        blocks = {}
+        for _, transform, param, _ in layout:
+            if (transform, param) not in blocks:
+                blocks[transform, param] = CHANNEL_TRANSFORMS[transform](values, param)
+        index = {col: j for j, col in enumerate(media)}
+        columns = [blocks[transform, param][:, index[col]] for col, transform, param, _ in layout]
+
+    names = base_columns(df, target)
+    data = np.column_stack([df[names].to_numpy(dtype=float)] + columns)
+    X = pd.DataFrame(data, index=df.index, columns=names + [name for *_, name in layout]).dropna()
+    y = df[target].loc[X.index]
+    return X, y
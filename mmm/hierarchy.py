@@ -0,0 +1,199 @@
+"""Growth-driver hierarchy as sparse aggregation matrices.
+
+The L2..L5 tree of ``merged_data.csv`` is read once (only its level
+columns) and every level is stored as a (nodes x leaves) 0/1 CSR matrix,
+where a node is a label path such as (L2, L3). Any quantity laid out per
+leaf (weekly execution or spend, contributions, bootstrap draws, ...)
+then rolls up to any level with one sparse matmul, whatever the other
+axes, instead of re-pivoting the long table per level.
+
+Leaves are named like ``data.build_online_dataset`` names them,
+``"L2 | L3 | L4 | L5"``; wide columns such as
+``"execution - L2 | L3 | L4 | L5"`` are matched on the part after the
+value prefix.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .data import LEVEL_COLS
+
+SEPARATOR = " | "
+
+
+def leaf_of(column):
+    """Leaf label of a wide ``"<value> - <leaf>"`` column (or of a bare leaf label)."""
+    return column.split(" - ", 1)[1] if " - " in column else column
+
+
+class Hierarchy:
+    """
+    Leaves of a growth-driver tree and their roll-up matrices.
+
+    Parameters:
+    -----------
+    level_names : list of str
+        Level columns, root first.
+    levels : list of np.ndarray
+        Labels of each level.
+    leaf_codes : np.ndarray
+        Level codes of every leaf, shape (n_leaves, n_levels).
+
+    Attributes:
+    -----------
+    leaves : list of str
+        ``"L2 | L3 | L4 | L5"`` label of every leaf.
+    nodes : list of pd.MultiIndex
+        Label paths of the nodes of each level, sorted.
+    matrices : list of scipy.sparse.csr_matrix
+        (nodes x leaves) aggregation matrix of each level.
+    """
+
+    def __init__(self, level_names, levels, leaf_codes):
+        from scipy import sparse
+
+        self.level_names = list(level_names)
+        self.levels = [np.asarray(level, dtype=object) for level in levels]
+        self.leaf_codes = np.asarray(leaf_codes, dtype=np.int32)
+        labels = [self.levels[i][self.leaf_codes[:, i]] for i in range(len(self.levels))]
+        self.leaves = [SEPARATOR.join(parts) for parts in zip(*labels)]
+        self._position = {leaf: j for j, leaf in enumerate(self.leaves)}
+        if len(self._position) != len(self.leaves):
+            raise ValueError("duplicate leaves in the hierarchy")
+
+        n = len(self.leaves)
+        self.nodes, self.matrices = [], []
+        for k in range(len(self.levels)):
+            paths = pd.MultiIndex.from_arrays(labels[: k + 1], names=self.level_names[: k + 1])
+            codes, nodes = pd.factorize(paths, sort=True)
+            self.nodes.append(pd.MultiIndex.from_tuples(nodes, names=self.level_names[: k + 1]))
+            self.matrices.append(sparse.csr_matrix(
+                (np.ones(n), (codes, np.arange(n))), shape=(len(nodes), n)))
+        self._selections = {}
+
+    @classmethod
+    def from_frame(cls, df, level_names=LEVEL_COLS):
+        """Hierarchy of the distinct level paths of a long DataFrame."""
+        paths = df[list(level_names)].astype(str).drop_duplicates()
+        codes, levels = zip(*(pd.factorize(paths[col], sort=True) for col in level_names))
+        return cls(level_names, [np.asarray(level) for level in levels], np.column_stack(codes))
+
+    @classmethod
+    def from_long(cls, path="data/merged_data.csv", level_names=LEVEL_COLS, chunksize=200_000):
+        """Hierarchy of a long extract, reading only its level columns, in chunks."""
+        chunks = pd.read_csv(path, usecols=list(level_names), chunksize=chunksize)
+        return cls.from_frame(pd.concat(chunk.drop_duplicates() for chunk in chunks), level_names)
+
+    @classmethod
+    def from_panel(cls, panel):
+        """Hierarchy of the leaves of a ``WeeklyPanel``, in its leaf order."""
+        return cls(panel.level_names, panel.levels, panel.leaf_codes)
+
+    def save(self, path):
+        """Write ``leaf_codes.npy`` and ``hierarchy.json`` into directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "leaf_codes.npy"), self.leaf_codes)
+        with open(os.path.join(path, "hierarchy.json"), "w") as f:
+            json.dump({"level_names": self.level_names,
+                       "levels": [list(map(str, level)) for level in self.levels]}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved hierarchy; the matrices are rebuilt from the leaf codes."""
+        with open(os.path.join(path, "hierarchy.json")) as f:
+            schema = json.load(f)
+        return cls(schema["level_names"], schema["levels"], np.load(os.path.join(path, "leaf_codes.npy")))
+
+    def level(self, level):
+        """Position of a level given by name or position."""
+        if isinstance(level, str):
+            return self.level_names.index(level)
+        return range(len(self.levels))[level]
+
+    def matrix(self, level, labels=None):
+        """
+        Aggregation matrix of ``level`` over leaves listed in ``labels``.
+
+        Parameters:
+        -----------
+        level : str or int
+        labels : list of str, optional
+            Leaf (or ``"<value> - <leaf>"``) label of every input position,
+            default ``leaves``. Labels that are not leaves get an empty column.
+
+        Returns:
+        --------
+        scipy.sparse.csr_matrix: Shape (nodes, len(labels)).
+        """
+        k = self.level(level)
+        if labels is None:
+            return self.matrices[k]
+        key = (k, tuple(labels))
+        if key not in self._selections:
+            positions = np.array([self._position.get(leaf_of(label), -1) for label in labels])
+            known = positions >= 0
+            # Column j of the result is column positions[j] of the full matrix
+            selector = self.matrices[k].tocsc()[:, positions[known]].tocoo()
+            columns = np.flatnonzero(known)[selector.col]
+            self._selections[key] = type(self.matrices[k])(
+                (selector.data, (selector.row, columns)), shape=(selector.shape[0], len(labels)))
+        return self._selections[key]
+
+    def rollup(self, values, level, labels=None, axis=-1):
+        """
+        Sum a per-leaf quantity to the nodes of ``level``.
+
+        Parameters:
+        -----------
+        values : np.ndarray, pd.Series or pd.DataFrame
+            Leaves along ``axis`` of an array (named by ``labels``), the
+            index of a Series or the columns of a DataFrame. Entries that
+            are not leaves (intercept, controls) are left out.
+        level : str or int
+        labels : list of str, optional
+            Leaf labels along ``axis`` of an array, default ``leaves``.
+
+        Returns:
+        --------
+        Same type as ``values``, with the leaves replaced by the nodes of
+        ``level`` (a MultiIndex of label paths for pandas inputs).
+        """
+        k = self.level(level)
+        if isinstance(values, pd.Series):
+            out = self.matrix(k, list(values.index)) @ values.to_numpy(dtype=float)
+            return pd.Series(out, index=self.nodes[k], name=values.name)
+        if isinstance(values, pd.DataFrame):
+            out = self.matrix(k, list(values.columns)) @ values.to_numpy(dtype=float).T
+            return pd.DataFrame(out.T, index=values.index, columns=self.nodes[k])
+        values = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+        A = self.matrix(k, labels)
+        out = A @ values.reshape(values.shape[0], -1)
+        return np.moveaxis(out.reshape((A.shape[0],) + values.shape[1:]), 0, axis)
+
+    def rollup_ratio(self, numerator, denominator, level, labels=None, axis=-1):
+        """
+        Ratio of two roll-ups, e.g. ROI as rolled-up contribution over
+        rolled-up spend; NaN where the denominator is zero.
+        """
+        num = self.rollup(numerator, level, labels, axis)
+        den = self.rollup(denominator, level, labels, axis)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return num / np.where(den != 0, den, np.nan)
+
+    def edges(self):
+        """
+        Parent -> child links of the tree, named by their own labels.
+
+        Returns:
+        --------
+        pd.DataFrame: ``parent``, ``child`` and ``depth`` (level position of the child, root 0).
+        """
+        frames = []
+        for k in range(1, len(self.levels)):
+            nodes = self.nodes[k]
+            frames.append(pd.DataFrame({"parent": nodes.get_level_values(k - 1),
+                                        "child": nodes.get_level_values(k), "depth": k}))
+        return pd.concat(frames, ignore_index=True).drop_duplicates(["parent", "child"])
@@ -0,0 +1,292 @@
+"""Chunked long-to-wide ingestion of growth-driver extracts.
+
+``merged_data.csv`` has one row per (week, growth driver). Instead of
+loading it whole, concatenating the L2-L5 labels into one string column
+and pivoting, the file is read in chunks. Weeks and growth-driver leaves
+are encoded as integer codes, and the (weeks x leaves x values) matrix is
+accumulated in place: each chunk is summed over its distinct cells with
+``np.bincount`` and only those cells are updated. The result is written as typed
+``.npy`` arrays plus a JSON schema.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .data import DATE_COL, LEVEL_COLS, ONLINE_CONTROLS, TARGET, VALUE_COLS
+from .instrumentation import count, staged
+
+
+class WeeklyPanel:
+    """
+    Weekly execution / investment per growth-driver leaf.
+
+    Attributes:
+    -----------
+    weeks : np.ndarray
+        Sorted week start dates, datetime64[D], shape (n_weeks,).
+    levels : list of np.ndarray
+        Category labels of each of L2..L5.
+    leaf_codes : np.ndarray
+        Level codes of every leaf, shape (n_leaves, 4), int32.
+    values : np.ndarray
+        Summed ``value_names`` per week and leaf, shape (n_weeks, n_leaves, n_values).
+    kpis : np.ndarray
+        Weekly KPI columns ``kpi_names``, shape (n_weeks, n_kpis).
+    """
+
+    def __init__(self, weeks, levels, leaf_codes, values, value_names, kpis, kpi_names,
+                 level_names=LEVEL_COLS):
+        self.weeks = weeks
+        self.levels = levels
+        self.leaf_codes = leaf_codes
+        self.values = values
+        self.value_names = list(value_names)
+        self.kpis = kpis
+        self.kpi_names = list(kpi_names)
+        self.level_names = list(level_names)
+
+    @property
+    def leaf_labels(self):
+        """``"L2 | L3 | L4 | L5"`` label of every leaf."""
+        labels = [np.asarray(self.levels[i], dtype=object)[self.leaf_codes[:, i]]
+                  for i in range(len(self.levels))]
+        return [" | ".join(parts) for parts in zip(*labels)]
+
+    def to_frame(self):
+        """Wide DataFrame in the layout of ``data.build_online_dataset``."""
+        labels = self.leaf_labels
+        order = np.argsort(labels, kind="stable")
+        columns, blocks = [], []
+        for k, name in enumerate(self.value_names):
+            columns += [f"{name} - {labels[j]}" for j in order]
+            blocks.append(self.values[:, order, k])
+        weeks = pd.DatetimeIndex(self.weeks)
+        df = pd.DataFrame(np.hstack(blocks), columns=columns)
+        df.insert(0, "Year", weeks.year)
+        df.insert(0, DATE_COL, weeks)
+        for k, name in enumerate(self.kpi_names):
+            df[name] = self.kpis[:, k]
+        return df
+
+    def save(self, path):
+        """Write the arrays as ``.npy`` files plus ``schema.json`` into directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "weeks.npy"), self.weeks.astype("datetime64[D]"))
+        np.save(os.path.join(path, "leaf_codes.npy"), self.leaf_codes)
+        np.save(os.path.join(path, "values.npy"), self.values)
+        np.save(os.path.join(path, "kpis.npy"), self.kpis)
+        schema = {
+            "level_names": self.level_names,
+            "levels": [list(map(str, level)) for level in self.levels],
+            "value_names": self.value_names,
+            "kpi_names": self.kpi_names,
+            "shape": list(self.values.shape),
+            "dtype": str(self.values.dtype),
+        }
+        with open(os.path.join(path, "schema.json"), "w") as f:
+            json.dump(schema, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Read a saved panel; the value and KPI arrays are memory-mapped by default."""
+        with open(os.path.join(path, "schema.json")) as f:
+            schema = json.load(f)
+        return cls(
+            weeks=np.load(os.path.join(path, "weeks.npy")),
+            levels=[np.array(level, dtype=object) for level in schema["levels"]],
+            leaf_codes=np.load(os.path.join(path, "leaf_codes.npy")),
+            values=np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode),
+            value_names=schema["value_names"],
+            kpis=np.load(os.path.join(path, "kpis.npy"), mmap_mode=mmap_mode),
+            kpi_names=schema["kpi_names"],
+            level_names=schema["level_names"],
+        )
+
+
+class _Encoder:
+    """Growing value -> code dictionary."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values):
+        uniques, inverse = np.unique(values, return_inverse=True)
+        mapping = np.array([self.codes.setdefault(u, len(self.codes)) for u in uniques.tolist()],
+                           dtype=np.int64)
+        return mapping[inverse.ravel()]
+
+    def encode_categorical(self, series):
+        """Encode a categorical Series through its (small) category list."""
+        labels = [str(c) for c in series.cat.categories]
+        codes = series.cat.codes.to_numpy()
+        if (codes == -1).any():
+            labels.append("nan")  # missing values have code -1, i.e. the last entry
+        mapping = np.array([self.codes.setdefault(c, len(self.codes)) for c in labels], dtype=np.int64)
+        return mapping[codes]
+
+    def labels(self):
+        return np.array(list(self.codes), dtype=object)
+
+
+def _codes(chunk, encoders, cols):
+    """Categorical codes of ``cols``, shape (rows, len(cols))."""
+    codes = np.zeros((len(chunk), len(cols)), dtype=np.int64)
+    for i, (enc, col) in enumerate(zip(encoders, cols)):
+        codes[:, i] = enc.encode_categorical(chunk[col])
+    return codes
+
+
+def _pack(codes):
+    """Pack per-level codes (rows x levels, each < 2**16) into one integer key per row."""
+    if codes.shape[1] > 4:
+        raise ValueError(f"cannot pack {codes.shape[1]} levels of 16-bit codes into an int64 key")
+    top = codes.max(initial=-1)
+    if top >= 1 << 16:
+        raise ValueError(f"a level has {top + 1} categories; keys hold at most {1 << 16} per level")
+    packed = np.zeros(len(codes), dtype=np.int64)
+    for i in range(codes.shape[1]):
+        packed = packed * (1 << 16) + codes[:, i]
+    return packed
+
+
+def _unpack(packed, n_levels):
+    codes = np.zeros((len(packed), n_levels), dtype=np.int32)
+    for i in range(n_levels):
+        codes[:, i] = (packed >> (16 * (n_levels - 1 - i))) & 0xFFFF
+    return codes
+
+
+def _grow(arr, shape, fill=0.0):
+    """``arr`` zero- (or ``fill``-) padded to at least ``shape``, doubling along grown axes."""
+    if all(have >= need for have, need in zip(arr.shape, shape)):
+        return arr
+    new_shape = tuple(have if have >= need else max(need, 2 * have)
+                      for have, need in zip(arr.shape, shape))
+    grown = np.full(new_shape, fill)
+    grown[tuple(slice(0, n) for n in arr.shape)] = arr
+    return grown
+
+
+@staged("ingest")
+def ingest_panels(path, panel_cols, chunksize=200_000, value_cols=VALUE_COLS, kpi_cols=None,
+                  level_cols=LEVEL_COLS, out=None):
+    """
+    Stream a long growth-driver CSV holding several panels into one
+    ``WeeklyPanel`` per panel key.
+
+    All panels are accumulated into a single (panels x weeks x leaves x
+    values) array in the same pass; each panel then keeps only the weeks
+    and leaves it has rows for.
+
+    Parameters:
+    -----------
+    panel_cols : list of str
+        Columns identifying a panel, e.g. ``["brand", "country"]``.
+    out : str, optional
+        Directory to save the panels to, one sub-directory per key.
+
+    Returns:
+    --------
+    dict: ``{key tuple: WeeklyPanel}``.
+
+    See ``ingest_long`` for the other parameters.
+    """
+    panel_cols = list(panel_cols)
+    kpi_cols = list(ONLINE_CONTROLS) + [TARGET] if kpi_cols is None else list(kpi_cols)
+    panel_encoders = [_Encoder() for _ in panel_cols]
+    level_encoders = [_Encoder() for _ in level_cols]
+    panel_encoder = _Encoder()
+    leaf_encoder = _Encoder()
+    week_encoder = _Encoder()
+
+    n_values = len(value_cols)
+    acc = np.zeros((0, 0, 0, n_values))
+    kpis = np.full((0, 0, len(kpi_cols)), np.nan)
+    week_rows = np.zeros((0, 0))
+    leaf_rows = np.zeros((0, 0))
+
+    reader = pd.read_csv(
+        path,
+        usecols=[DATE_COL] + panel_cols + list(level_cols) + list(value_cols) + kpi_cols,
+        dtype={col: "category" for col in panel_cols + list(level_cols)},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        count("ingest.rows", len(chunk))
+        week = week_encoder.encode(pd.to_datetime(chunk[DATE_COL]).to_numpy("datetime64[D]"))
+        # Pack the per-level codes of a row into one integer panel / leaf key
+        panel = panel_encoder.encode(_pack(_codes(chunk, panel_encoders, panel_cols)))
+        leaf = leaf_encoder.encode(_pack(_codes(chunk, level_encoders, level_cols)))
+
+        n_panels, n_weeks, n_leaves = len(panel_encoder.codes), len(week_encoder.codes), len(leaf_encoder.codes)
+        acc = _grow(acc, (n_panels, n_weeks, n_leaves, n_values))
+        kpis = _grow(kpis, (n_panels, n_weeks, len(kpi_cols)), np.nan)
+        week_rows = _grow(week_rows, (n_panels, n_weeks))
+        leaf_rows = _grow(leaf_rows, (n_panels, n_leaves))
+
+        # Sum the chunk over its own distinct keys, then scatter those sums:
+        # the cost follows the chunk, not the size of the accumulators
+        P, W, L = acc.shape[:3]
+        cells, inverse = np.unique((panel * W + week) * L + leaf, return_inverse=True)
+        values = chunk[list(value_cols)].fillna(0).to_numpy(dtype=float)
+        sums = np.column_stack([np.bincount(inverse, weights=values[:, k], minlength=len(cells))
+                                for k in range(n_values)])
+        acc.reshape(-1, n_values)[cells] += sums
+        for rows, key, width in ((week_rows, week, W), (leaf_rows, leaf, L)):
+            cells, counts = np.unique(panel * width + key, return_counts=True)
+            rows.reshape(-1)[cells] += counts
+
+        unseen = np.isnan(kpis[panel, week, 0])
+        kpis[panel[unseen], week[unseen]] = chunk[kpi_cols].to_numpy(dtype=float)[unseen]
+
+    n_panels, n_weeks, n_leaves = len(panel_encoder.codes), len(week_encoder.codes), len(leaf_encoder.codes)
+    weeks = np.array(list(week_encoder.codes), dtype="datetime64[D]")
+    order = np.argsort(weeks)
+    leaf_codes = _unpack(np.array(list(leaf_encoder.codes), dtype=np.int64), len(level_cols))
+    key_codes = _unpack(np.array(list(panel_encoder.codes), dtype=np.int64), len(panel_cols))
+    key_labels = [enc.labels() for enc in panel_encoders]
+    levels = [enc.labels() for enc in level_encoders]
+
+    panels = {}
+    for p in range(n_panels):
+        key = tuple(str(key_labels[i][key_codes[p, i]]) for i in range(len(panel_cols)))
+        rows = order[week_rows[p, order] > 0]
+        leaves = np.flatnonzero(leaf_rows[p, :n_leaves] > 0)
+        panels[key] = WeeklyPanel(
+            weeks=weeks[rows],
+            levels=levels,
+            leaf_codes=leaf_codes[leaves],
+            values=acc[p, rows][:, leaves],
+            value_names=value_cols,
+            kpis=kpis[p, rows],
+            kpi_names=kpi_cols,
+            level_names=level_cols,
+        )
+        if out is not None:
+            panels[key].save(os.path.join(out, *key) if key else out)
+    return panels
+
+
+def ingest_long(path, chunksize=200_000, value_cols=VALUE_COLS, kpi_cols=None,
+                level_cols=LEVEL_COLS, out=None):
+    """
+    Stream a long growth-driver CSV into a ``WeeklyPanel``.
+
+    Parameters:
+    -----------
+    path : str
+        CSV in the ``merged_data.csv`` layout.
+    chunksize : int
+        Rows per chunk; memory is bounded by the chunk plus the output.
+    value_cols : list of str
+        Additive columns summed per (week, leaf).
+    kpi_cols : list of str, optional
+        Weekly KPI columns, constant within a week; defaults to the online
+        controls and target.
+    out : str, optional
+        Directory to save the panel to (see ``WeeklyPanel.save``).
+    """
+    return ingest_panels(path, [], chunksize, value_cols, kpi_cols, level_cols, out)[()]
@@ -0,0 +1,236 @@
+"""Structured timing events and counters for the pipeline stages.
+
+Stages are wrapped in ``stage(name)`` (or decorated with ``staged``) and
+cache hits / refits are counted with ``count(name)``. When no event file
+is configured (the default) a stage costs one attribute check. Nightly
+runs are instrumented from the environment, without code changes:
+
+    MMM_EVENTS=events.jsonl       one JSON line per stage and event
+    MMM_PROFILE=fit,selection     cProfile these stages ("all" for every one)
+    MMM_PROFILE_DIR=profiles      directory of the ``.prof`` files
+    MMM_TRACEMALLOC=1             allocation peak of every stage
+
+Worker processes inherit the environment and append to the same file,
+one ``write`` per line. Every event carries the pid, the enclosing stage
+path and the fields of any enclosing ``context(...)``, e.g. the trial
+parameters, so a slow stage can be traced back to the grid point that
+caused it.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_fields = ContextVar("mmm_instrumentation_fields", default=None)
+_stages = ContextVar("mmm_instrumentation_stages", default=())
+
+ENV_EVENTS = "MMM_EVENTS"
+ENV_PROFILE = "MMM_PROFILE"
+ENV_PROFILE_DIR = "MMM_PROFILE_DIR"
+ENV_TRACEMALLOC = "MMM_TRACEMALLOC"
+
+
+def _default(value):
+    # NumPy scalars and arrays, paths and anything else without a JSON form
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class Recorder:
+    """
+    Destination and options of the events of one process.
+
+    Parameters:
+    -----------
+    path : str, optional
+        JSON-lines file the events are appended to; events are dropped
+        when None.
+    profile : collection of str
+        Stage names run under cProfile, or ``{"all"}``.
+    profile_dir : str
+        Directory of the ``<stage>-<pid>-<n>.prof`` files.
+    trace : bool
+        Record the tracemalloc peak of every stage.
+    """
+
+    def __init__(self, path=None, profile=(), profile_dir="profiles", trace=False):
+        self.path = path
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.trace = trace
+        self.enabled = path is not None or bool(self.profile) or trace
+        self.counters = Counter()
+        self._fd = None
+        self._pid = None
+        self._n_profiles = 0
+        self._profiling = False
+        self._peaks = []
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        profile = [s.strip() for s in environ.get(ENV_PROFILE, "").split(",") if s.strip()]
+        return cls(
+            path=environ.get(ENV_EVENTS) or None,
+            profile=profile,
+            profile_dir=environ.get(ENV_PROFILE_DIR, "profiles"),
+            trace=environ.get(ENV_TRACEMALLOC, "") not in ("", "0"),
+        )
+
+    def emit(self, event, **fields):
+        if self.path is None:
+            return
+        record = {"event": event, "time": time.time(), "pid": os.getpid()}
+        stages = _stages.get()
+        if stages:
+            record["stage_path"] = "/".join(stages)
+        record.update(_fields.get() or {})
+        record.update(fields)
+        line = (json.dumps(record, default=_default) + "\n").encode()
+        if self._pid != os.getpid():
+            # First event of this process (or of a forked worker)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        os.write(self._fd, line)
+
+    def _profiled(self, name):
+        return not self._profiling and ("all" in self.profile or name in self.profile)
+
+    @contextmanager
+    def stage(self, name, fields):
+        counters = dict(self.counters)
+        profiler = None
+        if self._profiled(name):
+            profiler = cProfile.Profile()
+            self._profiling = True
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Each stage resets the peak; the enclosing stage keeps the max of its children
+            self._peaks.append((tracemalloc.get_traced_memory()[0], 0))
+            tracemalloc.reset_peak()
+        token = _stages.set(_stages.get() + (name,))
+        status = "ok"
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        except BaseException as exc:
+            status = f"error: {type(exc).__name__}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - start
+            _stages.reset(token)
+            record = {"stage": name, "wall_s": wall, "status": status, **fields}
+            counts = {k: v - counters.get(k, 0) for k, v in self.counters.items()
+                      if v != counters.get(k, 0)}
+            if counts:
+                record["counts"] = counts
+            if self.trace:
+                base, child_peak = self._peaks.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+                record["alloc_peak_mb"] = (peak - base) / 2**20
+                if self._peaks:
+                    outer_base, outer_peak = self._peaks[-1]
+                    self._peaks[-1] = (outer_base, max(outer_peak, peak))
+            if profiler is not None:
+                self._profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                self._n_profiles += 1
+                path = os.path.join(self.profile_dir, f"{name}-{os.getpid()}-{self._n_profiles}.prof")
+                profiler.dump_stats(path)
+                record["profile"] = path
+            self.emit("stage", **record)
+
+
+_recorder = Recorder.from_env()
+
+
+def configure(path=None, profile=(), profile_dir="profiles", trace=False):
+    """
+    Turn instrumentation on (or off, with no arguments) for this process
+    and, through the environment, for worker processes started after it.
+
+    Returns:
+    --------
+    Recorder
+    """
+    global _recorder
+    environ = {
+        ENV_EVENTS: path or "",
+        ENV_PROFILE: ",".join(profile),
+        ENV_PROFILE_DIR: profile_dir,
+        ENV_TRACEMALLOC: "1" if trace else "",
+    }
+    os.environ.update(environ)
+    _recorder = Recorder.from_env(environ)
+    return _recorder
+
+
+def recorder():
+    """The recorder of this process."""
+    return _recorder
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Time a pipeline stage and emit a ``stage`` event with its wall time,
+    status, the counters that moved and, if enabled, its allocation peak
+    and cProfile file. ``fields`` are added to the event.
+    """
+    if not _recorder.enabled:
+        yield
+        return
+    with _recorder.stage(name, fields):
+        yield
+
+
+def staged(name):
+    """Decorator running every call of the function as ``stage(name)``."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _recorder.enabled:
+                return func(*args, **kwargs)
+            with _recorder.stage(name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def context(**fields):
+    """Attach ``fields`` (e.g. ``params=...``) to every event emitted inside the block."""
+    token = _fields.set({**(_fields.get() or {}), **fields})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def count(name, n=1):
+    """Increment counter ``name`` (cache hits, refits, ...)."""
+    _recorder.counters[name] += n
+
+
+def counters():
+    """Snapshot of this process's counters."""
+    return dict(_recorder.counters)
+
+
+def emit(event, **fields):
+    """Write a free-form event; a no-op without an event file."""
+    _recorder.emit(event, **fields)
@@ -0,0 +1,339 @@
+"""Joint fit of adstock decay, Hill saturation and coefficients.
+
+Each channel enters as ``coef * hill(A, alpha, beta)`` with the geometric
+adstock ``A[t] = x[t] + decay * A[t - 1]``; the intercept and controls
+enter linearly. Instead of fixing the transforms on a grid and fitting
+only the coefficients, every parameter is estimated in one bounded
+least-squares solve with the exact Jacobian:
+
+- the derivative of the adstock in its decay follows its own recurrence,
+  ``S[t] = A[t - 1] + decay * S[t - 1]``, so it is one more
+  ``geometric_adstock`` pass over all channels at once;
+- the Hill derivatives are closed-form: ``dh/dA`` from
+  ``allocation.hill_derivatives``, ``dh/dlog(alpha) = -beta h (1 - h)``
+  and ``dh/dbeta = h (1 - h) log(A / alpha)``.
+
+Half-saturation points are fitted on a log scale relative to the peak of
+each channel's adstock at its current decay, and bounded to the observed
+range below that peak as ``evolution`` bounds ``gamma``: past the peak
+the curve is never seen to bend, so its coefficient and ``alpha`` can
+grow together without changing the fit. This also keeps all parameters
+of order one.
+The linear coefficients are projected out (variable projection): at any
+transforms they are the bounded linear fit of ``solver.nnls_gram``,
+warm-started from the previous step, so the nonlinear solver only moves
+the 3 transforms per channel.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .allocation import ResponseCurves, hill_derivatives
+from .data import ONLINE_CONTROLS, TARGET
+from .diagnostics import durbin_watson, r2_score
+from .solver import gram_system, nnls_gram
+
+DEFAULT_BOUNDS = {
+    "decay": (0.0, 0.95),
+    "log_alpha": (-4.0, 0.0),  # alpha from 2% of the peak adstock to the peak
+    "beta": (0.3, 5.0),
+}
+
+
+def _shift(values):
+    shifted = np.zeros_like(values)
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+class HillAdstockModel:
+    """
+    Intercept + sum of Hill-saturated adstocked channels + linear controls.
+
+    The parameter vector is the linear part (intercept, channel
+    coefficients, control coefficients) followed by the transforms
+    (decay, log_alpha, beta of every channel).
+
+    The half-saturation point is ``alpha = peak * exp(log_alpha)``, where
+    ``peak`` is the largest adstock of the channel at its decay (1 for a
+    channel that is never active).
+
+    Parameters:
+    -----------
+    X : array-like
+        Media (execution) values, shape (weeks, channels).
+    C : array-like
+        Controls, shape (weeks, controls).
+    """
+
+    def __init__(self, X, C):
+        self.X = np.asarray(X, dtype=float)
+        self.C = np.asarray(C, dtype=float).reshape(len(self.X), -1)
+        n = self.X.shape[1]
+        self.n_channels = n
+        self.n_controls = self.C.shape[1]
+        self.n_linear = 1 + n + self.n_controls
+        k = self.n_linear
+        self.slices = {
+            "intercept": slice(0, 1),
+            "coef": slice(1, 1 + n),
+            "controls": slice(1 + n, k),
+            "decay": slice(k, k + n),
+            "log_alpha": slice(k + n, k + 2 * n),
+            "beta": slice(k + 2 * n, k + 3 * n),
+        }
+        self.n_params = k + 3 * n
+        # Channel coefficients are >= 0, the intercept and controls are free
+        self.nonneg = np.r_[False, np.ones(n, dtype=bool), np.zeros(self.n_controls, dtype=bool)]
+
+    def unpack(self, theta):
+        return {name: theta[s] for name, s in self.slices.items()}
+
+    def transform(self, transforms, derivatives=True):
+        """
+        Hill features of every channel and their derivatives in the transforms.
+
+        Parameters:
+        -----------
+        transforms : np.ndarray
+            ``decay``, ``log_alpha`` and ``beta`` of every channel, concatenated.
+
+        Returns:
+        --------
+        np.ndarray, np.ndarray: Features H (weeks, channels) and, if
+        requested, dH / d(decay, log_alpha, beta) stacked as (3, weeks, channels).
+        """
+        decay, log_alpha, beta = np.split(np.asarray(transforms, dtype=float), 3)
+        A = geometric_adstock(self.X, decay)
+        at_peak = np.argmax(A, axis=0)[None]
+        peak = np.take_along_axis(A, at_peak, axis=0)[0]
+        alpha = np.where(peak > 0, peak, 1.0) * np.exp(log_alpha)
+        h, dh, _ = hill_derivatives(A, alpha, beta)
+        if not derivatives:
+            return h, None
+        S = geometric_adstock(_shift(A), decay)  # dA / d decay
+        spread = h * (1.0 - h)
+        positive = A > 0
+        log_ratio = np.where(positive, np.log(np.maximum(A, 1e-300)) - np.log(alpha), 0.0)
+        # alpha follows the peak, so the decay also moves log(alpha) by S / A at the peak
+        with np.errstate(divide="ignore", invalid="ignore"):
+            peak_slope = np.where(peak > 0, np.take_along_axis(S, at_peak, axis=0)[0] / peak, 0.0)
+        d_decay = np.where(positive, dh * S, 0.0) - beta * spread * peak_slope
+        return h, np.stack([d_decay, -beta * spread, spread * log_ratio])
+
+    def alpha(self, transforms):
+        """Half-saturation point of every channel, in adstock units."""
+        decay, log_alpha, _ = np.split(np.asarray(transforms, dtype=float), 3)
+        peak = geometric_adstock(self.X, decay).max(axis=0)
+        return np.where(peak > 0, peak, 1.0) * np.exp(log_alpha)
+
+    def design(self, H):
+        """Linear design ``[1, H, C]`` at fixed transforms."""
+        return np.column_stack([np.ones(len(H)), H, self.C])
+
+    def predict(self, theta):
+        H, _ = self.transform(theta[self.n_linear :], derivatives=False)
+        return self.design(H) @ theta[: self.n_linear]
+
+    def jacobian(self, theta):
+        """Derivative of ``predict`` in every parameter, shape (weeks, n_params)."""
+        H, dH = self.transform(theta[self.n_linear :])
+        coef = theta[self.slices["coef"]]
+        return np.column_stack([self.design(H)] + [d * coef for d in dH])
+
+    def linear_fit(self, H, y, passive=None):
+        """Bounded least-squares coefficients at fixed features (see ``solver.nnls_gram``)."""
+        G, b, _ = gram_system(self.design(H), y, intercept=False)
+        return nnls_gram(G, b, self.nonneg, passive)
+
+    def bounds(self, bounds=None):
+        """Lower and upper bounds of the transforms."""
+        bounds = {**DEFAULT_BOUNDS, **(bounds or {})}
+        n = self.n_channels
+        lower = np.concatenate([np.full(n, bounds[name][0]) for name in ("decay", "log_alpha", "beta")])
+        upper = np.concatenate([np.full(n, bounds[name][1]) for name in ("decay", "log_alpha", "beta")])
+        return lower, upper
+
+
+class _Projection:
+    """
+    Residuals and Jacobian of the variable-projection problem.
+
+    At given transforms the linear coefficients are the bounded fit, so
+    only the transforms are left to the nonlinear solver. The Jacobian is
+    Kaufman's: the exact derivative of the fitted values with the
+    coefficients held fixed, projected off the span of the columns with
+    free coefficients. Its gradient ``J'r`` equals the exact gradient of
+    the projected objective.
+    """
+
+    def __init__(self, model, y):
+        self.model = model
+        self.y = y
+        self.passive = None
+        self._key = None
+
+    def _evaluate(self, transforms):
+        key = transforms.tobytes()
+        if key != self._key:
+            H, dH = self.model.transform(transforms)
+            linear, self.passive = self.model.linear_fit(H, self.y, self.passive)
+            self._key, self._state = key, (H, dH, linear)
+        return self._state
+
+    def residuals(self, transforms):
+        H, _, linear = self._evaluate(transforms)
+        return self.model.design(H) @ linear - self.y
+
+    def jacobian(self, transforms):
+        H, dH, linear = self._evaluate(transforms)
+        coef = linear[self.model.slices["coef"]]
+        D = np.column_stack([d * coef for d in dH])
+        Z = self.model.design(H)
+        free = ~self.model.nonneg | (linear > 0)
+        Q, _ = np.linalg.qr(Z[:, free])
+        return D - Q @ (Q.T @ D)
+
+    def theta(self, transforms):
+        return np.r_[self._evaluate(transforms)[2], transforms]
+
+
+class NonlinearFit:
+    """
+    Result of ``fit_nonlinear``.
+
+    Attributes:
+    -----------
+    channels, controls : list of str
+    params : pd.DataFrame
+        Per channel: ``coef``, ``decay``, ``alpha`` (in execution units of
+        the adstock), ``beta`` and ``alpha_at_bound``, set where ``alpha``
+        ends on the peak adstock with a positive coefficient: the fit would
+        grow both further, so that channel's curve is not identified past
+        the data and its response should not be extrapolated.
+    intercept : float
+    control_coef : pd.Series
+    metrics : dict
+        r2, dw, cost, nfev and the solver status.
+    """
+
+    def __init__(self, model, theta, channels, controls, y, index, result):
+        self.model = model
+        self.theta = theta
+        self.channels = list(channels)
+        self.controls = list(controls)
+        p = model.unpack(theta)
+        n = model.n_channels
+        self.intercept = float(p["intercept"][0])
+        self.params = pd.DataFrame({
+            "coef": p["coef"],
+            "decay": p["decay"],
+            "alpha": model.alpha(theta[model.n_linear :]),
+            "beta": p["beta"],
+            "alpha_at_bound": (result.active_mask[n : 2 * n] > 0) & (p["coef"] > 0),
+        }, index=self.channels)
+        self.control_coef = pd.Series(p["controls"], index=self.controls, dtype=float)
+        self.fitted = pd.Series(model.predict(theta), index=index)
+        residuals = y - self.fitted.to_numpy()
+        self.metrics = {
+            "r2": float(r2_score(y, self.fitted.to_numpy())),
+            "dw": float(durbin_watson(residuals)),
+            "cost": float(result.cost),
+            "nfev": int(result.nfev),
+            "status": int(result.status),
+        }
+
+    def contributions(self):
+        """Weekly contribution of the intercept, every channel and every control."""
+        p = self.model.unpack(self.theta)
+        H, _ = self.model.transform(self.theta[self.model.n_linear :], derivatives=False)
+        parts = np.column_stack([np.full(len(H), self.intercept), H * p["coef"],
+                                 self.model.C * p["controls"]])
+        return pd.DataFrame(parts, index=self.fitted.index,
+                            columns=["Intercept"] + self.channels + self.controls)
+
+    def response_curves(self, ratio=1.0):
+        """
+        Steady-state response to weekly spend, for ``allocation.allocate``.
+
+        Constant weekly execution ``x`` settles at the adstock ``x / (1 -
+        decay)``, so its Hill curve in ``x`` has half-saturation point
+        ``alpha * (1 - decay)``.
+        """
+        p = self.params
+        return ResponseCurves(self.channels, p["coef"].to_numpy(),
+                              (p["alpha"] * (1.0 - p["decay"])).to_numpy(),
+                              p["beta"].to_numpy(), ratio)
+
+
+def fit_nonlinear(df, channels=None, controls=ONLINE_CONTROLS, target=TARGET, decay=0.5,
+                  log_alpha=-1.0, beta=1.0, bounds=None, n_starts=1, seed=None, max_nfev=None,
+                  tol=1e-6):
+    """
+    Estimate per-channel decay, Hill alpha / beta and all coefficients together.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date.
+    channels : list of str, optional
+        Media columns; defaults to every execution column that is not all zero.
+    controls : list of str
+        Linear, unconstrained columns.
+    decay, log_alpha, beta : float or array-like
+        Starting transforms, per channel or shared. ``log_alpha`` is
+        relative to each channel's peak adstock (see ``HillAdstockModel``).
+    bounds : dict, optional
+        Overrides of ``DEFAULT_BOUNDS`` as ``{name: (low, high)}``.
+    n_starts : int
+        Solves from the given start plus ``n_starts - 1`` random ones
+        (decay and beta uniform within their bounds, log_alpha in [-1, 1] within its bounds);
+        the fit with the lowest cost is kept. The problem is not convex.
+    seed : int, optional
+        Seed of the random starts.
+    max_nfev : int, optional
+        Cap on residual evaluations per start.
+    tol : float
+        ``ftol`` / ``xtol`` / ``gtol`` of ``scipy.optimize.least_squares``.
+
+    Returns:
+    --------
+    NonlinearFit
+    """
+    from scipy.optimize import least_squares
+
+    if channels is None:
+        channels = [col for col in df.columns if "execution" in col and df[col].any()]
+    controls = list(controls)
+    frame = df[list(channels) + controls + [target]].dropna()
+    y = frame[target].to_numpy(dtype=float)
+    model = HillAdstockModel(frame[list(channels)], frame[controls])
+    lower, upper = model.bounds(bounds)
+    n = model.n_channels
+    starts = [np.concatenate([np.broadcast_to(np.asarray(v, dtype=float), (n,))
+                              for v in (decay, log_alpha, beta)])]
+    rng = np.random.default_rng(seed)
+    low = np.maximum(lower, np.repeat([-np.inf, -1.0, -np.inf], n))
+    high = np.minimum(upper, np.repeat([np.inf, 1.0, np.inf], n))
+    starts += [rng.uniform(low, high) for _ in range(n_starts - 1)]
+
+    best = None
+    for start in starts:
+        problem = _Projection(model, y)
+        result = least_squares(
+            problem.residuals,
+            np.clip(start, lower, upper),
+            jac=problem.jacobian,
+            bounds=(lower, upper),
+            method="trf",
+            x_scale=1.0,  # the transforms are all of order one
+            ftol=tol,
+            xtol=tol,
+            gtol=tol,
+            max_nfev=max_nfev,
+        )
+        if best is None or result.cost < best[1].cost:
+            best = problem, result
+    problem, result = best
+    return NonlinearFit(model, problem.theta(result.x), channels, controls, y, frame.index, result)
@@ -0,0 +1,209 @@
+"""Stateful model updated one week at a time.
+
+Media channels enter as geometric adstock (optionally log-saturated), so
+the carry-over of every channel is one number: a new week costs
+``a = x + decay * a`` per channel. Coefficients follow recursive least
+squares with a forgetting factor, which tracks slowly drifting effects
+without refitting the history. The RLS estimate itself stays
+unconstrained; the reported coefficients are its projection onto
+non-negative media effects in the metric of the forgetting-weighted Gram
+matrix, i.e. the constrained weighted least-squares fit, found by a
+warm-started active-set solve. The whole state is a few small arrays
+written to a checkpoint, so a weekly refresh is load, update, save.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .data import ONLINE_CONTROLS, TARGET
+from .solver import nnls_gram
+
+SATURATIONS = {
+    None: lambda a: a,
+    "log1p": np.log1p,
+}
+
+
+class OnlineMMM:
+    """
+    Recursive least-squares MMM over adstocked media and controls.
+
+    Parameters:
+    -----------
+    channels : list of str
+        Media (execution) columns.
+    controls : list of str
+        Columns entering untransformed with free coefficients.
+    decay : float or array-like
+        Geometric adstock decay, per channel or shared.
+    forgetting : float
+        RLS forgetting factor in (0, 1]; a week ``k`` weeks old carries
+        weight ``forgetting**k``. 1 is ordinary least squares.
+    saturation : str, optional
+        None or "log1p", applied to the adstocked media.
+    target : str
+    delta : float
+        Initial ``P = I / delta`` before any data, i.e. a weak ridge prior.
+    """
+
+    def __init__(self, channels, controls=ONLINE_CONTROLS, decay=0.7, forgetting=0.99,
+                 saturation="log1p", target=TARGET, delta=1e-6):
+        self.channels = list(channels)
+        self.controls = list(controls)
+        self.decay = np.broadcast_to(np.asarray(decay, dtype=float), (len(self.channels),)).copy()
+        self.forgetting = float(forgetting)
+        self.saturation = saturation
+        self.target = target
+        p = 1 + len(self.channels) + len(self.controls)
+        self.nonneg = np.r_[False, np.ones(len(self.channels), dtype=bool),
+                            np.zeros(len(self.controls), dtype=bool)]
+        self.coef = np.zeros(p)
+        self.coef_ls = np.zeros(p)
+        self.P = np.eye(p) / delta
+        self.G = np.eye(p) * delta
+        self._passive = None
+        self.carry = np.zeros(len(self.channels))
+        self.n_weeks = 0
+        self.last_week = None
+
+    @property
+    def names(self):
+        return ["Intercept"] + self.channels + self.controls
+
+    def _split(self, row):
+        media = np.array([row[c] for c in self.channels], dtype=float)
+        controls = np.array([row[c] for c in self.controls], dtype=float)
+        return media, controls
+
+    def _features(self, carry, controls):
+        return np.r_[1.0, SATURATIONS[self.saturation](carry), controls]
+
+    def predict(self, row):
+        """Predicted target for ``row`` (a mapping of column -> value) without changing the state."""
+        media, controls = self._split(row)
+        carry = media + self.decay * self.carry if self.n_weeks else media
+        return float(self._features(carry, controls) @ self.coef)
+
+    def update(self, row, week=None):
+        """
+        Absorb one week.
+
+        Parameters:
+        -----------
+        row : mapping
+            Values of the channels, controls and target for the week,
+            e.g. one row of the weekly dataset.
+        week : optional
+            Label stored as ``last_week``.
+
+        Returns:
+        --------
+        float: Prediction of the week's target made before seeing it.
+        """
+        media, controls = self._split(row)
+        self.carry = media + self.decay * self.carry if self.n_weeks else media
+        z = self._features(self.carry, controls)
+        y = float(row[self.target])
+        predicted = float(z @ self.coef)
+
+        Pz = self.P @ z
+        gain = Pz / (self.forgetting + z @ Pz)
+        self.coef_ls = self.coef_ls + gain * (y - z @ self.coef_ls)
+        self.P = (self.P - np.outer(gain, Pz)) / self.forgetting
+        self.P = 0.5 * (self.P + self.P.T)  # keep it symmetric against round-off
+        self.G = self.forgetting * self.G + np.outer(z, z)
+        self._project()
+
+        self.n_weeks += 1
+        self.last_week = None if week is None else str(week)
+        return predicted
+
+    def fit(self, df, ridge=1e-8):
+        """
+        Initialize from a history of weeks in one batch solve.
+
+        Uses the same forgetting weights as the updates, then sets ``P``
+        to the inverse of the weighted Gram matrix so that later updates
+        continue exactly from the batch fit.
+        """
+        media = df[self.channels].to_numpy(dtype=float)
+        carry = geometric_adstock(media, self.decay)
+        Z = np.column_stack([np.ones(len(df)), SATURATIONS[self.saturation](carry),
+                             df[self.controls].to_numpy(dtype=float)])
+        y = df[self.target].to_numpy(dtype=float)
+        w = self.forgetting ** np.arange(len(df) - 1, -1, -1)
+        G = (Z * w[:, None]).T @ Z
+        b = (Z * w[:, None]).T @ y
+        G += ridge * np.diag(np.diag(G))
+        self.G = G
+        self.P = np.linalg.pinv(G)
+        self.coef_ls = self.P @ b
+        self._passive = None
+        self._project()
+        self.carry = carry[-1]
+        self.n_weeks = len(df)
+        self.last_week = str(df.index[-1])
+        return self
+
+    def _project(self):
+        # argmin (c - coef_ls)' G (c - coef_ls) with media c >= 0
+        self.coef, passive = nnls_gram(self.G, self.G @ self.coef_ls, self.nonneg, self._passive)
+        self._passive = passive
+
+    def update_frame(self, df):
+        """Absorb every row of ``df`` in order; returns the one-step-ahead predictions."""
+        return np.array([self.update(row, week) for week, row in df.iterrows()])
+
+    def save(self, path):
+        """Write the state to ``path`` (``.npz``), atomically."""
+        meta = {
+            "channels": self.channels,
+            "controls": self.controls,
+            "forgetting": self.forgetting,
+            "saturation": self.saturation,
+            "target": self.target,
+            "n_weeks": self.n_weeks,
+            "last_week": self.last_week,
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, coef=self.coef, coef_ls=self.coef_ls, P=self.P, G=self.G,
+                     carry=self.carry, decay=self.decay, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Restore a model written by ``save``."""
+        with np.load(path) as state:
+            meta = json.loads(str(state["meta"]))
+            model = cls(meta["channels"], meta["controls"], state["decay"], meta["forgetting"],
+                        meta["saturation"], meta["target"])
+            model.coef = state["coef"]
+            model.coef_ls = state["coef_ls"]
+            model.P = state["P"]
+            model.G = state["G"]
+            model.carry = state["carry"]
+        model.n_weeks = meta["n_weeks"]
+        model.last_week = meta["last_week"]
+        return model
+
+
+def refresh(path, df):
+    """
+    Weekly refresh of a checkpointed model: load, absorb the new rows of
+    ``df`` (those after ``last_week``), save.
+
+    Returns:
+    --------
+    np.ndarray: One-step-ahead predictions of the absorbed weeks.
+    """
+    model = OnlineMMM.load(path)
+    if model.last_week is not None:
+        df = df[df.index > pd.Timestamp(model.last_week)]
+    predictions = model.update_frame(df)
+    model.save(path)
+    return predictions
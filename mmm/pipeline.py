@@ -0,0 +1,315 @@
+"""Lazy, fingerprinted pipeline of the online model.
+
+Each stage declares the stages it reads, the parameters it uses and the
+input files it depends on. Its fingerprint hashes its own source, the
+source of the ``mmm`` package it calls into, its parameter values, the
+size and mtime of its files and the fingerprints of its inputs, so it
+changes whenever the stage's output could.
+Asking for a stage evaluates only the stages it depends on, and a stage
+whose fingerprint is unchanged is read back from memory or from the
+cache directory instead of being recomputed. Changing ``imp`` therefore
+reruns the selection cut, the fit and what depends on them; ingestion,
+features, the correlation filter and the selection path are reused.
+
+    python -m mmm.pipeline report --imp 0.005 --cache-dir pipeline_cache
+"""
+
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .data import DATE_COL
+from .instrumentation import emit, stage as instrumented_stage
+
+
+@functools.lru_cache(maxsize=None)
+def package_code():
+    """Hash of the source of every module of the ``mmm`` package."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(directory, name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class Stage:
+    """
+    One node of a ``Pipeline``.
+
+    Parameters:
+    -----------
+    name : str
+    func : callable
+        Called with the outputs of ``inputs`` (positionally, in order)
+        and the values of ``params`` (as keywords).
+    inputs : tuple of str
+        Names of the stages it reads.
+    params : tuple of str
+        Keyword parameters of ``func``; their defaults come from its signature.
+    files : tuple of str
+        Parameters holding paths whose size and mtime enter the fingerprint.
+    """
+
+    def __init__(self, name, func, inputs=(), params=(), files=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+        self.files = tuple(files)
+        signature = inspect.signature(func).parameters
+        self.defaults = {p: signature[p].default for p in self.params
+                         if signature[p].default is not inspect.Parameter.empty}
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = func.__qualname__
+        self.code = hashlib.sha1(source.encode()).hexdigest()[:16]
+
+
+class Pipeline:
+    """
+    Named stages evaluated on demand.
+
+    Parameters:
+    -----------
+    cache_dir : str, optional
+        Directory of pickled stage outputs, shared across runs; memory
+        only when None.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.stages = {}
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self.log = []
+
+    def stage(self, name=None, inputs=(), params=(), files=()):
+        """Decorator registering a function as a stage."""
+
+        def register(func):
+            self.add(Stage(name or func.__name__, func, inputs, params, files))
+            return func
+
+        return register
+
+    def add(self, stage):
+        missing = [name for name in stage.inputs if name not in self.stages]
+        if missing:
+            raise ValueError(f"stage {stage.name!r} reads unknown stages: {missing}")
+        self.stages[stage.name] = stage
+
+    def _params(self, stage, params):
+        values = {}
+        for name in stage.params:
+            if name in params:
+                values[name] = params[name]
+            elif name in stage.defaults:
+                values[name] = stage.defaults[name]
+            else:
+                raise ValueError(f"stage {stage.name!r} needs parameter {name!r}")
+        return values
+
+    def fingerprint(self, name, params, _memo=None):
+        """Hash of everything the output of stage ``name`` depends on."""
+        memo = {} if _memo is None else _memo
+        if name not in memo:
+            stage = self.stages[name]
+            values = self._params(stage, params)
+            files = {}
+            for p in stage.files:
+                st = os.stat(values[p])
+                files[p] = [st.st_size, st.st_mtime_ns]
+            parts = {
+                "stage": name,
+                "code": stage.code,
+                # Helpers such as build_features or fit_constrained live outside the stage
+                "package": package_code(),
+                "params": values,
+                "files": files,
+                "inputs": [self.fingerprint(i, params, memo) for i in stage.inputs],
+            }
+            blob = json.dumps(parts, sort_keys=True, default=repr).encode()
+            memo[name] = hashlib.sha1(blob).hexdigest()[:20]
+        return memo[name]
+
+    def _path(self, name, fingerprint):
+        return os.path.join(self.cache_dir, f"{name}-{fingerprint}.pkl")
+
+    def _load(self, name, fingerprint):
+        cached = self._memory.get(name)
+        if cached is not None and cached[0] == fingerprint:
+            return "memory", cached[1]
+        if self.cache_dir is not None and os.path.exists(self._path(name, fingerprint)):
+            with open(self._path(name, fingerprint), "rb") as f:
+                return "disk", pickle.load(f)
+        return None, None
+
+    def _save(self, name, fingerprint, value):
+        self._memory[name] = (fingerprint, value)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(name, fingerprint)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+    def run(self, name, **params):
+        """
+        Output of stage ``name``, evaluating only stale stages it depends on.
+
+        ``log`` then lists ``(stage, "computed" | "memory" | "disk")`` for
+        every stage visited, in evaluation order.
+        """
+        self.log = []
+        return self._run(name, params, {}, {})
+
+    def _run(self, name, params, memo, outputs):
+        if name in outputs:
+            return outputs[name]
+        fingerprint = self.fingerprint(name, params, memo)
+        source, value = self._load(name, fingerprint)
+        if source is None:
+            stage = self.stages[name]
+            args = [self._run(i, params, memo, outputs) for i in stage.inputs]
+            with instrumented_stage(name):
+                value = stage.func(*args, **self._params(stage, params))
+            self._save(name, fingerprint, value)
+            source = "computed"
+        elif source == "disk":
+            self._memory[name] = (fingerprint, value)
+        self.log.append((name, source))
+        emit("pipeline", stage=name, source=source, fingerprint=fingerprint)
+        outputs[name] = value
+        return value
+
+    def stale(self, name, **params):
+        """Stages ``run(name, **params)`` would recompute, in dependency order."""
+        memo, seen, out = {}, set(), []
+
+        def visit(n):
+            if n in seen:
+                return
+            seen.add(n)
+            if self._load(n, self.fingerprint(n, params, memo))[0] is None:
+                for i in self.stages[n].inputs:
+                    visit(i)
+                out.append(n)
+
+        visit(name)
+        return out
+
+
+def online_pipeline(cache_dir=None):
+    """
+    Stages of the online model:
+
+    ingest -> pivot -> features -> correlation -> rank -> select -> fit
+    -> diagnostics -> report.
+    """
+    from .diagnostics import adjusted_r2, durbin_watson, r2_score, vif
+    from .features import build_features
+    from .ingest import ingest_long
+    from .selection import forward_path
+    from .trial import correlation_filter, fit_constrained, media_mask
+
+    pipeline = Pipeline(cache_dir)
+
+    @pipeline.stage(params=("data_path",), files=("data_path",))
+    def ingest(data_path="data/merged_data.csv"):
+        return ingest_long(data_path)
+
+    @pipeline.stage(inputs=("ingest",))
+    def pivot(panel):
+        return panel.to_frame().set_index(DATE_COL)
+
+    @pipeline.stage(inputs=("pivot",), params=("lag_range", "span", "alpha"))
+    def features(df, lag_range=5, span=4, alpha=0.7):
+        return build_features(df, lag_range, span, alpha)
+
+    @pipeline.stage(inputs=("features",), params=("cor",))
+    def correlation(design, cor=0.95):
+        X, y = design
+        return correlation_filter(X, cor), y
+
+    @pipeline.stage(inputs=("correlation",))
+    def rank(design):
+        X, y = design
+        return forward_path(X, y, nonneg=media_mask(X.columns))
+
+    @pipeline.stage(inputs=("correlation", "rank"), params=("imp", "sel"))
+    def select(design, path, imp=0.003, sel=35):
+        X, y = design
+        return X[path.select(sel, imp)], y
+
+    @pipeline.stage(inputs=("select",))
+    def fit(design):
+        X, y = design
+        beta, residuals = fit_constrained(X, y)
+        return {"coefficients": pd.Series(beta, index=["Intercept"] + list(X.columns)),
+                "residuals": pd.Series(residuals, index=X.index)}
+
+    @pipeline.stage(inputs=("select", "fit"))
+    def diagnostics(design, fitted):
+        X, y = design
+        residuals = fitted["residuals"].to_numpy()
+        r2 = r2_score(y, y - residuals)
+        return {
+            "r2": float(r2),
+            "adj_r2": float(adjusted_r2(r2, *X.shape)),
+            "dw": float(durbin_watson(residuals)),
+            "vif": vif(X),
+        }
+
+    @pipeline.stage(inputs=("fit", "diagnostics"))
+    def report(fitted, metrics):
+        coef = fitted["coefficients"]
+        lines = [
+            f"R²: {metrics['r2']:.4f}  adjusted R²: {metrics['adj_r2']:.4f}  "
+            f"Durbin-Watson: {metrics['dw']:.4f}  max VIF: {np.nanmax(metrics['vif'], initial=np.nan):.2f}",
+            f"{int((coef[1:] != 0).sum())} of {len(coef) - 1} features active",
+            coef[coef != 0].to_string(),
+        ]
+        return "\n".join(lines)
+
+    return pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the online model pipeline up to a stage.")
+    parser.add_argument("stage", nargs="?", default="report")
+    parser.add_argument("--data-path", default="data/merged_data.csv")
+    parser.add_argument("--lag-range", type=int, default=5)
+    parser.add_argument("--span", type=float, default=4)
+    parser.add_argument("--alpha", type=float, default=0.7)
+    parser.add_argument("--cor", type=float, default=0.95)
+    parser.add_argument("--imp", type=float, default=0.003)
+    parser.add_argument("--sel", type=int, default=35)
+    parser.add_argument("--cache-dir", default="pipeline_cache")
+    args = vars(parser.parse_args(argv))
+    name, cache_dir = args.pop("stage"), args.pop("cache_dir")
+
+    pipeline = online_pipeline(cache_dir)
+    result = pipeline.run(name, **args)
+    for stage_name, source in pipeline.log:
+        print(f"{stage_name:>12}: {source}", file=sys.stderr)
+    print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
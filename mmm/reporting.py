@@ -0,0 +1,153 @@
+"""Plots of the growth-driver data and model results.
+
+This is the only module that uses matplotlib, seaborn or networkx, and
+it imports them on first use, so the modelling core (and every worker
+process) starts without them. The growth-driver tree uses the graphviz
+``dot`` layout when pydot and graphviz are installed and a layered
+layout otherwise; nothing is installed at run time.
+
+Every function draws one figure and returns it; ``show()`` displays the
+open figures.
+"""
+
+from .data import DATE_COL, TARGET
+
+TREE_LEVELS = ["growth_driver_l1", "growth_driver_l2", "growth_driver_l3", "growth_driver_l4",
+               "growth_driver_l5"]
+LEVEL_COLORS = ["#FFD700", "#FF6347", "#4682B4", "#32CD32", "#8A2BE2"]
+
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _seaborn():
+    import seaborn as sns
+
+    sns.set_style("whitegrid")
+    return sns
+
+
+def show():
+    """Display every open figure."""
+    _pyplot().show()
+
+
+def _dates(df):
+    return df[DATE_COL] if DATE_COL in df.columns else df.index
+
+
+def growth_driver_tree(df, levels=TREE_LEVELS):
+    """
+    L1 -> L5 growth-driver tree, nodes colored by level.
+
+    ``df`` is the long extract or a ``hierarchy.Hierarchy`` built from it.
+    """
+    import networkx as nx
+
+    from .hierarchy import Hierarchy
+
+    plt = _pyplot()
+    hierarchy = df if isinstance(df, Hierarchy) else Hierarchy.from_frame(df, levels)
+    edges = hierarchy.edges().sort_values("depth", ascending=False)
+    parents, children = (edges[col].str.replace("_", " ") for col in ("parent", "child"))
+    # The shallowest level a label appears at wins
+    depth = dict(zip(children, edges["depth"]))
+    depth.update(dict.fromkeys(hierarchy.nodes[0].get_level_values(0).str.replace("_", " "), 0))
+
+    G = nx.DiGraph()
+    G.add_edges_from(zip(parents, children))
+    for node in G.nodes:
+        G.nodes[node]["layer"] = depth.get(node, 0)
+
+    try:
+        from networkx.drawing.nx_pydot import graphviz_layout
+
+        pos = graphviz_layout(G, prog="dot")
+    except Exception:  # pydot or the graphviz binaries are missing
+        layers = nx.multipartite_layout(G, subset_key="layer", align="horizontal")
+        pos = {node: (x, -y) for node, (x, y) in layers.items()}  # L1 at the top
+
+    fig = plt.figure(figsize=(15, 8))
+    colors = [LEVEL_COLORS[depth.get(node, 0) % len(LEVEL_COLORS)] for node in G.nodes]
+    nx.draw(G, pos, with_labels=False, node_color=colors, node_size=3500, edge_color="gray",
+            arrows=True)
+    for label, (x, y) in pos.items():
+        plt.text(x, y, label, fontsize=9, ha="center", va="center",
+                 bbox=dict(facecolor="white", edgecolor="black", boxstyle="round,pad=0.3"))
+    plt.title("Growth Drivers Tree Structure", fontsize=14)
+    return fig
+
+
+def execution_by_metric(df):
+    """Box plot of execution per metric type, log scale."""
+    plt, sns = _pyplot(), _seaborn()
+    fig = plt.figure(figsize=(10, 5))
+    sns.boxplot(x=df["metric"], y=df["execution"])
+    plt.yscale("log")
+    plt.title("Distribution of 'execution' by metric type (log scale)")
+    plt.xticks(rotation=45)
+    return fig
+
+
+def sales_over_time(df, target=TARGET):
+    """Weekly target."""
+    plt = _pyplot()
+    fig = plt.figure(figsize=(12, 5))
+    plt.plot(_dates(df), df[target], marker="o", linestyle="-", label="Online Sales")
+    plt.xlabel("Date")
+    plt.ylabel("Units Sold")
+    plt.title("📈 Online Sales Over Time")
+    plt.legend()
+    plt.xticks(rotation=45)
+    return fig
+
+
+def correlation_heatmap(corr, annot=True):
+    """Heatmap of a correlation matrix."""
+    plt, sns = _pyplot(), _seaborn()
+    fig = plt.figure(figsize=(12, 6))
+    sns.heatmap(corr, annot=annot, cmap="coolwarm", fmt=".2f", linewidths=0.5)
+    plt.title("🔗 Correlation Heatmap")
+    return fig
+
+
+def distributions(df, columns):
+    """One histogram (with KDE) per column; returns the figures."""
+    plt, sns = _pyplot(), _seaborn()
+    figures = []
+    for col in columns:
+        figures.append(plt.figure(figsize=(8, 4)))
+        sns.histplot(df[col], bins=30, kde=True)
+        plt.title(f"📊 Distribution of {col}")
+        plt.xlabel(col)
+    return figures
+
+
+def impact_over_time(df, columns, target=TARGET, ylabel="Execution Volume",
+                     title="📊 Execution Impact Over Time"):
+    """``columns`` (dashed) against the target over time."""
+    plt = _pyplot()
+    fig = plt.figure(figsize=(12, 5))
+    for col in columns:
+        plt.plot(_dates(df), df[col], linestyle="--", alpha=0.7, label=col)
+    plt.plot(_dates(df), df[target], color="black", linewidth=2, label="Online Sales")
+    plt.xlabel("Date")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.xticks(rotation=45)
+    return fig
+
+
+def feature_importance(importance, top=20, title="Top 20 Features (R² gain along the forward-stepwise path)"):
+    """Horizontal bars of the ``top`` largest scores of a feature -> score Series."""
+    plt, sns = _pyplot(), _seaborn()
+    fig = plt.figure(figsize=(10, 6))
+    sns.barplot(x=importance[:top], y=importance.index[:top])
+    plt.title(title)
+    plt.xlabel("R² gain")
+    plt.ylabel("Feature")
+    return fig
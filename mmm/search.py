@@ -0,0 +1,280 @@
+"""Parallel, resumable hyperparameter search over the trial grid.
+
+Grid points are fanned out to a process pool. Every finished trial is
+appended as one JSON line to a trial store, so an interrupted search
+picks up where it stopped and never re-runs a point it already scored;
+points whose trial raised are retried.
+"""
+
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .data import load_online_dataset
+from .feature_store import FeatureStore
+from .instrumentation import context, emit, stage
+from .trial import PARAM_NAMES, evaluate_trial
+
+
+def grid_points(grid):
+    """All combinations of a ``{name: [values]}`` grid, as a list of dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def sample_grid(grid, n=None, method="full", seed=None):
+    """
+    Pick the grid points to evaluate.
+
+    Parameters:
+    -----------
+    grid : dict
+        ``{name: [values]}``.
+    n : int, optional
+        Number of points for the "random" and "sobol" methods.
+    method : str
+        "full" (every point, in grid order), "random" (uniform without
+        replacement) or "sobol" (scrambled Sobol sequence snapped to the
+        grid, which covers every axis more evenly than random draws).
+    seed : int, optional
+        Seed for the random and Sobol samplers.
+    """
+    names = list(grid)
+    sizes = [len(grid[name]) for name in names]
+    total = int(np.prod(sizes))
+    if method == "full" or n is None or n >= total:
+        return grid_points(grid)
+
+    if method == "random":
+        flat = np.random.default_rng(seed).choice(total, size=n, replace=False)
+        indices = np.stack(np.unravel_index(flat, sizes), axis=1)
+    elif method == "sobol":
+        from scipy.stats import qmc
+
+        # Draw extra points since several can snap to the same grid cell
+        sampler = qmc.Sobol(d=len(names), scramble=True, seed=seed)
+        draws = sampler.random(2 ** int(np.ceil(np.log2(4 * n))))
+        cells = np.minimum((draws * sizes).astype(int), np.array(sizes) - 1)
+        _, first = np.unique(cells, axis=0, return_index=True)
+        indices = cells[np.sort(first)][:n]
+    else:
+        raise ValueError(f"Unknown sampling method: {method!r}")
+
+    return [{name: grid[name][i] for name, i in zip(names, row)} for row in indices]
+
+
+def trial_key(params):
+    """Stable identifier of a grid point."""
+    return json.dumps({k: params[k] for k in sorted(params)}, default=float)
+
+
+class TrialStore:
+    """
+    Append-only JSON-lines log of finished trials.
+
+    Each line holds ``params``, ``status``, ``metrics`` and timing. Lines
+    are flushed as they are written; a truncated last line left by a crash
+    is ignored on reload.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[trial_key(record["params"])] = record
+
+    def __contains__(self, params):
+        return trial_key(params) in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def status(self, params):
+        """Status of the stored trial at ``params``, or None if it has not run."""
+        record = self.records.get(trial_key(params))
+        return None if record is None else record["status"]
+
+    def append(self, record):
+        self.records[trial_key(record["params"])] = record
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, default=float) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def best(self, objective="r2", maximize=True):
+        """Best successful trial by ``metrics[objective]``, or None."""
+        scored = [r for r in self.records.values()
+                  if r["status"] == "ok" and objective in r["metrics"]]
+        if not scored:
+            return None
+        sign = 1 if maximize else -1
+        return max(scored, key=lambda r: sign * r["metrics"][objective])
+
+    def to_frame(self):
+        """Trials as a DataFrame with one column per parameter and metric."""
+        import pandas as pd
+
+        return pd.DataFrame([
+            {**r["params"], "status": r["status"], **r.get("metrics", {})}
+            for r in self.records.values()
+        ])
+
+
+class EarlyStopping:
+    """
+    Stop when the objective has not improved by ``min_delta`` for
+    ``patience`` successful trials, or once it reaches ``target``.
+    """
+
+    def __init__(self, patience=None, min_delta=0.0, target=None, maximize=True):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.target = target
+        self.sign = 1 if maximize else -1
+        self.best = -np.inf
+        self.stale = 0
+
+    def update(self, value):
+        """Record one objective value; return True when the search should stop."""
+        value = self.sign * value
+        if value > self.best + self.min_delta:
+            self.best, self.stale = value, 0
+        else:
+            self.stale += 1
+        if self.target is not None and value >= self.sign * self.target:
+            return True
+        return self.patience is not None and self.stale >= self.patience
+
+
+_worker_store = None
+_worker_active = None
+_worker_validation = None
+
+
+def _init_worker(df, cache_dir=None, validation=None):
+    global _worker_store, _worker_active, _worker_validation
+    if isinstance(df, str):
+        df = load_online_dataset(df)
+    _worker_store = FeatureStore(df, cache_dir=cache_dir)
+    _worker_active = None
+    _worker_validation = validation
+
+
+def _run_trial(params):
+    global _worker_active
+    start = time.perf_counter()
+    try:
+        # The previous trial of this worker seeds the fit's active set
+        with context(params=params), stage("trial"):
+            result = evaluate_trial(_worker_store.df, params, store=_worker_store,
+                                    warm_start=_worker_active, validation=_worker_validation)
+        if result["status"] == "ok":
+            _worker_active = [f for f, c in result["coefficients"].items() if c > 0]
+    except Exception as exc:  # one bad grid point must not kill the search
+        result = {"status": "error", "reason": f"{type(exc).__name__}: {exc}"}
+    result["params"] = params
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def run_search(df, grid, store, n_jobs=None, n_trials=None, sampling="full", seed=None,
+               objective="r2", maximize=True, patience=None, min_delta=0.0, target=None,
+               cache_dir=None, validation=None, retry_errors=True, verbose=True):
+    """
+    Evaluate a lag_range / span / alpha / cor / imp / sel grid.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame or str
+        Weekly dataset indexed by date, sent once to each worker, or the
+        path of a design file that every worker memory-maps read-only.
+    grid : dict
+        ``{name: [values]}`` for every name in ``trial.PARAM_NAMES``.
+    store : TrialStore or str
+        Trial store (or its path). Points already in it are skipped.
+    n_jobs : int, optional
+        Worker processes; defaults to the CPU count, 1 runs in-process.
+    n_trials, sampling, seed :
+        Subsampling of the grid, see ``sample_grid``.
+    objective, maximize, patience, min_delta, target :
+        Early-stopping rule, see ``EarlyStopping``.
+    cache_dir : str, optional
+        Disk tier of the per-worker ``FeatureStore``, shared by workers.
+    validation : dict, optional
+        Walk-forward fold layout (see ``trial.evaluate_trial``); search on
+        an out-of-sample objective such as "cv_r2", or "cv_nrmse" with
+        ``maximize=False``.
+    retry_errors : bool
+        Re-run points whose stored trial raised, instead of skipping them
+        like the points that completed.
+
+    Returns:
+    --------
+    dict: Best trial record in the store.
+    """
+    missing = set(PARAM_NAMES) - set(grid)
+    if missing:
+        raise ValueError(f"Grid is missing parameters: {sorted(missing)}")
+    if isinstance(store, str):
+        store = TrialStore(store)
+
+    todo = [p for p in sample_grid(grid, n_trials, sampling, seed)
+            if p not in store or (retry_errors and store.status(p) == "error")]
+    stopper = EarlyStopping(patience, min_delta, target, maximize)
+    for record in store.records.values():
+        if record["status"] == "ok" and objective in record["metrics"]:
+            stopper.update(record["metrics"][objective])
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if verbose:
+        print(f"{len(todo)} trials to run, {len(store)} already in {store.path}")
+
+    def save(record):
+        store.append(record)
+        emit("trial", params=record["params"], status=record["status"], elapsed=record["elapsed"],
+             metrics=record.get("metrics"), reason=record.get("reason"))
+
+    def finish(record):
+        save(record)
+        if verbose and len(store) % 100 == 0:
+            best = store.best(objective, maximize)
+            print(f"{len(store)} trials done, best {objective}: "
+                  f"{best['metrics'][objective] if best else float('nan'):.4f}")
+        return record["status"] == "ok" and stopper.update(record["metrics"][objective])
+
+    if n_jobs == 1:
+        _init_worker(df, cache_dir, validation)
+        for params in todo:
+            if finish(_run_trial(params)):
+                break
+        return store.best(objective, maximize)
+
+    # Keep a bounded number of trials in flight so early stopping takes
+    # effect quickly and the pending queue never holds the whole grid
+    pending, queue = set(), iter(todo)
+    with ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                             initargs=(df, cache_dir, validation)) as pool:
+        for params in itertools.islice(queue, 2 * n_jobs):
+            pending.add(pool.submit(_run_trial, params))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            stop = False
+            for future in done:
+                stop = finish(future.result()) or stop
+            if stop:
+                break
+            for params in itertools.islice(queue, len(done)):
+                pending.add(pool.submit(_run_trial, params))
+        for future in pending:
+            if not future.cancel():  # already running, keep its result
+                save(future.result())
+    return store.best(objective, maximize)
@@ -0,0 +1,98 @@
+"""Feature selection from a single forward-stepwise path.
+
+The random forest importance filter followed by RFE refits models for
+every ``imp`` / ``sel`` value. Forward stepwise regression with an
+incrementally orthogonalized basis (a Gram-Schmidt QR built one column at
+a time) ranks every feature in one pass costing about one least-squares
+fit. Each feature's entry gain, the share of the target variance it
+explains on top of the features before it, stands in for the importance
+score. Any (``imp``, ``sel``) pair is then read off the path.
+"""
+
+import numpy as np
+
+
+class SelectionPath:
+    """
+    Entry order of the features along a forward-stepwise path.
+
+    Attributes:
+    -----------
+    order : list
+        Features in the order they entered.
+    gains : np.ndarray
+        R² added by each feature when it entered; they sum to the R² of
+        the full path.
+    """
+
+    def __init__(self, order, gains):
+        self.order = list(order)
+        self.gains = np.asarray(gains, dtype=float)
+
+    def __len__(self):
+        return len(self.order)
+
+    def select(self, sel=None, imp=0.0):
+        """The first ``sel`` features of the path whose entry gain is at least ``imp``."""
+        kept = [f for f, gain in zip(self.order, self.gains) if gain >= imp]
+        return kept if sel is None else kept[:sel]
+
+    def r2(self, k):
+        """R² of the least-squares fit (with intercept) on the first ``k`` features."""
+        return float(self.gains[:k].sum())
+
+
+def forward_path(X, y, nonneg=None, max_features=None, tol=1e-10):
+    """
+    Rank features by forward stepwise least squares (with intercept).
+
+    At every step the feature whose component orthogonal to the features
+    already chosen removes the most residual variance enters; the rest
+    are orthogonalized against it with one rank-one update, so the whole
+    path costs O(weeks x features x steps).
+
+    Parameters:
+    -----------
+    X : pd.DataFrame or array-like
+        Candidate features, shape (weeks, p).
+    y : array-like
+        Target.
+    nonneg : array-like of bool, optional
+        Features that may only enter with a positive partial effect
+        (media columns whose coefficients are constrained >= 0).
+    max_features : int, optional
+        Stop the path early.
+    tol : float
+        Columns whose orthogonalized norm falls below ``tol`` times their
+        original norm are collinear with the chosen set and never enter.
+    """
+    names = list(X.columns) if hasattr(X, "columns") else list(range(np.shape(X)[1]))
+    W = np.asarray(X, dtype=float)
+    W = W - W.mean(axis=0)
+    r = np.asarray(y, dtype=float)
+    r = r - r.mean()
+    tss = float(r @ r)
+    p = W.shape[1]
+    nonneg = np.zeros(p, dtype=bool) if nonneg is None else np.asarray(nonneg, dtype=bool)
+    max_features = p if max_features is None else min(max_features, p)
+
+    norms0 = np.einsum("ij,ij->j", W, W)
+    available = norms0 > 0
+    order, gains = [], []
+    while len(order) < max_features:
+        norms = np.einsum("ij,ij->j", W, W)
+        available &= norms > tol * norms0
+        corr = W.T @ r
+        candidates = available & (~nonneg | (corr > 0))
+        if not candidates.any() or tss == 0:
+            break
+        score = np.where(candidates, corr**2 / np.where(available, norms, 1.0), -np.inf)
+        j = int(np.argmax(score))
+
+        q = W[:, j] / np.sqrt(norms[j])
+        r = r - q * (q @ r)
+        W = W - np.outer(q, q @ W)
+        available[j] = False
+        order.append(names[j])
+        gains.append(score[j] / tss)
+    return SelectionPath(order, gains)
@@ -0,0 +1,548 @@
+"""Local scenario-serving API over saved model artifacts.
+
+Planner questions such as "what if we move £50k from meta to tik_tok
+next quarter" are answered by a small asyncio HTTP/1.1 service (TCP or a
+Unix socket), instead of re-running a notebook. The artifacts directory
+is read once at startup:
+
+    online_model.npz   OnlineMMM checkpoint: coefficients, adstock carry, saturation
+    plan.json          baseline weekly spend, execution per pound and controls
+    curves.npz         ResponseCurves for allocations (optional)
+    hierarchy/         Hierarchy of the channels (optional; else parsed from their names)
+
+Routes (JSON in and out):
+
+    GET  /health      status, artifacts and cache statistics
+    GET  /channels    channels with their baseline weekly spend
+    POST /scenario    {"scenarios": [{"weeks": 13, "shift": [{"from": "meta",
+                      "to": "tik_tok", "amount": 50000}], ...}, ...]}
+    POST /allocate    {"budget": 250000, "lower": {...}, "upper": {...}}
+
+A batch of scenarios is forecast in one vectorized pass: the checkpointed
+adstock carry is rolled forward over a (weeks x scenarios x channels)
+block. Channel names resolve to leaves through the hierarchy, so "meta"
+or an L3 driver name addresses every leaf under it, splitting amounts in
+proportion to baseline spend. Scenario and allocation answers are kept
+in an LRU cache keyed by their canonical JSON. Allocations run on a
+bounded process pool whose workers load the curves once; requests past
+the queue bound get 503, and bodies over ``MAX_BODY`` get 413.
+
+    python -m mmm.serve artifacts --port 8765
+    python -m mmm.serve artifacts --unix /tmp/mmm.sock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .allocation import ResponseCurves, allocate
+from .data import LEVEL_COLS
+from .hierarchy import SEPARATOR, Hierarchy, leaf_of
+from .instrumentation import emit
+from .online import SATURATIONS, OnlineMMM
+
+DEFAULT_WEEKS = 13  # a quarter
+MAX_BODY = 1 << 20  # bytes; allocation and scenario requests are a few kB
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def baseline_plan(df, channels, controls, weeks=DEFAULT_WEEKS):
+    """
+    Baseline weekly plan: mean spend, execution and controls of the last
+    ``weeks`` rows, and execution bought per pound over the whole history.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset with ``"execution - <leaf>"`` and
+        ``"investment (in pound) - <leaf>"`` columns.
+    channels, controls : list of str
+
+    Returns:
+    --------
+    dict: JSON-serializable ``spend``, ``execution``, ``ratio`` (None
+    where no spend was recorded), ``controls`` and ``weeks``.
+    """
+    from .decomposition import spend_column
+
+    recent = df.iloc[-weeks:]
+    spend, execution, ratio = {}, {}, {}
+    for channel in channels:
+        column = spend_column(channel)
+        invested = df[column].sum() if column in df.columns else 0.0
+        spend[channel] = float(recent[column].mean()) if column in df.columns else 0.0
+        execution[channel] = float(recent[channel].mean())
+        ratio[channel] = float(df[channel].sum() / invested) if invested > 0 else None
+    return {
+        "weeks": int(weeks),
+        "spend": spend,
+        "execution": execution,
+        "ratio": ratio,
+        "controls": {c: float(recent[c].mean()) for c in controls},
+    }
+
+
+def save_artifacts(path, model, plan, curves=None, hierarchy=None):
+    """Write the artifacts ``ScenarioService`` loads into directory ``path``."""
+    os.makedirs(path, exist_ok=True)
+    model.save(os.path.join(path, "online_model.npz"))
+    with open(os.path.join(path, "plan.json"), "w") as f:
+        json.dump(plan, f, indent=2)
+    if curves is not None:
+        curves.save(os.path.join(path, "curves.npz"))
+    if hierarchy is not None:
+        hierarchy.save(os.path.join(path, "hierarchy"))
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used key."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+def _key(request):
+    return json.dumps(request, sort_keys=True, separators=(",", ":"))
+
+
+class ScenarioService:
+    """
+    Scenario forecasts and allocations from an artifacts directory.
+
+    Parameters:
+    -----------
+    path : str
+        Directory written by ``save_artifacts``.
+    cache_size : int
+        Entries of the scenario and allocation LRU cache.
+    """
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self.model = OnlineMMM.load(os.path.join(path, "online_model.npz"))
+        with open(os.path.join(path, "plan.json")) as f:
+            self.plan = json.load(f)
+        curves_path = os.path.join(path, "curves.npz")
+        self.curves = ResponseCurves.load(curves_path) if os.path.exists(curves_path) else None
+        if self.curves is not None:
+            # Channels with no recorded spend have no execution per pound: allocations keep
+            # them at their lower bound and optimize over the others
+            c = self.curves
+            params = np.broadcast_arrays(c.coef, c.alpha, c.beta, c.ratio)
+            self.priced = np.isfinite(params).all(axis=0)
+            self.priced_curves = ResponseCurves([ch for ch, p in zip(c.channels, self.priced) if p],
+                                                *(x[self.priced] for x in params))
+        hierarchy_path = os.path.join(path, "hierarchy")
+        if os.path.isdir(hierarchy_path):
+            self.hierarchy = Hierarchy.load(hierarchy_path)
+        else:
+            parts = pd.DataFrame([leaf_of(c).split(SEPARATOR) for c in self.model.channels])
+            parts.columns = LEVEL_COLS[: parts.shape[1]] if parts.shape[1] <= len(LEVEL_COLS) \
+                else [f"level_{i}" for i in range(parts.shape[1])]
+            self.hierarchy = Hierarchy.from_frame(parts, list(parts.columns))
+        self.cache = LRUCache(cache_size)
+
+        channels = self.model.channels
+        self.channels = channels
+        self.spend = np.array([self.plan["spend"].get(c, 0.0) for c in channels])
+        self.execution = np.array([self.plan["execution"].get(c, 0.0) for c in channels])
+        ratio = [self.plan["ratio"].get(c) for c in channels]
+        self.ratio = np.array([np.nan if r is None else r for r in ratio])
+        self.controls = np.array([self.plan["controls"][c] for c in self.model.controls])
+        self.weeks = int(self.plan.get("weeks", DEFAULT_WEEKS))
+        self._names = self._name_index()
+
+    def _name_index(self):
+        """Every full column, leaf label and node label -> channel positions."""
+        position = {leaf_of(c): j for j, c in enumerate(self.channels)}
+        names = {c: [j] for j, c in enumerate(self.channels)}
+        names.update({leaf: [j] for leaf, j in position.items()})
+        h = self.hierarchy
+        for k, (nodes, matrix) in enumerate(zip(h.nodes, h.matrices)):
+            matrix = matrix.tocsr()
+            for row, label in enumerate(nodes.get_level_values(k)):
+                leaves = [h.leaves[i] for i in matrix.indices[matrix.indptr[row] : matrix.indptr[row + 1]]]
+                found = [position[leaf] for leaf in leaves if leaf in position]
+                if found:
+                    names.setdefault(label, [])
+                    names[label] = sorted(set(names[label]) | set(found))
+        return names
+
+    def resolve(self, name):
+        """Channel positions addressed by a column, leaf or node name."""
+        if name not in self._names:
+            raise ValueError(f"unknown channel or growth driver: {name!r}")
+        return self._names[name]
+
+    def _split(self, name, amount, spend):
+        """``amount`` spread over the channels of ``name`` in proportion to ``spend``."""
+        idx = self.resolve(name)
+        weights = spend[idx]
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(idx), 1.0 / len(idx))
+        out = np.zeros(len(self.channels))
+        out[idx] = amount * weights
+        return out
+
+    def _plan(self, scenario):
+        """Weekly spend, execution and controls of one scenario."""
+        unknown = set(scenario) - {"weeks", "spend", "scale", "shift", "controls", "by"}
+        if unknown:
+            raise ValueError(f"unknown scenario fields: {sorted(unknown)}")
+        weeks = int(scenario.get("weeks", self.weeks))
+        if weeks < 1:
+            raise ValueError("weeks must be positive")
+        spend = self.spend.copy()
+        for name, value in scenario.get("spend", {}).items():
+            idx = self.resolve(name)
+            spend[idx] = 0.0
+            spend += self._split(name, float(value), self.spend)
+        for name, factor in scenario.get("scale", {}).items():
+            spend[self.resolve(name)] *= float(factor)
+        for move in scenario.get("shift", []):
+            amount = float(move["amount"]) / weeks  # a total over the horizon
+            spend -= self._split(move["from"], amount, spend)
+            spend += self._split(move["to"], amount, spend)
+        if (spend < -1e-9).any():
+            raise ValueError("scenario leaves negative spend on "
+                             + ", ".join(c for c, s in zip(self.channels, spend) if s < -1e-9))
+        changed = ~np.isclose(spend, self.spend)
+        priceless = changed & np.isnan(self.ratio)
+        if priceless.any():
+            raise ValueError("no spend was recorded to price " + ", ".join(np.array(self.channels)[priceless]))
+        execution = self.execution + np.where(changed, (spend - self.spend) * np.nan_to_num(self.ratio), 0.0)
+        controls = self.controls.copy()
+        for name, value in scenario.get("controls", {}).items():
+            controls[self.model.controls.index(name)] = float(value)
+        return weeks, spend, execution, controls
+
+    def forecast(self, execution, controls, weeks):
+        """
+        Weekly predicted units and media contributions of constant weekly plans.
+
+        Parameters:
+        -----------
+        execution : np.ndarray
+            Weekly execution per channel, shape (scenarios, channels).
+        controls : np.ndarray
+            Shape (scenarios, controls).
+        weeks : int
+
+        Returns:
+        --------
+        np.ndarray, np.ndarray: Units (weeks, scenarios) and media
+        contributions (weeks, scenarios, channels).
+        """
+        m = self.model
+        x = np.broadcast_to(execution, (weeks,) + execution.shape)
+        # The first row is the checkpointed carry, so the adstock continues from it
+        seeded = np.concatenate([np.broadcast_to(m.carry, (1,) + execution.shape), x])
+        media = SATURATIONS[m.saturation](geometric_adstock(seeded, m.decay)[1:])
+        C = len(self.channels)
+        contributions = media * m.coef[1 : 1 + C]
+        units = m.coef[0] + contributions.sum(axis=2) + controls @ m.coef[1 + C :]
+        return units, contributions
+
+    def _rollup(self, values, level):
+        rolled = self.hierarchy.rollup(values, level, labels=self.channels)
+        nodes = self.hierarchy.nodes[self.hierarchy.level(level)]
+        return {SEPARATOR.join(path): float(v) for path, v in zip(nodes, rolled)}
+
+    def scenarios(self, scenarios):
+        """
+        Answer a batch of scenarios; cached ones are not recomputed and the
+        others are forecast together.
+
+        Returns:
+        --------
+        list of dict: Per scenario ``weeks``, ``units``, ``baseline_units``,
+        ``incremental_units``, ``weekly_units``, ``spend`` (per channel over
+        the horizon), ``delta_spend`` and, with ``"by": <level>``, spend and
+        incremental units per node of that level.
+        """
+        answers, todo = [None] * len(scenarios), []
+        for i, scenario in enumerate(scenarios):
+            cached = self.cache.get(("scenario", _key(scenario)))
+            if cached is not None:
+                answers[i] = cached
+            else:
+                todo.append(i)
+        if not todo:
+            return answers
+
+        plans = [self._plan(scenarios[i]) for i in todo]
+        horizon = max(p[0] for p in plans)
+        execution = np.vstack([self.execution] + [p[2] for p in plans])
+        controls = np.vstack([self.controls] + [p[3] for p in plans])
+        units, contributions = self.forecast(execution, controls, horizon)
+        for s, (i, (weeks, spend, _, _)) in enumerate(zip(todo, plans), start=1):
+            total, baseline = units[:weeks, s].sum(), units[:weeks, 0].sum()
+            answer = {
+                "weeks": weeks,
+                "units": float(total),
+                "baseline_units": float(baseline),
+                "incremental_units": float(total - baseline),
+                "weekly_units": units[:weeks, s].tolist(),
+                "spend": dict(zip(self.channels, (spend * weeks).tolist())),
+                "delta_spend": float((spend - self.spend).sum() * weeks),
+            }
+            level = scenarios[i].get("by")
+            if level is not None:
+                incremental = (contributions[:weeks, s] - contributions[:weeks, 0]).sum(axis=0)
+                answer["by"] = {
+                    "spend": self._rollup(spend * weeks, level),
+                    "incremental_units": self._rollup(incremental, level),
+                }
+            self.cache.put(("scenario", _key(scenarios[i])), answer)
+            answers[i] = answer
+        return answers
+
+    def _bounds(self, bounds, default):
+        out = np.full(len(self.curves.channels), default, dtype=float)
+        for name, value in (bounds or {}).items():
+            idx = [j for j, c in enumerate(self.curves.channels) if c == name or leaf_of(c) == name]
+            if len(idx) != 1:
+                raise ValueError(f"allocation bounds need one channel, {name!r} matches {len(idx)}")
+            out[idx[0]] = float(value)
+        return out
+
+    def allocation(self, request):
+        """
+        Optimal weekly split of one or more budgets over the response curves.
+
+        Returns:
+        --------
+        dict: ``spend`` per channel (one list per budget when several),
+        ``marginal_return``, predicted ``units`` and the ``unpriced``
+        channels, held at their lower bound.
+        """
+        if self.curves is None:
+            raise ValueError("no response curves in the artifacts")
+        budget = np.asarray(request["budget"], dtype=float)
+        lower = self._bounds(request.get("lower"), 0.0)
+        upper = self._bounds(request.get("upper"), np.inf)
+        p = self.priced
+        priced_spend, marginal = allocate(self.priced_curves, budget - lower[~p].sum(), lower[p], upper[p])
+        spend = np.broadcast_to(lower, priced_spend.shape[:-1] + lower.shape).copy()
+        spend[..., p] = priced_spend
+        channels = self.curves.channels
+        if spend.ndim == 1:
+            table = dict(zip(channels, spend.tolist()))
+        else:
+            table = {c: spend[:, j].tolist() for j, c in enumerate(channels)}
+        return {"spend": table, "marginal_return": np.asarray(marginal).tolist(),
+                "units": np.asarray(self.priced_curves.total(priced_spend)).tolist(),
+                "unpriced": [c for c, priced in zip(channels, p) if not priced]}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "artifacts": self.path,
+            "last_week": self.model.last_week,
+            "channels": len(self.channels),
+            "curves": self.curves is not None,
+            "cache": self.cache.info(),
+        }
+
+
+_worker_service = None
+
+
+def _init_worker(path):
+    global _worker_service
+    _worker_service = ScenarioService(path, cache_size=0)
+
+
+def _allocate(request):
+    return _worker_service.allocation(request)
+
+
+class ScenarioServer:
+    """
+    asyncio HTTP/1.1 front end of a ``ScenarioService``.
+
+    Parameters:
+    -----------
+    service : ScenarioService
+    workers : int, optional
+        Allocation worker processes; defaults to the CPU count, 0 runs
+        allocations on the event loop.
+    max_pending : int, optional
+        Allocations queued or running before new ones get 503; defaults
+        to twice the workers.
+    max_body : int
+        Largest request body accepted, in bytes; longer ones get 413.
+    """
+
+    def __init__(self, service, workers=None, max_pending=None, max_body=MAX_BODY):
+        self.service = service
+        self.max_body = max_body
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 2 * max(self.workers, 1)
+        self.pending = 0
+        self.pool = None
+
+    async def start(self, host="127.0.0.1", port=8765, unix_socket=None):
+        if self.workers:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(self.service.path,))
+        if unix_socket is not None:
+            return await asyncio.start_unix_server(self._connection, path=unix_socket)
+        return await asyncio.start_server(self._connection, host, port)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def _allocation(self, request):
+        key = ("allocation", _key(request))
+        cached = self.service.cache.get(key)
+        if cached is not None:
+            return 200, cached
+        if self.pending >= self.max_pending:
+            return 503, {"error": f"{self.pending} allocations already pending"}
+        self.pending += 1
+        try:
+            if self.pool is None:
+                answer = self.service.allocation(request)
+            else:
+                answer = await asyncio.get_running_loop().run_in_executor(self.pool, _allocate, request)
+        finally:
+            self.pending -= 1
+        self.service.cache.put(key, answer)
+        return 200, answer
+
+    async def dispatch(self, method, target, body):
+        """Status and JSON payload of one request."""
+        route = target.split("?", 1)[0]
+        routes = {"/health": "GET", "/channels": "GET", "/scenario": "POST", "/allocate": "POST"}
+        if route not in routes:
+            return 404, {"error": f"no route {route}"}
+        if method != routes[route]:
+            return 405, {"error": f"{route} takes {routes[route]}"}
+        try:
+            if route == "/health":
+                return 200, self.service.health()
+            if route == "/channels":
+                s = self.service
+                return 200, {"weeks": s.weeks, "channels": [
+                    {"channel": c, "weekly_spend": float(spend), "execution_per_pound":
+                     None if np.isnan(ratio) else float(ratio)}
+                    for c, spend, ratio in zip(s.channels, s.spend, s.ratio)]}
+            request = json.loads(body or b"{}")
+            if route == "/scenario":
+                batch = request["scenarios"] if "scenarios" in request else [request]
+                return 200, {"scenarios": self.service.scenarios(batch)}
+            return await self._allocation(request)
+        except (ValueError, KeyError, TypeError) as exc:
+            return 400, {"error": f"{type(exc).__name__}: {exc}"}
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                start = time.perf_counter()
+                try:
+                    method, target, _ = line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    method = target = None
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                # A body left unread would be parsed as the next request, so close after it
+                keep_alive = headers.get("connection", "").lower() != "close" and 0 <= length <= self.max_body
+                if length < 0:
+                    status, payload = 400, {"error": "malformed Content-Length"}
+                elif length > self.max_body:
+                    status, payload = 413, {"error": f"body of {length} bytes exceeds {self.max_body}"}
+                else:
+                    body = await reader.readexactly(length)
+                    if method is None:
+                        status, payload = 400, {"error": "malformed request line"}
+                    else:
+                        status, payload = await self.dispatch(method, target, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                emit("serve", route=target, status=status, elapsed=time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(path, host="127.0.0.1", port=8765, unix_socket=None, workers=None, cache_size=1024,
+                max_pending=None):
+    """Load the artifacts in ``path`` and serve until cancelled."""
+    server = ScenarioServer(ScenarioService(path, cache_size), workers, max_pending)
+    listener = await server.start(host, port, unix_socket)
+    where = unix_socket or f"http://{host}:{port}"
+    print(f"serving {path} on {where}", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve scenario and allocation queries.")
+    parser.add_argument("artifacts", help="directory written by save_artifacts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="allocation worker processes")
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.artifacts, args.host, args.port, args.unix, args.workers, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
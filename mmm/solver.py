@@ -0,0 +1,250 @@
+"""Bounded least squares on Gram matrices.
+
+The model is an intercept plus linear coefficients where media
+coefficients are constrained to be >= 0 and the intercept and controls
+are free. Everything is solved from X'X and X'y with a Lawson-Hanson
+active-set method, so:
+
+- a trial that only changes which columns are selected slices a cached
+  Gram matrix instead of touching the (weeks x features) data again;
+- the passive set of a neighbouring trial is a warm start, which usually
+  leaves only a handful of active-set moves;
+- a batch of related designs is solved in one call with the Gram matrices
+  built by a single ``einsum``.
+"""
+
+import warnings
+
+import numpy as np
+
+
+def gram_system(X, y, intercept=True):
+    """
+    Normal-equation blocks of a design.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray, float: G = X'X, b = X'y and y'y, where X has
+    a leading column of ones when ``intercept`` is set.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if intercept:
+        X = np.column_stack([np.ones(len(X)), X])
+    return X.T @ X, X.T @ y, float(y @ y)
+
+
+def _solve_subset(G, b, idx, rcond=1e-10):
+    """
+    Solve the passive-set system, guarding against collinear columns.
+
+    ``G`` has a unit diagonal here, so the squared Cholesky pivot of a
+    column is the share of it not explained by the columns before it.
+    ``np.linalg.solve`` does not raise on a nearly singular subset and
+    returns huge cancelling coefficients; when a pivot falls below
+    ``rcond`` the minimum-norm least-squares solution is used instead.
+    """
+    G_sub = G[np.ix_(idx, idx)]
+    try:
+        L = np.linalg.cholesky(G_sub)
+    except np.linalg.LinAlgError:
+        L = None
+    if L is not None and np.diag(L).min() ** 2 > rcond * np.diag(L).max() ** 2:
+        return np.linalg.solve(L.T, np.linalg.solve(L, b[idx]))
+    # Duplicated, collinear or all-zero columns
+    return np.linalg.lstsq(G_sub, b[idx], rcond=rcond)[0]
+
+
+def nnls_gram(G, b, nonneg=None, passive=None, tol=1e-10, max_iter=None):
+    """
+    Minimize 0.5 x'Gx - b'x subject to x[nonneg] >= 0.
+
+    Parameters:
+    -----------
+    G, b : np.ndarray
+        Gram matrix (p, p) and moment vector (p,).
+    nonneg : array-like of bool, optional
+        Which coefficients are constrained; all of them by default, which
+        is ``scipy.optimize.nnls``.
+    passive : array-like of bool, optional
+        Warm start: constrained coefficients expected to be positive, e.g.
+        ``beta > 0`` of a neighbouring fit.
+    tol : float
+        Optimality tolerance on the scaled gradient.
+    max_iter : int, optional
+        Outer iterations; defaults to 3p. A ``RuntimeWarning`` is issued
+        when they run out before the optimality conditions hold.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: Coefficients and the final passive mask
+    (free coefficients plus positive constrained ones).
+    """
+    G = np.asarray(G, dtype=float)
+    b = np.asarray(b, dtype=float)
+    p = len(b)
+    nonneg = np.ones(p, dtype=bool) if nonneg is None else np.asarray(nonneg, dtype=bool)
+
+    # Work on unit-diagonal scaling; raw media and sales columns differ by orders of magnitude
+    d = np.sqrt(np.diag(G))
+    d[d == 0] = 1.0
+    G = G / np.outer(d, d)
+    b = b / d
+
+    P = ~nonneg
+    x = np.zeros(p)
+    if passive is not None:
+        # Warm start: shrink the guessed passive set until its solution is
+        # feasible, then continue the usual iterations from that point
+        P = P | (np.asarray(passive, dtype=bool) & nonneg)
+        while (P & nonneg).any():
+            idx = np.flatnonzero(P)
+            z = np.zeros(p)
+            z[idx] = _solve_subset(G, b, idx)
+            bad = P & nonneg & (z <= tol)
+            if not bad.any():
+                x = z
+                break
+            P &= ~bad
+    max_iter = max_iter or 3 * p
+
+    for _ in range(max_iter + 1):
+        # Inner loop: solve on the passive set, stepping back while a
+        # constrained coefficient would turn negative
+        while P.any():
+            idx = np.flatnonzero(P)
+            z = np.zeros(p)
+            z[idx] = _solve_subset(G, b, idx)
+            bad = P & nonneg & (z <= tol)
+            if not bad.any():
+                x = z
+                break
+            # Only coefficients moving towards zero limit the step; the
+            # others (x == z == 0) are dropped from the passive set below
+            moving = bad & (x - z > 0)
+            step = np.min(x[moving] / (x[moving] - z[moving]), initial=1.0)
+            x = x + step * (z - x)
+            P &= ~(nonneg & (x <= tol))
+            x[~P] = 0.0
+
+        w = b - G @ x
+        candidates = nonneg & ~P & (w > tol)
+        if not candidates.any():
+            break
+        P[np.flatnonzero(candidates)[np.argmax(w[candidates])]] = True
+    else:
+        warnings.warn(f"nnls_gram stopped after {max_iter} iterations without meeting tol={tol:g}; "
+                      "the coefficients may not be optimal", RuntimeWarning, stacklevel=2)
+
+    return x / d, P
+
+
+def fit_bounded(X, y, nonneg=None, intercept=True, passive=None):
+    """
+    Bounded least squares on a design matrix.
+
+    Parameters:
+    -----------
+    X : array-like
+        Features, shape (weeks, p), without intercept column.
+    nonneg : array-like of bool, optional
+        Which of the ``p`` features are constrained >= 0 (all by default).
+        The intercept is always free.
+    passive : array-like of bool, optional
+        Warm start over the ``p`` features, see ``nnls_gram``.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: Coefficients (intercept first when fitted)
+    and residuals.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    G, b, _ = gram_system(X, y, intercept)
+    nonneg = np.ones(X.shape[1], dtype=bool) if nonneg is None else np.asarray(nonneg, dtype=bool)
+    if intercept:
+        nonneg = np.r_[False, nonneg]
+        passive = None if passive is None else np.r_[True, passive]
+    beta, _ = nnls_gram(G, b, nonneg, passive)
+    fitted = X @ beta[1:] + beta[0] if intercept else X @ beta
+    return beta, y - fitted
+
+
+def fit_bounded_batch(Xs, ys, nonneg=None, intercept=True, warm_start=True):
+    """
+    Solve a batch of designs sharing one column layout in one call.
+
+    Parameters:
+    -----------
+    Xs : array-like
+        Designs, shape (batch, weeks, p), e.g. bootstrap resamples or
+        neighbouring trials.
+    ys : array-like
+        Targets, shape (batch, weeks) or (weeks,) when shared.
+    warm_start : bool
+        Seed every solve with the passive set of the previous one.
+
+    Returns:
+    --------
+    np.ndarray: Coefficients, shape (batch, p + intercept).
+    """
+    Xs = np.asarray(Xs, dtype=float)
+    ys = np.broadcast_to(np.asarray(ys, dtype=float), Xs.shape[:2])
+    if intercept:
+        Xs = np.concatenate([np.ones(Xs.shape[:2] + (1,)), Xs], axis=2)
+    Gs = np.einsum("bti,btj->bij", Xs, Xs)
+    bs = np.einsum("bti,bt->bi", Xs, ys)
+    return solve_gram_batch(Gs, bs, nonneg, intercept, warm_start)
+
+
+def solve_gram_batch(Gs, bs, nonneg=None, intercept=True, warm_start=True):
+    """``fit_bounded_batch`` on precomputed Gram matrices (batch, p, p) and moments (batch, p)."""
+    Gs = np.asarray(Gs, dtype=float)
+    bs = np.asarray(bs, dtype=float)
+    p = bs.shape[1] - int(intercept)
+    nonneg = np.ones(p, dtype=bool) if nonneg is None else np.asarray(nonneg, dtype=bool)
+    if intercept:
+        nonneg = np.r_[False, nonneg]
+    betas = np.empty(bs.shape)
+    passive = None
+    for i in range(len(bs)):
+        betas[i], P = nnls_gram(Gs[i], bs[i], nonneg, passive)
+        if warm_start:
+            passive = P
+    return betas
+
+
+class ConstrainedOLS:
+    """
+    OLS with non-negative execution coefficients.
+
+    Same layout as the notebook class: the first ``n_execution_vars``
+    columns of ``X`` are constrained >= 0, the intercept and remaining
+    columns are free. Solved once on the Gram matrix, without the
+    statsmodels fit that used to seed L-BFGS-B.
+    """
+
+    def __init__(self, n_execution_vars):
+        self.n_execution_vars = n_execution_vars
+        self.params = None
+        self.passive = None
+
+    def fit(self, X, y, warm_start=None):
+        """Fit; ``warm_start`` may be a previously fitted ``ConstrainedOLS``."""
+        nonneg = np.arange(np.shape(X)[1]) < self.n_execution_vars
+        passive = None
+        if warm_start is not None and warm_start.params is not None:
+            passive = np.asarray(warm_start.params)[1:] > 0
+        self.params, self.resid = fit_bounded(X, y, nonneg, passive=passive)
+        self.passive = self.params[1:] > 0
+        if hasattr(X, "columns"):
+            import pandas as pd
+
+            self.params = pd.Series(self.params, index=["const"] + list(X.columns))
+        return self
+
+    def predict(self, X):
+        if self.params is None:
+            raise ValueError("Model not fitted yet.")
+        params = np.asarray(self.params)
+        return np.asarray(X, dtype=float) @ params[1:] + params[0]
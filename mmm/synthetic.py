@@ -0,0 +1,105 @@
+"""Synthetic growth-driver extracts in the ``merged_data.csv`` layout.
+
+Used to benchmark and exercise the pipeline at sizes the real extract
+does not reach. Every (panel, week, channel) is one row; channels are
+active in a random subset of weeks, the KPIs respond to the media through
+geometric adstock and a Hill curve, and price and promotion act as
+controls. The whole table is generated with array operations, so
+millions of rows take a few seconds.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .adstock import geometric_adstock
+from .allocation import hill
+from .data import DATE_COL, LEVEL_COLS, TARGET
+
+PANEL_COL = "panel"
+METRICS = ["engagements", "impressions", "grps", "units"]
+ONLINE_PRICE = "UK L'Oreal Paris Haircare Online Average Price (in pound)"
+OFFLINE_PRICE = "UK L'Oreal Paris Haircare Offline Average Price (in pound)"
+PROMOTION = "UK L'Oreal Paris Haircare Total Weigheted Promotion Distribution (%)"
+OFFLINE_VALUE = "UK L'Oreal Paris Haircare Total Offline Sellout Value (in pound)"
+OFFLINE_UNITS = "UK L'Oreal Paris Haircare Total Offline Sellout Units"
+ONLINE_VALUE = "UK L'Oreal Paris Haircare Total Online Sellout Value (in pound)"
+
+
+def channel_levels(n_channels):
+    """L1..L5 labels of ``n_channels`` leaves, grouped like the real growth-driver tree."""
+    c = np.arange(n_channels)
+    return {
+        "growth_driver_l1": np.full(n_channels, "ap_consumer_facing", dtype=object),
+        LEVEL_COLS[0]: np.array([f"driver_{i}" for i in c // 12], dtype=object),
+        LEVEL_COLS[1]: np.array([f"category_{i}" for i in c // 6], dtype=object),
+        LEVEL_COLS[2]: np.array([f"platform_{i}" for i in c // 2], dtype=object),
+        LEVEL_COLS[3]: np.array([f"channel_{i:04d}" for i in c], dtype=object),
+    }
+
+
+def synthetic_long(n_weeks=104, n_channels=17, n_panels=1, start="2022-01-03", seed=None):
+    """
+    Long weekly extract with one row per (panel, week, channel).
+
+    Parameters:
+    -----------
+    n_weeks, n_channels, n_panels : int
+        Size of the extract; the real one is 104 weeks x 17 leaves x 1 panel.
+    start : str
+        First week start.
+    seed : int, optional
+
+    Returns:
+    --------
+    pd.DataFrame: Columns of ``merged_data.csv``, plus ``PANEL_COL`` when
+    ``n_panels > 1``. Rows are sorted by panel, week and channel.
+    """
+    rng = np.random.default_rng(seed)
+    P, W, C = n_panels, n_weeks, n_channels
+
+    # Media: flighted execution, a cost per unit, a response per channel and panel
+    active = rng.random((P, W, C)) < 0.6
+    level = rng.lognormal(10.0, 1.5, size=(P, 1, C))
+    execution = np.where(active, level * rng.lognormal(0.0, 0.5, size=(P, W, C)), 0.0)
+    investment = execution * rng.lognormal(-3.0, 1.0, size=(P, 1, C))
+    decay = rng.uniform(0.1, 0.8, size=(P, C))
+    adstock = geometric_adstock(execution.transpose(1, 0, 2), decay).transpose(1, 0, 2)
+    half = level / (1.0 - decay[:, None, :])
+    coef = rng.gamma(2.0, 2000.0, size=(P, 1, C)) * (rng.random((P, 1, C)) < 0.7)
+    media = (coef * hill(adstock, half, rng.uniform(0.8, 2.5, size=(P, 1, C)))).sum(axis=2)
+
+    # Weekly KPIs and controls, shared by the channels of a panel-week
+    t = np.arange(W)
+    season = np.sin(2 * np.pi * t / 52.18)
+    online_price = 3.2 + 0.15 * season + rng.normal(0.0, 0.1, size=(P, W))
+    offline_price = 2.4 + 0.1 * season + rng.normal(0.0, 0.05, size=(P, W))
+    promotion = np.clip(0.4 + rng.normal(0.0, 0.05, size=(P, W)), 0.0, 1.0)
+    base = rng.uniform(5e4, 2e5, size=(P, 1))
+    online_units = np.maximum(
+        base * (1 + 0.1 * season) + media - 2e4 * (online_price - 3.2) + 3e4 * promotion
+        + rng.normal(0.0, 0.03, size=(P, W)) * base, 0.0)
+    offline_units = np.maximum(
+        6 * base * (1 + 0.05 * season) - 8e4 * (offline_price - 2.4)
+        + rng.normal(0.0, 0.03, size=(P, W)) * 6 * base, 0.0)
+
+    weeks = pd.date_range(start, periods=W, freq="7D")
+    rows = P * W * C
+    p, w, c = np.unravel_index(np.arange(rows), (P, W, C))
+    kpi = lambda values: values[p, w]  # noqa: E731
+    df = pd.DataFrame({col: labels[c] for col, labels in channel_levels(C).items()})
+    df["metric"] = np.array(METRICS, dtype=object)[c % len(METRICS)]
+    df[DATE_COL] = weeks[w]
+    df["investment (in pound)"] = investment.ravel()
+    df["execution"] = execution.ravel()
+    df["Year_x"] = weeks.year[w]
+    df[OFFLINE_PRICE] = kpi(offline_price)
+    df[ONLINE_PRICE] = kpi(online_price)
+    df[PROMOTION] = kpi(promotion)
+    df["Year_y"] = df["Year_x"]
+    df[OFFLINE_VALUE] = kpi(offline_units * offline_price)
+    df[OFFLINE_UNITS] = kpi(offline_units)
+    df[ONLINE_VALUE] = kpi(online_units * online_price)
+    df[TARGET] = kpi(online_units)
+    if P > 1:
+        df.insert(0, PANEL_COL, np.array([f"panel_{i:04d}" for i in range(P)], dtype=object)[p])
+    return df
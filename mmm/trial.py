@@ -0,0 +1,159 @@
+"""One evaluation of the feature-selection and fitting pipeline.
+
+A trial takes the weekly dataset and one point of the
+lag_range / span / alpha / cor / imp / sel grid, and runs
+features -> correlation filter -> path-based selection -> bounded fit.
+"""
+
+import numpy as np
+
+from .correlation import CorrelationPruner
+from .data import TARGET
+from .diagnostics import adjusted_r2, durbin_watson, r2_score, vif
+from .features import build_features
+from .instrumentation import count, stage
+from .selection import forward_path
+from .solver import fit_bounded, nnls_gram
+from .validation import cross_validate
+
+PARAM_NAMES = ("lag_range", "span", "alpha", "cor", "imp", "sel")
+
+
+def correlation_filter(X, cor, pruner=None):
+    """
+    Drop the second feature of every pair whose |correlation| exceeds ``cor``.
+
+    Pass a ``CorrelationPruner`` already synced to ``X`` to reuse its
+    correlation matrix across thresholds.
+    """
+    if pruner is None:
+        return CorrelationPruner(X).prune(X, cor)
+    return X.drop(columns=pruner.to_drop(cor))
+
+
+def media_mask(columns):
+    """True for media (execution-derived) columns, whose coefficients must be >= 0."""
+    return np.array(["execution" in col for col in columns], dtype=bool)
+
+
+def fit_constrained(X, y, gram=None, passive=None):
+    """
+    Fit with a free intercept and controls and non-negative media coefficients.
+
+    Parameters:
+    -----------
+    X : pd.DataFrame
+        Selected features.
+    gram : tuple, optional
+        ``(G, b, position)`` of a superset design, see ``FeatureStore.gram``;
+        the fit then slices it instead of forming X'X again.
+    passive : array-like of bool, optional
+        Warm start, e.g. the columns with positive coefficients in a
+        neighbouring trial.
+
+    Returns:
+    --------
+    np.ndarray, np.ndarray: Coefficients (intercept first) and residuals.
+    """
+    nonneg = media_mask(X.columns)
+    y = np.asarray(y, dtype=float)
+    count("fit.refit")
+    if gram is None:
+        return fit_bounded(X, y, nonneg, passive=passive)
+    G, b, position = gram
+    idx = [0] + [position[col] for col in X.columns]
+    beta, _ = nnls_gram(
+        G[np.ix_(idx, idx)], b[idx], np.r_[False, nonneg],
+        None if passive is None else np.r_[True, passive],
+    )
+    return beta, y - X.to_numpy(dtype=float) @ beta[1:] - beta[0]
+
+
+def select_features(X, y, imp, sel, path=None):
+    """
+    Keep the first ``sel`` features of the forward-stepwise path whose
+    entry gain (R² added) is at least ``imp``.
+
+    Pass the ``SelectionPath`` of ``X`` to reuse it across ``imp`` / ``sel``.
+    """
+    if path is None:
+        path = forward_path(X, y, nonneg=media_mask(X.columns))
+    return X[path.select(sel, imp)]
+
+
+def evaluate_trial(df, params, store=None, warm_start=None, validation=None, target=TARGET):
+    """
+    Run one grid point end to end.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Weekly dataset indexed by date.
+    params : dict
+        Values for every name in ``PARAM_NAMES``.
+    store : FeatureStore, optional
+        Cache of transformed channel blocks for ``df``, shared by trials.
+    warm_start : collection of str, optional
+        Features with positive coefficients in a neighbouring trial.
+    validation : dict, optional
+        Fold layout for ``validation.cross_validate`` (e.g.
+        ``{"initial": 52, "horizon": 4}``); adds walk-forward cv_r2,
+        cv_rmse, cv_nrmse and cv_folds to the metrics. The correlation
+        filter and the selection are redone on every fold's training
+        weeks, so the cv metrics never use the weeks they score.
+    target : str
+        Column to model.
+
+    Returns:
+    --------
+    dict: ``status`` ("ok" or "skipped"), the selected ``features``, their
+    ``coefficients`` and the fit ``metrics`` (r2, adj_r2, dw, max_vif,
+    n_features).
+    """
+    X, y = build_features(df, params["lag_range"], params["span"], params["alpha"], target=target,
+                          store=store)
+    candidates = X
+    pruner = gram = None
+    with stage("correlation"):
+        if store is not None:
+            transform = (params["lag_range"], params["span"], params["alpha"])
+            pruner = store.pruner(X, *transform)
+            gram = store.gram(X, y, *transform)
+        X = correlation_filter(X, params["cor"], pruner)
+    if X.shape[1] == 0:
+        return {"status": "skipped", "reason": "no features left after correlation filter"}
+
+    with stage("selection"):
+        path = None
+        if store is not None:
+            path = store.selection_path(X, y, (*transform, params["cor"]), media_mask(X.columns))
+        X = select_features(X, y, params["imp"], params["sel"], path)
+    if X.shape[1] == 0:
+        return {"status": "skipped", "reason": "no features left after selection"}
+
+    with stage("fit"):
+        passive = None if warm_start is None else np.isin(X.columns, list(warm_start))
+        beta, residuals = fit_constrained(X, y, gram, passive)
+    with stage("diagnostics"):
+        r2 = r2_score(y, y - residuals)
+        n, p = X.shape
+        metrics = {
+            "r2": float(r2),
+            "adj_r2": float(adjusted_r2(r2, n, p)),
+            "dw": float(durbin_watson(residuals)),
+            "max_vif": float(np.nanmax(vif(X), initial=np.nan)),
+            "n_features": p,
+        }
+    if validation is not None:
+        def select(X_train, y_train):
+            kept = correlation_filter(X_train, params["cor"])
+            return select_features(kept, y_train, params["imp"], params["sel"]).columns
+
+        metrics.update(cross_validate(candidates, y, media_mask(candidates.columns), select=select,
+                                      **validation))
+    return {
+        "status": "ok",
+        "features": list(X.columns),
+        "coefficients": dict(zip(["Intercept"] + list(X.columns), map(float, beta))),
+        "metrics": metrics,
+    }
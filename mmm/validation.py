@@ -0,0 +1,144 @@
+"""Rolling-origin (walk-forward) validation of the bounded fit.
+
+Each fold trains on the weeks before an origin and predicts the next
+``horizon`` weeks; the origin then moves forward by ``step`` weeks. The
+normal equations are not rebuilt per fold: the rows of the weeks that
+enter the training window are added to X'X and X'y as a rank-k update
+(and the rows that leave a sliding window are subtracted), and every fold
+starts its active-set solve from the previous fold's passive set. All
+folds together cost about one pass over the data plus one small solve
+per fold.
+
+When the features themselves are chosen from the data, pass the choice as
+``select``: it is then redone on every fold's training weeks, so no fold
+sees the weeks it predicts, and each fold is fitted from scratch.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import r2_score
+from .instrumentation import count, staged
+from .solver import nnls_gram
+
+
+def rolling_origin(n_weeks, initial, horizon=4, step=None, window=None):
+    """
+    Fold boundaries of a walk-forward validation.
+
+    Parameters:
+    -----------
+    n_weeks : int
+    initial : int
+        Training weeks of the first fold.
+    horizon : int
+        Weeks predicted per fold.
+    step : int, optional
+        Weeks the origin advances per fold; defaults to ``horizon`` so
+        every week after the first origin is predicted exactly once.
+    window : int, optional
+        Sliding window length; expanding when None.
+
+    Returns:
+    --------
+    list of tuple: ``(train_start, origin, test_end)`` per fold.
+    """
+    step = step or horizon
+    folds = []
+    for origin in range(initial, n_weeks, step):
+        start = 0 if window is None else max(0, origin - window)
+        folds.append((start, origin, min(origin + horizon, n_weeks)))
+    return folds
+
+
+@staged("validation")
+def walk_forward(X, y, nonneg=None, intercept=True, initial=52, horizon=4, step=None, window=None,
+                 select=None):
+    """
+    Out-of-sample predictions over rolling origins.
+
+    Parameters:
+    -----------
+    X : pd.DataFrame or array-like
+        Features, shape (weeks, p), rows in time order.
+    y : array-like
+        Target.
+    nonneg : array-like of bool, optional
+        Features constrained >= 0 (all by default); the intercept is free.
+    initial, horizon, step, window :
+        Fold layout, see ``rolling_origin``.
+    select : callable, optional
+        ``select(X_train, y_train)`` returning the columns of ``X`` to fit
+        in that fold; all columns when None.
+
+    Returns:
+    --------
+    pd.DataFrame: One row per predicted week and fold, with ``origin``
+    (first predicted week), ``week``, ``actual`` and ``predicted``.
+    """
+    index = X.index if hasattr(X, "index") else pd.RangeIndex(len(X))
+    frame = X if hasattr(X, "columns") else pd.DataFrame(X, index=index)
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if intercept:
+        X = np.column_stack([np.ones(len(X)), X])
+    p = X.shape[1]
+    nonneg = np.ones(p - int(intercept), dtype=bool) if nonneg is None else np.asarray(nonneg, dtype=bool)
+    if intercept:
+        nonneg = np.r_[False, nonneg]
+
+    G, b = np.zeros((p, p)), np.zeros(p)
+    lo = hi = 0
+    passive = None
+    origins, weeks, predicted = [], [], []
+    for start, origin, end in rolling_origin(len(X), initial, horizon, step, window):
+        if select is not None:
+            # The selection changes per fold, so the fold is fitted from scratch
+            chosen = frame.columns.get_indexer(select(frame.iloc[start:origin], y[start:origin]))
+            idx = np.r_[0, chosen + 1] if intercept else chosen
+            A = X[start:origin, idx]
+            beta, _ = nnls_gram(A.T @ A, A.T @ y[start:origin], nonneg[idx])
+            count("validation.refit")
+            origins.append(np.full(end - origin, origin))
+            weeks.append(np.arange(origin, end))
+            predicted.append(X[origin:end, idx] @ beta)
+            continue
+        # Rank-k updates: add the weeks that entered, remove those that left
+        G += X[hi:origin].T @ X[hi:origin]
+        b += X[hi:origin].T @ y[hi:origin]
+        G -= X[lo:start].T @ X[lo:start]
+        b -= X[lo:start].T @ y[lo:start]
+        lo, hi = start, origin
+        beta, passive = nnls_gram(G, b, nonneg, passive)
+        count("validation.refit")
+        origins.append(np.full(end - origin, origin))
+        weeks.append(np.arange(origin, end))
+        predicted.append(X[origin:end] @ beta)
+    if not weeks:
+        raise ValueError(f"no fold: {initial} initial weeks leave nothing to predict")
+    origins, weeks = np.concatenate(origins), np.concatenate(weeks)
+    return pd.DataFrame({
+        "origin": index[origins],
+        "week": index[weeks],
+        "actual": y[weeks],
+        "predicted": np.concatenate(predicted),
+    })
+
+
+def cv_metrics(predictions):
+    """Out-of-sample R², RMSE and NRMSE (RMSE over the range of the actuals)."""
+    actual = predictions["actual"].to_numpy()
+    error = actual - predictions["predicted"].to_numpy()
+    rmse = float(np.sqrt(np.mean(error**2)))
+    spread = actual.max() - actual.min()
+    return {
+        "cv_r2": float(r2_score(actual, predictions["predicted"])),
+        "cv_rmse": rmse,
+        "cv_nrmse": float(rmse / spread) if spread > 0 else float("nan"),
+        "cv_folds": int(predictions["origin"].nunique()),
+    }
+
+
+def cross_validate(X, y, nonneg=None, intercept=True, select=None, **folds):
+    """``cv_metrics`` of ``walk_forward``; ``folds`` are its layout arguments."""
+    return cv_metrics(walk_forward(X, y, nonneg, intercept, select=select, **folds))
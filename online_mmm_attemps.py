@@ -7,25 +7,15 @@ Original file is located at
     https://colab.research.google.com/drive/1Iy4DIzokAuNSbamT7PEbXYe7wGML7WTG
 """
 
-!apt-get install graphviz -y
-!pip install pydot
-
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import holidays
-
-import networkx as nx
-import pydot
-from networkx.drawing.nx_pydot import graphviz_layout
-
-import statsmodels.api as sm
-from statsmodels.stats.stattools import durbin_watson
-from statsmodels.stats.outliers_influence import variance_inflation_factor
 
-from scipy.optimize import minimize
-from scipy.optimize import nnls
+from mmm import reporting
+from mmm.adstock import geometric_adstock
+from mmm.calendar_features import HolidayCalendar, calendar_features
+from mmm.diagnostics import drop_high_vif, vif
+from mmm.design_matrix import read_design, write_design
+from mmm.ingest import ingest_long
 
 """### Loading and preparing data"""
 
@@ -59,60 +49,10 @@ else:
 
 """### Data viz and extracting dataset for online"""
 
-# Extract unique relationships between growth driver levels
-edges = df[["growth_driver_l1", "growth_driver_l2", "growth_driver_l3", "growth_driver_l4", "growth_driver_l5"]].drop_duplicates()
-
-# Replace underscores with spaces for readability
-edges = edges.applymap(lambda x: x.replace("_", " ") if pd.notna(x) else x)
-
-# Initialize directed graph
-G = nx.DiGraph()
-
-# Add edges to the graph
-for _, row in edges.iterrows():
-    for i in range(4):  # Connecting L1 → L2 → L3 → L4 → L5
-        if pd.notna(row[i]) and pd.notna(row[i + 1]):
-            G.add_edge(row[i], row[i + 1])
-
-# Define improved colors for different levels
-level_colors = {
-    0: "#FFD700",  # Gold (L1)
-    1: "#FF6347",  # Tomato (L2)
-    2: "#4682B4",  # Steel Blue (L3)
-    3: "#32CD32",  # Lime Green (L4)
-    4: "#8A2BE2"   # Blue Violet (L5)
-}
-
-# Assign colors based on hierarchy depth
-node_colors = []
-for node in G.nodes():
-    depth = next((i for i, col in enumerate(["growth_driver_l1", "growth_driver_l2", "growth_driver_l3", "growth_driver_l4", "growth_driver_l5"]) if node in df[col].unique()), 0)
-    node_colors.append(level_colors.get(depth, "#A9A9A9"))  # Default to Dark Gray if unknown
-
-# Use graphviz layout for clearer spacing
-plt.figure(figsize=(15, 8))
-pos = graphviz_layout(G, prog="dot")  # "dot" ensures top-down tree structure
-
-# Draw the tree with larger spacing and adjusted label positioning
-nx.draw(
-    G, pos, with_labels=True, node_color=node_colors, node_size=3500,
-    edge_color="gray", font_size=10, font_weight="bold", arrows=True
-)
-
-# Rotate labels slightly to prevent overlap
-for label in pos:
-    x, y = pos[label]
-    plt.text(x, y, label, fontsize=9, ha='center', va='center', bbox=dict(facecolor='white', edgecolor='black', boxstyle='round,pad=0.3'))
-
-plt.title("Improved Growth Drivers Tree Structure", fontsize=14)
-plt.show()
-
-plt.figure(figsize=(10, 5))
-sns.boxplot(x=df["metric"], y=df["execution"])
-plt.yscale("log")
-plt.title("Distribution of 'execution' by metric type (log scale)")
-plt.xticks(rotation=45)
-plt.show()
+# Growth-driver tree (graphviz layout when available) and execution per metric
+reporting.growth_driver_tree(df)
+reporting.execution_by_metric(df)
+reporting.show()
 
 # Filter only rows related to Online Growth Drivers
 online_df = df.copy()
@@ -145,9 +85,6 @@ online_df = online_df.sort_values("Starting Week")
 # Check unique values in metric
 print("Unique Metrics in Online Data:", online_df["metric"].unique())
 
-# Save for later use
-online_df.to_csv("online_dataset.csv", index=False)
-
 online_df.info()
 
 # Count occurrences of each date
@@ -166,48 +103,13 @@ example_date = date_counts.iloc[0]["Starting Week"]  # First date with duplicate
 print(f"Entries for {example_date}:")
 display(online_df[online_df["Starting Week"] == example_date])
 
-# Drop Level 1 growth driver since it's constant
-online_df = online_df.drop(columns=["growth_driver_l1"], errors="ignore")
-
-# Create a unique identifier for each growth driver combination
-online_df["growth_driver_combination"] = (
-    online_df["growth_driver_l2"] + " | " +
-    online_df["growth_driver_l3"] + " | " +
-    online_df["growth_driver_l4"] + " | " +
-    online_df["growth_driver_l5"]
-)
-
-# Store metric mapping in a dictionary
-metric_mapping = online_df.groupby("growth_driver_combination")["metric"].unique().to_dict()
+# Stream the long file into a weeks x growth driver x (execution, investment)
+# panel; the L2-L5 hierarchy is kept as categorical codes, not strings
+panel = ingest_long(file_path, out="online_panel")
+final_df = panel.to_frame()
 
-# Identify the columns that remain constant for each date
-constant_columns = [
-    "UK L'Oreal Paris Haircare Online Average Price (in pound)",
-    "UK L'Oreal Paris Haircare Total Weigheted Promotion Distribution (%)",
-    "UK L'Oreal Paris Haircare Total Online Sellout Units"
-]
-
-# Keep only one unique row per date for these constant columns
-constant_data = online_df[["Starting Week", "Year"] + constant_columns].drop_duplicates()
-
-# Pivot execution & investment by growth driver combination
-pivot_df = online_df.pivot_table(
-    index=["Starting Week", "Year"],
-    columns="growth_driver_combination",
-    values=["execution", "investment (in pound)"],
-    aggfunc="sum",
-    fill_value=0
-)
-
-# Flatten MultiIndex column names
-pivot_df.columns = [f"{col[0]} - {col[1]}" for col in pivot_df.columns]
-pivot_df = pivot_df.reset_index()
-
-# Merge back the constant columns
-final_df = pd.merge(pivot_df, constant_data, on=["Starting Week", "Year"], how="left")
-
-# Save the cleaned dataset
-final_df.to_csv("online_dataset_cleaned.csv", index=False)
+# Save the cleaned dataset as a memory-mapped design file (typed, date-indexed)
+write_design("online_dataset.mmap", final_df.set_index("Starting Week"))
 
 final_df.info()
 
@@ -216,13 +118,7 @@ final_df.head()
 """### EDA of online data"""
 
 # Load the cleaned dataset
-df = pd.read_csv("online_dataset_cleaned.csv")
-
-# Convert date column to datetime
-df["Starting Week"] = pd.to_datetime(df["Starting Week"])
-
-# Set the figure style
-sns.set_style("whitegrid")
+df = read_design("online_dataset.mmap").reset_index()
 
 # ---------------- 1️⃣ BASIC OVERVIEW ----------------
 print("\n🔹 Dataset Overview:")
@@ -242,22 +138,11 @@ print("\n🔹 Summary Statistics (Numerical Variables):")
 print(df.describe())
 
 # ---------------- 3️⃣ TIME SERIES ANALYSIS ----------------
-plt.figure(figsize=(12,5))
-plt.plot(df["Starting Week"], df["UK L'Oreal Paris Haircare Total Online Sellout Units"], marker="o", linestyle="-", label="Online Sales")
-plt.xlabel("Date")
-plt.ylabel("Units Sold")
-plt.title("📈 Online Sales Over Time")
-plt.legend()
-plt.xticks(rotation=45)
-plt.show()
+reporting.sales_over_time(df)
 
 # ---------------- 4️⃣ CORRELATION ANALYSIS ----------------
 corr_matrix = df.corr()
-
-plt.figure(figsize=(12, 6))
-sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5)
-plt.title("🔗 Correlation Heatmap")
-plt.show()
+reporting.correlation_heatmap(corr_matrix)
 
 # ---------------- 5️⃣ DISTRIBUTIONS OF KEY VARIABLES ----------------
 numeric_cols = [
@@ -265,69 +150,36 @@ numeric_cols = [
     "UK L'Oreal Paris Haircare Total Weigheted Promotion Distribution (%)",
     "UK L'Oreal Paris Haircare Total Online Sellout Units"
 ]
-
-for col in numeric_cols:
-    plt.figure(figsize=(8,4))
-    sns.histplot(df[col], bins=30, kde=True)
-    plt.title(f"📊 Distribution of {col}")
-    plt.xlabel(col)
-    plt.show()
+reporting.distributions(df, numeric_cols)
 
 # ---------------- 6️⃣ GROWTH DRIVER IMPACT ANALYSIS ----------------
 # Find all execution & investment columns
 execution_cols = [col for col in df.columns if "execution" in col]
 investment_cols = [col for col in df.columns if "investment" in col]
 
-# Plot execution vs sales
-plt.figure(figsize=(12,5))
-for col in execution_cols[:5]:  # Limit to first 5 to avoid clutter
-    plt.plot(df["Starting Week"], df[col], linestyle="--", alpha=0.7, label=col)
-
-plt.plot(df["Starting Week"], df["UK L'Oreal Paris Haircare Total Online Sellout Units"], color="black", linewidth=2, label="Online Sales")
-plt.xlabel("Date")
-plt.ylabel("Execution Volume")
-plt.title("📊 Execution Impact Over Time")
-plt.legend()
-plt.xticks(rotation=45)
-plt.show()
-
-# Plot investment vs sales
-plt.figure(figsize=(12,5))
-for col in investment_cols[:5]:  # Limit to first 5
-    plt.plot(df["Starting Week"], df[col], linestyle="--", alpha=0.7, label=col)
-
-plt.plot(df["Starting Week"], df["UK L'Oreal Paris Haircare Total Online Sellout Units"], color="black", linewidth=2, label="Online Sales")
-plt.xlabel("Date")
-plt.ylabel("Investment (£)")
-plt.title("💰 Investment Impact Over Time")
-plt.legend()
-plt.xticks(rotation=45)
-plt.show()
+# Execution and investment vs sales, first 5 columns to avoid clutter
+reporting.impact_over_time(df, execution_cols[:5])
+reporting.impact_over_time(df, investment_cols[:5], ylabel="Investment (£)",
+                           title="💰 Investment Impact Over Time")
+reporting.show()
 
 print("✅ Full EDA Completed!")
 
 """### Feature eng"""
 
-# Load dataset
-df = pd.read_csv("online_dataset_cleaned.csv")
-
-# Convert date column to datetime
-df["Starting Week"] = pd.to_datetime(df["Starting Week"])
+# Load dataset (indexed by Starting Week)
+df = read_design("online_dataset.mmap")
 
 # Drop investment columns (we'll use them later for ROI)
 df = df.drop(columns=[col for col in df.columns if "investment" in col])
 
-# Set date as index
-df = df.set_index("Starting Week")
-
 # ---------------- 1️⃣ TIME-BASED FEATURES ----------------
-df["Year"] = df.index.year
-df["Month"] = df.index.month
-df["Week"] = df.index.isocalendar().week
+calendar = calendar_features(df.index, fourier_order=0)
+df[["Year", "Month", "Week"]] = calendar[["Year", "Month", "Week"]]
 
-# UK Holidays (binary feature)
-uk_holidays = holidays.country_holidays('GB')
-df["Is_Holiday"] = df.index.to_series().apply(lambda x: 1 if x in uk_holidays else 0)
+# UK Holidays (binary feature: any bank holiday during the week)
+uk_holidays = HolidayCalendar(["GB"], years=range(df.index.year.min(), df.index.year.max() + 2))
+df["Is_Holiday"] = (uk_holidays.counts(df.index)[:, 0] > 0).astype(int)
 
 # ---------------- 2️⃣ LAGS (PAST WEEKS EFFECT) ----------------
 lag_features = [col for col in df.columns if "execution" in col]
@@ -344,15 +196,10 @@ for col in lag_features:
     df[f"{col}_saturation"] = np.log1p(df[col])  # log transformation for diminishing returns
 
 # ---------------- 5️⃣ ADSTOCK (CARRYOVER EFFECT) ----------------
-def adstock(series, alpha=0.7):
-    """Apply Adstock transformation with decay factor alpha."""
-    result = np.zeros(len(series))
-    for i in range(1, len(series)):
-        result[i] = series.iloc[i] + alpha * result[i - 1]
-    return result
-
-for col in lag_features:
-    df[f"{col}_adstock"] = adstock(df[col])
+# All channels in one batched pass (weeks x channels)
+adstocked = geometric_adstock(df[lag_features].to_numpy(dtype=float), alpha=0.7)
+for i, col in enumerate(lag_features):
+    df[f"{col}_adstock"] = adstocked[:, i]
 
 # ---------------- 6️⃣ FINAL TARGET & FEATURES ----------------
 # Define target variable
@@ -369,65 +216,44 @@ X.head()
 
 X.info()
 
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.feature_selection import RFE
-from sklearn.linear_model import LinearRegression
+from mmm.selection import forward_path
+from mmm.trial import correlation_filter, media_mask
 
 
 # ---------------- 1️⃣ REMOVE HIGHLY CORRELATED FEATURES ----------------
-corr_matrix = X.corr().abs()
+# Greedy pass over the upper triangle of one correlation matrix: the second
+# feature of every pair above 0.9 whose two features are both still kept
+X_filtered = correlation_filter(X, 0.9)
+print(f"✅ Dropped {X.shape[1] - X_filtered.shape[1]} highly correlated features.")
 
-# Find features that are highly correlated
-high_corr_pairs = np.where(corr_matrix > 0.9)
-high_corr_pairs = [(corr_matrix.index[i], corr_matrix.columns[j])
-                   for i, j in zip(*high_corr_pairs) if i != j]
-
-# Drop one feature from each correlated pair
-features_to_drop = set()
-for f1, f2 in high_corr_pairs:
-    if f1 not in features_to_drop and f2 not in features_to_drop:
-        features_to_drop.add(f2)  # Arbitrarily drop the second feature
-
-X_filtered = X.drop(columns=features_to_drop)
-print(f"✅ Dropped {len(features_to_drop)} highly correlated features.")
-
-# ---------------- 2️⃣ FEATURE IMPORTANCE (RANDOM FOREST) ----------------
-rf = RandomForestRegressor(n_estimators=100, random_state=42)
-rf.fit(X_filtered, y.values.ravel())  # Train Random Forest
-
-# Get feature importances
-feature_importance = pd.Series(rf.feature_importances_, index=X_filtered.columns)
-feature_importance = feature_importance.sort_values(ascending=False)
+# ---------------- 2️⃣ FORWARD-STEPWISE PATH ----------------
+# One pass ranks every feature; each entry gain (R² added) plays the role
+# of the importance score, media features may only enter with a positive effect
+path = forward_path(X_filtered, y, nonneg=media_mask(X_filtered.columns))
+feature_importance = pd.Series(path.gains, index=path.order)
 
 # Plot top 20 most important features
-plt.figure(figsize=(10,6))
-sns.barplot(x=feature_importance[:20], y=feature_importance.index[:20])
-plt.title("Top 20 Feature Importances (Random Forest)")
-plt.xlabel("Importance Score")
-plt.ylabel("Feature")
-plt.show()
-
-# Drop features with very low importance (< threshold)
-low_importance_features = feature_importance[feature_importance < 0.01].index
-X_filtered = X_filtered.drop(columns=low_importance_features)
-print(f"✅ Dropped {len(low_importance_features)} low-importance features.")
-
-# ---------------- 3️⃣ RECURSIVE FEATURE ELIMINATION (RFE) ----------------
-rfe = RFE(estimator=LinearRegression(), n_features_to_select=20)  # Keep top 20 features
-rfe.fit(X_filtered, y.values.ravel())
-
-# Select only the best features
-selected_features = X_filtered.columns[rfe.support_]
+reporting.feature_importance(feature_importance)
+reporting.show()
+
+# ---------------- 3️⃣ SELECTION ----------------
+# Drop features with very low gain (< threshold), keep the first 20 of the path
+selected_features = path.select(sel=20, imp=0.01)
 X_final = X_filtered[selected_features]
 
-print(f"✅ Selected {len(selected_features)} best features with RFE.")
+print(f"✅ Selected {len(selected_features)} best features along the path.")
 
 # Save final dataset
-X_final.to_csv("X_features_selected.csv")
-print("✅ Feature selection complete. Final dataset saved as 'X_features_selected.csv'.")
+write_design("X_features_selected.mmap", X_final)
+print("✅ Feature selection complete. Final dataset saved as 'X_features_selected.mmap'.")
 
 """### Training"""
 
+# statsmodels / SciPy are only needed for the OLS and NNLS comparisons below
+import statsmodels.api as sm
+from statsmodels.stats.stattools import durbin_watson
+from scipy.optimize import nnls
+
 y.info()
 
 X_final.info()
@@ -460,7 +286,7 @@ dw_ols = durbin_watson(ols_model.resid)
 # Variance Inflation Factor (Multicollinearity Check)
 vif_data = pd.DataFrame()
 vif_data["Feature"] = X.columns
-vif_data["VIF"] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+vif_data["VIF"] = vif(X)
 
 # ---------------- 3️⃣ Print Results ----------------
 print("\n🔹 OLS Regression Results:")
@@ -476,11 +302,12 @@ print(ols_model.summary())
 # Compute VIF
 vif_data = pd.DataFrame()
 vif_data["Feature"] = X.columns
-vif_data["VIF"] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+vif_data["VIF"] = vif(X)
 
-# Drop highly collinear features
-high_vif_features = vif_data[vif_data["VIF"] > 10]["Feature"].tolist()
-X = X.drop(columns=high_vif_features)
+# Drop the max-VIF feature until every VIF is below 10
+kept_features, dropped_vif = drop_high_vif(X, threshold=10)
+high_vif_features = [feature for feature, _ in dropped_vif]
+X = X[kept_features]
 
 print(f"\n✅ Dropped {len(high_vif_features)} multicollinear features")
 print(vif_data)
@@ -501,7 +328,7 @@ dw_ols = durbin_watson(ols_model.resid)
 # Variance Inflation Factor (Multicollinearity Check)
 vif_data = pd.DataFrame()
 vif_data["Feature"] = X.columns
-vif_data["VIF"] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+vif_data["VIF"] = vif(X)
 
 # ---------------- 3️⃣ Print Results ----------------
 print("\n🔹 OLS Regression Results:")
@@ -539,7 +366,7 @@ dw_ols = durbin_watson(ols_model.resid)
 # Variance Inflation Factor (Multicollinearity Check)
 vif_data = pd.DataFrame()
 vif_data["Feature"] = X.columns
-vif_data["VIF"] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+vif_data["VIF"] = vif(X)
 
 # ---------------- 3️⃣ Print Results ----------------
 print("\n🔹 OLS Regression Results:")
@@ -578,7 +405,7 @@ dw_nnls = durbin_watson(residuals)
 # Variance Inflation Factor (Multicollinearity Check)
 vif_data = pd.DataFrame()
 vif_data["Feature"] = X.columns
-vif_data["VIF"] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+vif_data["VIF"] = vif(X)
 
 # ---------------- 3️⃣ Print Results ----------------
 print("\n🔹 OLS Regression Results with Non-Negative Coefficients:")
@@ -593,150 +420,159 @@ print("\n🔹 Model Coefficients:")
 coef_df = pd.DataFrame({"Feature": ["Intercept"] + list(X.columns), "Coefficient": beta_nnls})
 print(coef_df)
 
-"""Fully optimized attempt in terms of R2 - too much loss of durbin watson"""
-
-lags = [6]
-spans = [6]
-alphas = [0.3]
-cors = [0.97]
-imps = [0.003]
-sels = [35]
-
-best_r2 = 0
-best_lag_range = 0
-best_sp = 0
-best_alph = 0
-best_cor = 0
-best_imp = 0
-best_sel = 0
-
-n=0
-
+# ---------------- 4️⃣ Block-Bootstrap Confidence Intervals ----------------
+from mmm.bootstrap import interval_table, moving_block_bootstrap
+from mmm.decomposition import Decomposition
+
+# Workers memory-map this file instead of receiving a copy of X
+write_design("X_nnls.mmap", X.assign(**{y.name: y}))
+boot = moving_block_bootstrap("X_nnls.mmap", list(X.columns), target=y.name, n_boot=2000,
+                              block=8, nonneg=np.ones(X.shape[1], dtype=bool), seed=0)
+
+print("\n🔹 Bootstrap 90% intervals (coefficients):")
+print(boot.summary("coefficients"))
+print("\n🔹 Bootstrap 90% intervals (total contributions):")
+print(boot.summary("contributions"))
+
+# Channel ROI: the lag / decay / saturation / adstock terms of a channel are
+# summed before dividing by its investment. The calendar and lagged-sales
+# controls are not in the weekly dataset, so they are joined back for the
+# weeks the model was fitted on.
+weekly = read_design("online_dataset.mmap")
+controls = [col for col in X.columns if col not in weekly.columns and "execution" not in col]
+weekly = weekly.join(X[controls]).fillna({col: 0.0 for col in controls})
+decomposition = Decomposition(weekly, list(X.columns), {"lag_range": 5, "span": 4, "alpha": 0.7},
+                              weeks=X.index)
+roi_draws = decomposition.roi(boot.draws)["roi"][:, 0]
+roi_point = decomposition.roi(boot.point)["roi"][0]
+print("\n🔹 Bootstrap 90% intervals (ROI, units per £ of channel investment):")
+print(interval_table(roi_draws, roi_point, decomposition.channels))
 
-# Load dataset
-df = pd.read_csv("online_dataset_cleaned.csv")
-
-# Convert date column to datetime
-df["Starting Week"] = pd.to_datetime(df["Starting Week"])
-df = df.set_index("Starting Week")
-
-# LAG, DECAY, ADSTOCK
-lag_features = [col for col in df.columns if "execution" in col]
-for col in lag_features:
-    for lag in range(1, lag_range):
-        df[f"{col}_lag{lag}"] = df[col].shift(lag)
-
-    df[f"{col}_decay"] = df[col].ewm(span=sp, adjust=False).mean()
-    df[f"{col}_saturation"] = np.log1p(df[col])
-
-def adstock(series, alpha=alph):
-    result = np.zeros(len(series))
-    for i in range(1, len(series)):
-        result[i] = series.iloc[i] + alpha * result[i - 1]
-    return result
-
-for col in lag_features:
-    df[f"{col}_adstock"] = adstock(df[col])
-
-# Define target variable
-y = df["UK L'Oreal Paris Haircare Total Online Sellout Units"]
-X = df.drop(columns=["UK L'Oreal Paris Haircare Total Online Sellout Units"])
-X = X.dropna()
-y = y.loc[X.index]
-
-# Correlation Filtering
-corr_matrix = X.corr().abs()
-high_corr_pairs = np.where(corr_matrix > cor)
-high_corr_pairs = [(corr_matrix.index[i], corr_matrix.columns[j])
-                  for i, j in zip(*high_corr_pairs) if i != j]
-
-features_to_drop = set()
-for f1, f2 in high_corr_pairs:
-    if f1 not in features_to_drop and f2 not in features_to_drop:
-        features_to_drop.add(f2)
-
-X_filtered = X.drop(columns=features_to_drop)
-
-# print(f"✅ Dropped {len(features_to_drop)} highly correlated features.")
-# print(f"Remaining features after correlation filter: {X_filtered.shape[1]}")
-
-if X_filtered.shape[1] == 0:
-    print("❌ No features left after correlation filtering! Skipping iteration...")
-    continue
-
-# Feature Importance Filtering
-rf = RandomForestRegressor(n_estimators=100, random_state=42)
-rf.fit(X_filtered, y.values.ravel())
-
-feature_importance = pd.Series(rf.feature_importances_, index=X_filtered.columns)
-low_importance_features = feature_importance[feature_importance < imp].index
-X_filtered = X_filtered.drop(columns=low_importance_features)
-
-# print(f"✅ Dropped {len(low_importance_features)} low-importance features.")
-# print(f"Remaining features after importance filter: {X_filtered.shape[1]}")
-
-if X_filtered.shape[1] == 0:
-    print("❌ No features left after importance filtering! Skipping iteration...")
-    continue
-
-# RFE Selection
-rfe = RFE(estimator=LinearRegression(), n_features_to_select=min(sel, X_filtered.shape[1]))
-rfe.fit(X_filtered, y.values.ravel())
-
-selected_features = X_filtered.columns[rfe.support_]
-X_final = X_filtered[selected_features]
-
-# print(f"✅ Selected {len(selected_features)} best features with RFE.")
-# print(f"Remaining features after RFE: {X_final.shape[1]}")
-
-if X_final.shape[1] == 0:
-    print("❌ No features left after RFE! Skipping iteration...")
-    continue
-
-# Check if X is empty before proceeding
-if X_final.shape[1] == 0:
-    print("❌ No features left! Skipping iteration...")
-    continue
-
-# Compute VIF only if there are features left
-vif_data = pd.DataFrame()
-vif_data["Feature"] = X_final.columns
-if X_final.shape[1] > 0:
-    vif_data["VIF"] = [variance_inflation_factor(X_final.values, i) for i in range(X_final.shape[1])]
-else:
-    print("❌ No features left after VIF filtering! Skipping iteration...")
-    continue
-
-# Fit OLS Model
-X_ols = sm.add_constant(X_final)
-beta_nnls, _ = nnls(X_ols, y)
-y_pred = X_ols @ beta_nnls
-residuals = y - y_pred
-
-r2_nnls = 1 - (np.sum(residuals**2) / np.sum((y - np.mean(y))**2))
-
-if r2_nnls > best_r2:
-    best_r2 = r2_nnls
-    best_lag_range = lag_range
-    best_sp = sp
-    best_alph = alph
-    best_cor = cor
-    best_imp = imp
-    best_sel = sel
-
-n+=1
-
-if n % 100 == 0:
-  print(n)
+"""Fully optimized attempt in terms of R2 - too much loss of durbin watson"""
 
-print("\n🔹 OLS Regression Results with Non-Negative Coefficients:")
-print(f"R² Score (Full Dataset): {r2_nnls:.4f}")
-print(f"Adjusted R² Score: {adj_r2_nnls:.4f}")
-print(f"Durbin-Watson: {dw_nnls:.4f}")
+from mmm.search import run_search
+
+# Grid of transform and selection parameters; every finished trial is
+# appended to the trial store, so re-running resumes instead of restarting
+grid = {
+    "lag_range": [6],
+    "span": [6],
+    "alpha": [0.3],
+    "cor": [0.97],
+    "imp": [0.003],
+    "sel": [35],
+}
 
-print("\n🔹 Variance Inflation Factor (VIF):")
-print(vif_data)
+best = run_search(
+    "online_dataset.mmap",
+    grid,
+    store="search_trials.jsonl",
+    cache_dir="feature_cache",
+    sampling="full",
+    # Rank trials on walk-forward error: one year of training weeks, then 4-week folds
+    validation={"initial": 52, "horizon": 4},
+    objective="cv_nrmse",
+    maximize=False,
+)
 
-print("\n🔹 Model Coefficients:")
-coef_df = pd.DataFrame({"Feature": ["Intercept"] + list(X.columns), "Coefficient": beta_nnls})
-print(coef_df)
\ No newline at end of file
+print("\n🔹 Best trial (NNLS):")
+print(best["params"])
+print(f"Walk-forward R²: {best['metrics']['cv_r2']:.4f}")
+print(f"Walk-forward NRMSE: {best['metrics']['cv_nrmse']:.4f}")
+print(f"R² Score (Full Dataset): {best['metrics']['r2']:.4f}")
+print(f"Adjusted R² Score: {best['metrics']['adj_r2']:.4f}")
+print(f"Durbin-Watson: {best['metrics']['dw']:.4f}")
+print(f"Max VIF: {best['metrics']['max_vif']:.2f}")
+print(best["features"])
+
+"""### Contributions and ROI"""
+
+from mmm.decomposition import Decomposition
+
+# The investment columns set aside above; carry-over is credited to the week the media ran
+decomposition, beta = Decomposition.from_record(read_design("online_dataset.mmap"), best)
+print("\n🔹 Contribution per channel (spend week):")
+print(decomposition.contribution_frame(beta, by="spend").sum().sort_values(ascending=False))
+print("\n🔹 ROI, marginal ROI and cost per incremental unit per year:")
+print(decomposition.summary(beta, periods="Y"))
+
+from mmm.hierarchy import Hierarchy
+
+# Built once from the level columns; every level is one sparse matmul away
+hierarchy = Hierarchy.from_long(file_path)
+totals = decomposition.summary(beta).set_index("channel")
+print("\n🔹 ROI per L3 growth driver:")
+print(hierarchy.rollup_ratio(totals["contribution"], totals["spend"], "growth_driver_l3"))
+
+"""### Weekly refresh"""
+
+from mmm.online import OnlineMMM, refresh
+
+# Fit once on the history, then every new week only updates the
+# checkpointed adstock carry-over and recursive least-squares state
+weekly = read_design("online_dataset.mmap")
+channels = [col for col in weekly.columns if "execution" in col]
+OnlineMMM(channels, decay=0.3, forgetting=0.99).fit(weekly.iloc[:-4]).save("online_model.npz")
+
+one_step = refresh("online_model.npz", weekly)
+print("\n🔹 One-step-ahead predictions of the last 4 weeks:")
+print(one_step)
+
+"""### Joint nonlinear fit"""
+
+from mmm.nonlinear import fit_nonlinear
+
+# Decay, Hill alpha / beta and the coefficients in one bounded solve with
+# the exact Jacobian, instead of a grid over fixed transforms
+nonlinear = fit_nonlinear(weekly, n_starts=4, seed=0)
+print("\n🔹 Joint nonlinear fit:")
+print(nonlinear.metrics)
+print(nonlinear.params)
+
+"""### Evolutionary hyperparameter search"""
+
+from mmm.evolution import evolve
+
+# Robyn-style trade-off between fit (NRMSE) and decomposition plausibility
+# (DECOMP.RSSD), every generation evaluated as one batched computation
+pareto = evolve(read_design("online_dataset.mmap"), population=200, generations=100, seed=0,
+                verbose=True)
+print(f"\n🔹 Pareto front ({pareto.evaluations_per_second:.0f} candidates/s):")
+print(pareto.front.head(10))
+print(pareto.params(pareto.front.index[0]))
+
+"""### Time-series baselines"""
+
+from mmm.baseline import baseline_search, sarima_grid, var_grid
+
+# The full SARIMA order grid and VAR lags on a process pool, nested orders
+# warm-started from each other, ranked on walk-forward RMSE then AIC
+target = weekly["UK L'Oreal Paris Haircare Total Online Sellout Units"]
+baselines = baseline_search(
+    target,
+    sarima_grid(p=(0, 1, 2), d=(0, 1), q=(0, 1, 2), P=(0, 1), D=(0, 1), Q=(0, 1), s=52)
+    + var_grid(lags=(1, 2, 3, 4, 5), d=(0, 1)),
+    var_data=pd.concat([target, weekly[channels[:5]]], axis=1),
+    timeout=60,
+)
+print("\n🔹 Best baselines:")
+print(baselines.drop(columns="params").head(10))
+
+"""### Scenario serving"""
+
+from mmm.allocation import spend_ratios
+from mmm.hierarchy import leaf_of
+from mmm.data import ONLINE_CONTROLS
+from mmm.serve import baseline_plan, save_artifacts
+
+# Model state, steady-state curves, hierarchy and the baseline plan are
+# written once; `python -m mmm.serve mmm_artifacts` then answers what-if
+# queries such as moving spend between growth drivers over a quarter
+ratios = spend_ratios(panel)[[leaf_of(c) for c in nonlinear.channels]].to_numpy()
+save_artifacts(
+    "mmm_artifacts",
+    OnlineMMM(channels, decay=0.3, forgetting=0.99).fit(weekly),
+    baseline_plan(weekly, channels, ONLINE_CONTROLS),
+    curves=nonlinear.response_curves(ratios),
+    hierarchy=hierarchy,
+)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+from mmm.allocation import ResponseCurves, allocate
+
+
+def _slsqp(curves, budget, upper, lower=None, starts=10, seed=0):
+    """Best of multi-start SLSQP, the reference optimum."""
+    rng = np.random.default_rng(seed)
+    n = len(curves.channels)
+    lower = np.zeros(n) if lower is None else lower
+    best = -np.inf
+    for _ in range(starts):
+        x0 = np.clip(lower + rng.dirichlet(np.ones(n)) * (budget - lower.sum()), lower, upper)
+        res = minimize(lambda x: -curves.total(x), x0, method="SLSQP", bounds=list(zip(lower, upper)),
+                       constraints=[{"type": "eq", "fun": lambda x: x.sum() - budget}],
+                       options={"ftol": 1e-12, "maxiter": 500})
+        if abs(res.x.sum() - budget) < 1e-6 * budget and (res.x >= lower - 1e-6).all() and (res.x <= upper + 1e-6).all():
+            best = max(best, -res.fun)
+    return best
+
+
+def test_partial_convex_channel_matches_brute_force():
+    # The optimum leaves the first channel part-way up its convex branch
+    curves = ResponseCurves(["a", "b"], [59.93, 56.23], [11501.9, 4492.9], [1.408, 3.767])
+    budget, upper = 9139.2, np.array([2521.2, 8924.8])
+    spend, _ = allocate(curves, budget, upper=upper)
+    a = np.linspace(budget - upper[1], upper[0], 200001)
+    brute = curves.total(np.stack([a, budget - a], axis=-1)).max()
+    assert spend.sum() == pytest.approx(budget, rel=1e-9)
+    assert spend[0] < curves.inflection()[0]
+    assert curves.total(spend) >= brute * (1 - 1e-9)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_matches_slsqp_with_binding_upper_bounds(seed):
+    rng = np.random.default_rng(seed)
+    n = 4
+    curves = ResponseCurves(list("abcd"), rng.uniform(50, 200, n), rng.uniform(1e3, 2e4, n), rng.uniform(1.2, 4, n))
+    budget = rng.uniform(5e3, 3e4)
+    upper = rng.uniform(0.2, 0.6, n) * budget
+    upper *= max(1.0, 1.1 * budget / upper.sum())
+    spend, _ = allocate(curves, budget, upper=upper)
+    assert spend.sum() == pytest.approx(budget, rel=1e-9)
+    assert (spend <= upper * (1 + 1e-12)).all()
+    assert curves.total(spend) >= _slsqp(curves, budget, upper) * (1 - 1e-7)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("slack", [1.001, 1.03, 1.5])
+def test_matches_slsqp_with_ratios_lower_and_nearly_binding_caps(seed, slack):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(2, 7)
+    curves = ResponseCurves(list("abcdef")[:n], rng.uniform(50, 200, n), rng.uniform(1e3, 2e4, n),
+                            rng.uniform(0.6, 4, n), rng.lognormal(0, 1, n))
+    budget = rng.uniform(5e3, 3e4)
+    lower = np.where(rng.random(n) < 0.5, rng.uniform(0, 0.15, n) * budget, 0.0)
+    upper = rng.uniform(0.2, 1.0, n) * budget
+    # Caps leave only ``slack - 1`` of the budget above lower to spare
+    upper = lower + (upper - lower) * (budget - lower.sum()) * slack / (upper - lower).sum()
+    spend, _ = allocate(curves, budget, lower=lower, upper=upper)
+    assert spend.sum() == pytest.approx(budget, rel=1e-9)
+    assert (spend >= lower * (1 - 1e-12)).all() and (spend <= upper * (1 + 1e-12)).all()
+    assert curves.total(spend) >= _slsqp(curves, budget, upper, lower, starts=15) * (1 - 1e-7)
+
+
+def test_batch_matches_single_allocations():
+    rng = np.random.default_rng(7)
+    n = 6
+    curves = ResponseCurves(list("abcdef"), rng.uniform(50, 200, n), rng.uniform(1e3, 2e4, n), rng.uniform(1.2, 4, n))
+    budgets = np.array([1e4, 4e4, 1e5])
+    spend, lam = allocate(curves, budgets)
+    assert spend.shape == (3, n) and lam.shape == (3,)
+    for b, row in zip(budgets, spend):
+        single, _ = allocate(curves, b)
+        assert curves.total(row) == pytest.approx(curves.total(single), rel=1e-9)
+
+
+def test_bounds_that_cannot_spend_the_budget_raise():
+    curves = ResponseCurves(["a", "b"], [1.0, 1.0], [1.0, 1.0], [2.0, 2.0])
+    with pytest.raises(ValueError):
+        allocate(curves, 10.0, upper=[3.0, 4.0])
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from mmm.batch import panel_blocks, panel_frame, run_batch
+from mmm.data import ONLINE_CONTROLS, TARGET
+from mmm.feature_store import FeatureStore
+from mmm.features import feature_layout
+from mmm.ingest import ingest_panels
+from mmm.synthetic import PANEL_COL, synthetic_long
+from mmm.trial import evaluate_trial
+
+PARAMS = {"lag_range": 3, "span": 4, "alpha": 0.5, "cor": 0.95, "imp": 0.0, "sel": 6}
+
+
+def _panels(tmp_path):
+    long = synthetic_long(n_weeks=40, n_channels=5, n_panels=3, seed=1)
+    path = tmp_path / "long.csv"
+    long.to_csv(path, index=False)
+    return ingest_panels(str(path), [PANEL_COL])
+
+
+def test_panel_blocks_match_per_panel_transforms(tmp_path):
+    frames = [panel_frame(panel, TARGET) for panel in _panels(tmp_path).values()]
+    blocks = panel_blocks(frames, PARAMS["lag_range"], PARAMS["span"], PARAMS["alpha"])
+    for df, cached in zip(frames, blocks):
+        store = FeatureStore(df)
+        assert len(cached) == len(feature_layout(store.media, PARAMS["lag_range"], PARAMS["span"],
+                                                 PARAMS["alpha"]))
+        for (channel, transform, param), column in cached.items():
+            np.testing.assert_array_equal(column, store.block(channel, transform, param))
+
+
+def test_run_batch_matches_independent_trials(tmp_path):
+    panels = _panels(tmp_path)
+    table, metrics = run_batch(panels, PARAMS, panel_cols=[PANEL_COL], n_jobs=1, verbose=False)
+    assert (metrics["status"] == "ok").all()
+    for (key,), panel in panels.items():
+        expected = evaluate_trial(panel_frame(panel, TARGET, ONLINE_CONTROLS), PARAMS)
+        rows = table[table[PANEL_COL] == key]
+        coefficients = pd.Series(expected["coefficients"])
+        np.testing.assert_allclose(rows.set_index("feature")["coefficient"].loc[coefficients.index],
+                                   coefficients, rtol=1e-9, atol=1e-12)
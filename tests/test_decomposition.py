@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mmm.data import TARGET
+from mmm.decomposition import Decomposition
+from mmm.features import build_features
+
+PARAMS = {"lag_range": 4, "span": 3, "alpha": 0.6}
+
+
+def weekly(n_weeks=60, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(index=pd.date_range("2022-01-03", periods=n_weeks, freq="W-MON"))
+    for channel in ("tv", "search", "social"):
+        execution = np.where(rng.random(n_weeks) < 0.7, rng.lognormal(8, 1, n_weeks), 0.0)
+        df[f"execution - {channel}"] = execution
+        df[f"investment (in pound) - {channel}"] = execution * rng.lognormal(-2, 0.5)
+    df["Is_Holiday"] = (rng.random(n_weeks) < 0.1).astype(float)
+    df[TARGET] = rng.normal(1e4, 1e3, n_weeks)
+    return df
+
+
+@pytest.mark.parametrize("full_carryover", [False, True])
+def test_effect_contributions_sum_to_fitted(full_carryover):
+    df = weekly()
+    X, _ = build_features(df, **PARAMS)
+    beta = np.random.default_rng(1).uniform(0, 2, X.shape[1] + 1)
+    decomposition = Decomposition(df, list(X.columns), PARAMS, full_carryover=full_carryover)
+
+    contributions = decomposition.contribution_frame(beta)
+    fitted = beta[0] + X.to_numpy() @ beta[1:]
+    np.testing.assert_allclose(contributions.loc[X.index].sum(axis=1), fitted, rtol=1e-10)
+    assert not contributions.loc[~decomposition.window].to_numpy().any()
+
+
+def test_spend_attribution_moves_units_between_weeks_only():
+    df = weekly(seed=2)
+    X, _ = build_features(df, **PARAMS)
+    draws = np.random.default_rng(3).uniform(0, 2, (5, X.shape[1] + 1))
+    decomposition = Decomposition(df, list(X.columns), PARAMS)
+
+    effect = decomposition.contributions(draws, by="effect").sum(axis=1)
+    spend = decomposition.contributions(draws, by="spend").sum(axis=1)
+    np.testing.assert_allclose(spend, effect, rtol=1e-10)
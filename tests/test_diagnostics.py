@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from mmm.diagnostics import drop_high_vif, vif
+
+
+def _auxiliary_vif(X, i, centered):
+    """1 / (1 - R²) of regressing column i on the others, as statsmodels does."""
+    others = np.delete(X, i, axis=1)
+    x = X[:, i]
+    if centered:
+        others = np.column_stack([np.ones(len(X)), others])
+    resid = x - others @ np.linalg.lstsq(others, x, rcond=None)[0]
+    total = ((x - x.mean()) ** 2).sum() if centered else (x**2).sum()
+    return total / (resid**2).sum()
+
+
+@pytest.mark.parametrize("centered", [False, True])
+def test_vif_matches_auxiliary_regressions(centered):
+    rng = np.random.default_rng(0)
+    X = rng.gamma(2.0, 1.0, (80, 5))
+    X[:, 4] = X[:, 0] + 0.3 * X[:, 1] + rng.normal(0, 0.2, 80)
+    expected = [_auxiliary_vif(X, i, centered) for i in range(5)]
+    np.testing.assert_allclose(vif(X, centered), expected, rtol=1e-8)
+
+
+def test_default_is_uncentered():
+    # Columns far from zero look collinear through their common mean only
+    # when the auxiliary regressions have no intercept
+    X = np.random.default_rng(1).gamma(2.0, 1.0, (50, 3)) + 5.0
+    assert (vif(X) > 10).all() and (vif(X, centered=True) < 2).all()
+    assert drop_high_vif(X, threshold=10.0)[1]
+    assert not drop_high_vif(X, threshold=10.0, centered=True)[1]
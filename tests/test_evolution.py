@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from mmm.evolution import crowding_distance, pareto_ranks
+
+
+def peel(F):
+    """Reference non-dominated sorting: repeatedly remove the current front."""
+    ranks = np.full(len(F), -1)
+    left, rank = set(range(len(F))), 0
+    while left:
+        front = {i for i in left
+                 if not any(np.all(F[j] <= F[i]) and np.any(F[j] < F[i]) for j in left)}
+        ranks[list(front)] = rank
+        left -= front
+        rank += 1
+    return ranks
+
+
+def test_pareto_ranks_on_known_fronts():
+    F = np.array([
+        [1.0, 4.0], [2.0, 2.0], [4.0, 1.0],  # front 0
+        [2.0, 4.0], [3.0, 3.0], [4.0, 2.0],  # front 1
+        [5.0, 5.0],                          # front 2
+        [2.0, 2.0],                          # duplicate of a front-0 point
+    ])
+    np.testing.assert_array_equal(pareto_ranks(F), [0, 0, 0, 1, 1, 1, 2, 0])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pareto_ranks_match_peeling(seed):
+    rng = np.random.default_rng(seed)
+    F = rng.integers(0, 6, (60, 3)).astype(float)  # small integers, so ties and duplicates
+    np.testing.assert_array_equal(pareto_ranks(F), peel(F))
+
+
+def test_crowding_distance_keeps_front_extremes():
+    F = np.array([[0.0, 3.0], [1.0, 2.0], [2.0, 1.0], [3.0, 0.0]])
+    distance = crowding_distance(F, pareto_ranks(F))
+    assert np.isinf(distance[[0, 3]]).all()
+    np.testing.assert_allclose(distance[[1, 2]], [4 / 3, 4 / 3])
@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+import pytest
+
+from mmm.data import build_online_dataset, load_merged
+from mmm.ingest import ingest_long, ingest_panels
+from mmm.synthetic import PANEL_COL, synthetic_long
+
+MERGED = os.path.join(os.path.dirname(__file__), os.pardir, "data", "merged_data.csv")
+
+
+@pytest.mark.skipif(not os.path.exists(MERGED), reason="merged_data.csv is not checked out")
+@pytest.mark.parametrize("chunksize", [200_000, 777])
+def test_ingest_long_matches_pivot(chunksize):
+    panel = ingest_long(MERGED, chunksize=chunksize)
+    expected = build_online_dataset(load_merged(MERGED))
+    pd.testing.assert_frame_equal(panel.to_frame(), expected, check_dtype=False)
+
+
+def test_ingest_panels_match_pivot_per_panel(tmp_path):
+    long = synthetic_long(n_weeks=20, n_channels=6, n_panels=3, seed=0)
+    path = tmp_path / "long.csv"
+    long.to_csv(path, index=False)
+
+    panels = ingest_panels(str(path), [PANEL_COL], chunksize=97)
+    assert len(panels) == 3
+    merged = load_merged(str(path))
+    for (name,), panel in panels.items():
+        expected = build_online_dataset(merged[merged[PANEL_COL] == name].drop(columns=PANEL_COL))
+        pd.testing.assert_frame_equal(panel.to_frame(), expected, check_dtype=False)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mmm.nonlinear import HillAdstockModel, _Projection, fit_nonlinear
+
+
+def _model(seed=0, weeks=80, channels=3):
+    rng = np.random.default_rng(seed)
+    X = rng.gamma(2.0, 50.0, (weeks, channels)) * (rng.random((weeks, channels)) < 0.7)
+    C = rng.normal(size=(weeks, 2))
+    return HillAdstockModel(X, C), rng
+
+
+def _transforms(n):
+    return np.r_[np.linspace(0.2, 0.6, n), np.linspace(-1.5, -0.5, n), np.linspace(1.2, 2.5, n)]
+
+
+def test_model_jacobian_matches_finite_differences():
+    model, rng = _model()
+    theta = np.r_[rng.normal(size=model.n_linear), _transforms(model.n_channels)]
+    J = model.jacobian(theta)
+    eps = 1e-6
+    numeric = np.column_stack([
+        (model.predict(theta + eps * e) - model.predict(theta - eps * e)) / (2 * eps)
+        for e in np.eye(model.n_params)
+    ])
+    np.testing.assert_allclose(J, numeric, rtol=1e-5, atol=1e-6 * np.abs(numeric).max())
+
+
+def test_projection_gradient_matches_finite_differences():
+    model, rng = _model(1)
+    transforms = _transforms(model.n_channels)
+    H, _ = model.transform(transforms, derivatives=False)
+    y = model.design(H) @ np.r_[5.0, 3.0, 2.0, 4.0, 1.0, -1.0] + rng.normal(0, 0.3, len(H))
+    problem = _Projection(model, y)
+    start = transforms + 0.05
+    gradient = problem.jacobian(start).T @ problem.residuals(start)
+
+    def cost(t):
+        r = _Projection(model, y).residuals(t)
+        return 0.5 * r @ r
+
+    eps = 1e-6
+    numeric = np.array([(cost(start + eps * e) - cost(start - eps * e)) / (2 * eps) for e in np.eye(len(start))])
+    np.testing.assert_allclose(gradient, numeric, rtol=1e-4, atol=1e-6 * np.abs(numeric).max())
+
+
+def test_fit_keeps_alpha_within_the_adstock_range():
+    model, rng = _model(2, weeks=120)
+    transforms = _transforms(model.n_channels)
+    H, _ = model.transform(transforms, derivatives=False)
+    y = model.design(H) @ np.r_[50.0, 30.0, 20.0, 40.0, 1.0, -1.0] + rng.normal(0, 0.5, len(H))
+    columns = ["m0", "m1", "m2"]
+    df = pd.DataFrame(np.column_stack([model.X, model.C, y]), columns=columns + ["c0", "c1", "y"])
+    fit = fit_nonlinear(df, columns, ["c0", "c1"], "y", n_starts=2, seed=0)
+    assert fit.metrics["r2"] > 0.95
+    peak = model.alpha(np.r_[fit.params["decay"], np.zeros(3), fit.params["beta"]])
+    assert (fit.params["alpha"] <= peak * (1 + 1e-9)).all()
+    assert fit.params["alpha_at_bound"].dtype == bool
@@ -0,0 +1,32 @@
+from mmm import pipeline
+from mmm.pipeline import Pipeline
+
+
+def _pipeline(cache_dir, calls):
+    p = Pipeline(cache_dir)
+
+    @p.stage()
+    def source():
+        calls.append("source")
+        return 2
+
+    @p.stage(inputs=("source",), params=("k",))
+    def scaled(value, k=3):
+        calls.append("scaled")
+        return value * k
+
+    return p
+
+
+def test_cached_stages_are_reused_until_the_package_changes(tmp_path, monkeypatch):
+    calls = []
+    assert _pipeline(str(tmp_path), calls).run("scaled") == 6
+    assert _pipeline(str(tmp_path), calls).run("scaled", k=3) == 6
+    assert calls == ["source", "scaled"]
+
+    # An edit to any mmm module, e.g. a helper the stage calls, invalidates the cache
+    monkeypatch.setattr(pipeline, "package_code", lambda: "edited")
+    p = _pipeline(str(tmp_path), calls)
+    assert p.stale("scaled") == ["source", "scaled"]
+    assert p.run("scaled") == 6
+    assert calls == ["source", "scaled"] * 2
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from scipy.optimize import lsq_linear, nnls
+
+from mmm.solver import fit_bounded, gram_system, nnls_gram, solve_gram_batch
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_nnls_gram_matches_scipy_nnls(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.gamma(1.5, 1.0, (80, 8)) * 10 ** rng.uniform(0, 4, 8)
+    y = X @ rng.uniform(-1, 2, 8) + rng.normal(0, X.std(), 80)
+    G, b, _ = gram_system(X, y, intercept=False)
+    x, passive = nnls_gram(G, b)
+    expected, _ = nnls(X, y)
+    np.testing.assert_allclose(x, expected, rtol=1e-7, atol=1e-9 * np.abs(expected).max())
+    np.testing.assert_array_equal(passive, x > 0)
+
+
+def test_free_coefficients_match_lsq_linear():
+    rng = np.random.default_rng(10)
+    X = rng.gamma(1.5, 1.0, (60, 5)) * [1, 10, 100, 1e3, 1e4]
+    y = X @ [1.0, -2.0, 0.5, -0.01, 3e-4] + rng.normal(0, 50, 60) + 1e3
+    nonneg = np.array([True, True, False, True, False])
+    beta, _ = fit_bounded(X, y, nonneg)
+    A = np.column_stack([np.ones(len(X)), X])
+    lower = np.r_[-np.inf, np.where(nonneg, 0.0, -np.inf)]
+    expected = lsq_linear(A, y, bounds=(lower, np.inf), tol=1e-12).x
+    np.testing.assert_allclose(beta, expected, rtol=1e-6, atol=1e-8)
+
+
+def test_warm_start_reaches_the_same_solution():
+    rng = np.random.default_rng(11)
+    Xs = rng.gamma(1.5, 1.0, (6, 50, 7))
+    ys = Xs @ rng.uniform(-1, 2, 7) + rng.normal(0, 1, (6, 50))
+    Xs = np.concatenate([np.ones((6, 50, 1)), Xs], axis=2)
+    Gs, bs = np.einsum("bti,btj->bij", Xs, Xs), np.einsum("bti,bt->bi", Xs, ys)
+    np.testing.assert_allclose(solve_gram_batch(Gs, bs, warm_start=True),
+                               solve_gram_batch(Gs, bs, warm_start=False), rtol=1e-8, atol=1e-10)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_collinear_free_columns_stay_finite(seed):
+    # The last column is a multiple of the second free one up to rounding
+    # noise; the optimum is that of the design without it
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(1.5, 1.0, (52, 3)) * 10 ** rng.uniform(0, 6, 3)
+    k = rng.uniform(-5, 5)
+    X = np.column_stack([base, k * base[:, 1] * (1 + 1e-11 * rng.normal(size=52))])
+    y = base @ [1.0, 2.0, 3.0] + rng.normal(0, base.std(), 52)
+    nonneg = np.array([True, False, True, False])
+    beta, residuals = fit_bounded(X, y, nonneg)
+    A = np.column_stack([np.ones(len(base)), base])
+    expected = lsq_linear(A, y, bounds=(np.r_[-np.inf, 0.0, -np.inf, 0.0], np.inf), tol=1e-12)
+    assert np.abs(beta).max() < 10 * np.abs(expected.x).max()
+    assert residuals @ residuals == pytest.approx(expected.fun @ expected.fun, rel=1e-8)
+    assert beta[2] + k * beta[4] == pytest.approx(expected.x[2], rel=1e-6)
+
+
+def test_nnls_gram_warns_when_iterations_run_out():
+    rng = np.random.default_rng(11)
+    X = rng.gamma(1.5, 1.0, (60, 8))
+    y = X @ rng.uniform(0.5, 2, 8)
+    G, b, _ = gram_system(X, y, intercept=False)
+    with pytest.warns(RuntimeWarning, match="iterations"):
+        x, _ = nnls_gram(G, b, max_iter=2)
+    assert np.isfinite(x).all()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import lsq_linear
+
+from mmm.validation import rolling_origin, walk_forward
+
+
+@pytest.mark.parametrize("window", [None, 30])
+def test_walk_forward_matches_refit_from_scratch(window):
+    rng = np.random.default_rng(3)
+    n, p = 120, 6
+    X = pd.DataFrame(rng.gamma(1.5, 1.0, (n, p)) * 10 ** rng.uniform(0, 3, p),
+                     index=pd.date_range("2022-01-03", periods=n, freq="W-MON"))
+    y = X.to_numpy() @ rng.uniform(-0.5, 1.5, p) + rng.normal(0, 5, n) + 100
+    nonneg = np.array([True, True, True, False, True, True])
+
+    predictions = walk_forward(X, y, nonneg, initial=40, horizon=5, step=3, window=window)
+
+    A = np.column_stack([np.ones(n), X.to_numpy()])
+    lower = np.r_[-np.inf, np.where(nonneg, 0.0, -np.inf)]
+    expected = []
+    for start, origin, end in rolling_origin(n, 40, 5, 3, window):
+        beta = lsq_linear(A[start:origin], y[start:origin], bounds=(lower, np.inf), tol=1e-12).x
+        expected.append(A[origin:end] @ beta)
+    expected = np.concatenate(expected)
+
+    assert len(predictions) == len(expected)
+    np.testing.assert_allclose(predictions["predicted"], expected, rtol=1e-6,
+                               atol=1e-8 * np.abs(y).max())
+    np.testing.assert_array_equal(predictions["actual"],
+                                  y[np.searchsorted(X.index, predictions["week"])])
+
+
+def test_walk_forward_selects_on_training_weeks_only():
+    rng = np.random.default_rng(4)
+    n, p = 90, 5
+    X = pd.DataFrame(rng.gamma(1.5, 1.0, (n, p)), columns=list("abcde"))
+    y = X.to_numpy() @ rng.uniform(0, 2, p) + rng.normal(0, 0.5, n)
+    seen = []
+
+    def select(X_train, y_train):
+        seen.append(X_train.index.max())
+        # The two columns most correlated with the target in this fold
+        return X_train.corrwith(pd.Series(y_train, index=X_train.index)).nlargest(2).index
+
+    predictions = walk_forward(X, y, initial=30, horizon=6, select=select)
+
+    folds = rolling_origin(n, 30, 6)
+    assert seen == [origin - 1 for _, origin, _ in folds]
+    expected = []
+    for start, origin, end in folds:
+        cols = ["Intercept"] + list(select(X.iloc[start:origin], y[start:origin]))
+        A = X.assign(Intercept=1.0)[cols].to_numpy()
+        beta = lsq_linear(A[start:origin], y[start:origin], bounds=([-np.inf, 0, 0], np.inf), tol=1e-12).x
+        expected.append(A[origin:end] @ beta)
+    np.testing.assert_allclose(predictions["predicted"], np.concatenate(expected), rtol=1e-6)